@@ -1,55 +1,101 @@
 import os
-import xml.etree.ElementTree as ET
 import csv
+import time
+import argparse
+from itertools import groupby
+
+from experiment import parse_override
+from results import find_runs
+from results_db import ResultsDB, RESULTS_DB
 
 OUTPUT_DIR = "batch_results"
-CSV_FILE = "final_results.csv"
-
-def analyze():
-    print(f"Analisi file in {OUTPUT_DIR}...")
-    
-    results = []
-    
-    for filename in os.listdir(OUTPUT_DIR):
-        if not filename.endswith("_stats.xml"):
-            continue
-            
-        # Nome file atteso: BASELINE_v22_s10_stats.xml
-        try:
-            parts = filename.replace("_stats.xml", "").split("_")
-            mode = parts[0]
-            n_veh = int(parts[1].replace("v", ""))
-            seed = int(parts[2].replace("s", ""))
-            
-            tree = ET.parse(os.path.join(OUTPUT_DIR, filename))
-            stats = tree.getroot().find("vehicleTripStatistics")
-            
-            if stats is not None:
-                results.append({
-                    "Mode": mode,
-                    "Vehicles": n_veh,
-                    "Seed": seed,
-                    "Waiting Time": float(stats.get("waitingTime")),
-                    "Time Loss": float(stats.get("timeLoss")),
-                    "Duration": float(stats.get("duration")),
-                    "Speed": float(stats.get("speed"))
-                })
-        except Exception as e:
-            print(f"Skipping {filename}: {e}")
-
-    # Ordina per facilità di lettura
-    results.sort(key=lambda x: (x["Vehicles"], x["Seed"], x["Mode"]))
-    
-    # Scrittura CSV
-    if results:
-        keys = results[0].keys()
-        with open(CSV_FILE, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=keys)
-            writer.writeheader()
-            writer.writerows(results)
-        print(f"Salvato: {CSV_FILE} ({len(results)} righe)")
-    else:
-        print("Nessun risultato trovato.")
+EXPERIMENTS_RUNS_DIR = os.path.join("experiments", "runs")
+
+# Colonne del CSV per run (--csv) -> colonna dell'archivio (le prime 7 come nel vecchio final_results.csv)
+RUN_COLUMNS = {
+    "Mode": "mode",
+    "Vehicles": "vehicles",
+    "Seed": "seed",
+    "Waiting Time": "stats_waitingTime",
+    "Time Loss": "stats_timeLoss",
+    "Duration": "stats_duration",
+    "Speed": "stats_speed",
+    "Trips": "trips",
+    "Waiting Time p95": "waitingTime_p95",
+    "Time Loss p95": "timeLoss_p95",
+    "Managed Waiting Time": "managed_waitingTime_mean",
+    "Managed Time Loss": "managed_timeLoss_mean",
+    "Managed Duration": "managed_duration_mean",
+    "Git Revision": "git_revision",
+}
+
+def write_csv(path, rows):
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else float("nan")
+
+def print_summary(runs):
+    """Medie sui seed per (modalità, veicoli)."""
+    key = lambda row: (str(row["mode"]), row["vehicles"] or 0)
+    print(f"\n{'MODE':<10} | {'VEH':>4} | {'RUN':>4} | {'WAIT (s)':>9} | {'LOSS (s)':>9} | {'MANAGED LOSS (s)':>16}")
+    print("-" * 68)
+    for (mode, vehicles), group in groupby(sorted(runs, key=key), key=key):
+        group = list(group)
+        print(f"{mode:<10} | {vehicles:>4} | {len(group):>4} | {mean(r['stats_waitingTime'] for r in group):>9.2f} | "
+              f"{mean(r['stats_timeLoss'] for r in group):>9.2f} | {mean(r['managed_timeLoss_mean'] for r in group):>16.2f}")
+
+def analyze(directories=(OUTPUT_DIR,), jobs=None, db_path=RESULTS_DB, where=None, csv_file=None, vehicles_csv=None, table_file=None):
+    t0 = time.perf_counter()
+    with ResultsDB(db_path) as db:
+        # Solo le run nuove o rieseguite vengono rilette dall'XML
+        found = find_runs([d for d in directories if os.path.isdir(d)])
+        ingested = db.ingest(found, jobs=jobs)
+        print(f"Archivio {db_path}: {ingested} run archiviate, {len(found) - ingested} invariate, "
+              f"{len(db)} in totale ({time.perf_counter() - t0:.2f}s)")
+
+        runs = db.runs(where)
+        for row in runs:
+            if row["stats_duration"] is None:
+                print(f"Skipping {row['run_id']}: {row['error'] or 'vehicleTripStatistics assente'}")
+        runs = [row for row in runs if row["stats_duration"] is not None]
+        if not runs:
+            print("Nessun risultato trovato.")
+            return
+        print_summary(runs)
+
+        # Esportazioni opzionali (dall'archivio, senza rileggere l'XML)
+        if csv_file:
+            # Run di una specifica: una colonna per ogni override (es. CAM_TRIGGER_CONFIG.delta_speed_threshold)
+            rows = [{**{label: row[key] for label, key in RUN_COLUMNS.items()}, **row["overrides"]} for row in runs]
+            rows.sort(key=lambda x: (x["Vehicles"] or 0, x["Seed"] or 0, str(x["Mode"])))
+            write_csv(csv_file, rows)
+            print(f"Salvato: {csv_file} ({len(rows)} righe)")
+        if vehicles_csv or table_file:
+            table = db.table(where)
+            if vehicles_csv:
+                vehicles = table.vehicle_aggregates()
+                write_csv(vehicles_csv, vehicles)
+                print(f"Salvato: {vehicles_csv} ({len(vehicles)} righe)")
+            if table_file:
+                table.save(table_file)
+                print(f"Salvato: {table_file} ({len(table)} trip)")
 
 if __name__ == "__main__":
-    analyze()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Archivia gli output SUMO delle run in SQLite e ne riassume i risultati")
+    parser.add_argument("dirs", nargs="*", default=[OUTPUT_DIR, EXPERIMENTS_RUNS_DIR], help="Cartelle con gli output da archiviare")
+    parser.add_argument("--jobs", "-j", type=int, help="Processi di parsing (default: numero di CPU)")
+    parser.add_argument("--db", type=str, default=RESULTS_DB, help="Archivio SQLite dei risultati")
+    parser.add_argument("--where", action="append", default=[], metavar="PARAMETRO=VALORE",
+                        help="Filtro sulle run (es. mode=V2X, vehicles=42, CAM_TRIGGER_CONFIG.delta_speed_threshold=0.5)")
+    parser.add_argument("--csv", type=str, help="Esporta una riga per run (es. final_results.csv)")
+    parser.add_argument("--vehicles-csv", type=str, help="Esporta le medie per veicolo sui seed")
+    parser.add_argument("--table", type=str, help="Esporta la tabella per veicolo (.npz o .parquet)")
+    args = parser.parse_args()
+    analyze(args.dirs, jobs=args.jobs, db_path=args.db, where=dict(parse_override(w) for w in args.where),
+            csv_file=args.csv, vehicles_csv=args.vehicles_csv, table_file=args.table)
@@ -1,9 +1,20 @@
 import os
 import sys
+import json
+import signal
+import sqlite3
+import argparse
 import subprocess
+import threading
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import product
 
+from experiment import ArtifactStore, RESERVED_AXES, load_spec, expand, apply_overrides, file_digest, scenario_files
+from results import run_files
+from results_db import ResultsDB, RESULTS_DB, run_id
+
 # ==========================================
 # CONFIGURAZIONE AUTOMATICA
 # ==========================================
@@ -17,9 +28,37 @@ SEEDS = range(0, 51, 10)
 MODES = ["BASELINE", "V2X"]
 
 OUTPUT_DIR = "batch_results"
-ROUTES_DIR = "temp_routes"
+ROUTES_DIR = "temp_routes"  # File rotte generati, con l'hash dei loro input nel nome
+EXPERIMENTS_DIR = "experiments"  # Output delle run di una specifica (--spec), sotto l'hash dei loro input
+
+# 4. Backend SUMO: le run batch sono headless, libsumo evita il socket TraCI
+BACKEND = "libsumo"
+
+# 5. Pacing: adaptive va alla velocità che i container vanetza riescono a sostenere
+PACING = "adaptive"
+
+# 6. Trasporto V2X: "mqtt" richiede i container vanetza-nap; "loopback" consegna i messaggi
+#    in-process (nessun docker, run parallelizzabili): in questo caso conviene PACING = "afap"
+TRANSPORT = "mqtt"
+
+# 7. Esecuzione: run contemporanee (--jobs), timeout e tentativi per singola run
+JOBS = 1
+JOB_TIMEOUT = 1800  # s (None = nessun limite)
+RETRIES = 1  # tentativi aggiuntivi dopo un errore o un timeout
+LOGS_DIR = os.path.join(OUTPUT_DIR, "logs")
 # ==========================================
 
+# Trasporti senza risorse condivise tra le run: le run V2X vanno in parallelo come le BASELINE.
+# Con mqtt tutte le run V2X parlano con gli stessi container vanetza-nap: una alla volta.
+ISOLATED_TRANSPORTS = ("loopback", "null")
+
+# Processi delle run in corso (terminati in caso di interruzione del batch)
+_running = set()
+_running_lock = threading.Lock()
+
+# Una run del batch: override = {percorso in config: valore} (vedi experiment.py)
+Job = namedtuple("Job", ["label", "mode", "seed", "route_file", "prefix", "log_path", "overrides"])
+
 def generate_route_file(filename, n_vehicles):
     """
     Genera file .rou.xml:
@@ -48,50 +87,263 @@ def generate_route_file(filename, n_vehicles):
     with open(filename, "w") as f:
         f.write(content)
 
-def run_batch():
-    if not os.path.exists(OUTPUT_DIR): os.makedirs(OUTPUT_DIR)
-    if not os.path.exists(ROUTES_DIR): os.makedirs(ROUTES_DIR)
+def default_jobs(store):
+    """Sweep predefinito (VEHICLE_COUNTS x SEEDS x MODES), output in OUTPUT_DIR con nomi leggibili."""
+    jobs = []
+    for n_veh, seed, mode in product(VEHICLE_COUNTS, SEEDS, MODES):
+        name = f"{mode}_v{n_veh}_s{seed}"
+        jobs.append(Job(f"Mode={mode}, Veh={n_veh}, Seed={seed}", mode, seed, store.route_file(generate_route_file, n_veh),
+                        f"{OUTPUT_DIR}/{name}", os.path.join(LOGS_DIR, f"{name}.log"), {}))
+    return jobs
 
-    combinations = list(product(VEHICLE_COUNTS, SEEDS, MODES))
-    total = len(combinations)
-    
-    print(f"=== INIZIO BATCH: {total} Simulazioni ===")
-    
-    start_time_all = time.time()
+def spec_jobs(spec_path, store):
+    """
+    Run di una specifica di esperimento (experiment.py): output sotto l'hash dei loro input,
+    così uno sweep esteso esegue solo i punti nuovi. Scrive il manifest <nome>.json.
+    """
+    import config
+
+    spec = load_spec(spec_path)
+    points = expand(spec, {"seed": list(SEEDS), "mode": MODES})
+    # Percorsi verificati prima di avviare le run (un errore di battitura fallirebbe ogni run)
+    for point in points:
+        apply_overrides(config, point["overrides"])()
+
+    inputs = file_digest("config.py", *scenario_files(config.SUMO_CFG))
+    runner = {"backend": BACKEND, "pacing": PACING, "transport": TRANSPORT}
+    swept = [name for name in spec["axes"] if name not in RESERVED_AXES]
+    jobs, manifest = [], []
+    for point in points:
+        route_file = store.route_file(generate_route_file, point["vehicles"])
+        prefix = store.run_prefix({
+            "route_file": os.path.basename(route_file), "vehicles": point["vehicles"],
+            "seed": point["seed"], "mode": point["mode"], "overrides": point["overrides"],
+            "runner": runner, "inputs": inputs,
+        })
+        label = ", ".join([f"Mode={point['mode']}", f"Veh={point['vehicles']}", f"Seed={point['seed']}"]
+                          + [f"{name}={point['overrides'][name]}" for name in swept])
+        jobs.append(Job(label, point["mode"], point["seed"], route_file, prefix, prefix + ".log", point["overrides"]))
+        manifest.append({**point, "prefix": prefix})
 
-    for idx, (n_veh, seed, mode) in enumerate(combinations, 1):
-        print(f"[{idx}/{total}] Mode={mode}, Veh={n_veh}, Seed={seed}...", end=" ", flush=True)
-        
-        # 1. Genera Rotta
-        route_file = os.path.join(ROUTES_DIR, f"cars_{n_veh}.rou.xml")
-        generate_route_file(route_file, n_veh)
-        
-        # 2. Definisci Output univoco
-        prefix = f"{OUTPUT_DIR}/{mode}_v{n_veh}_s{seed}"
-        
-        # 3. Comando
-        cmd = [
-            sys.executable, "main.py",
-            "--mode", mode,
-            "--seed", str(seed),
-            "--route-file", route_file,
-            "--prefix", prefix,
-            "--nogui"
-        ]
-        
+    with open(os.path.join(store.root, f"{spec['name']}.json"), "w") as f:
+        json.dump({"name": spec["name"], "spec": spec, "runs": manifest}, f, indent=2)
+    return jobs
+
+def is_complete(prefix):
+    """True se la run ha già prodotto tutti i suoi output (file XML chiusi da SUMO)."""
+    for suffix, closing in (("_stats.xml", b"</statistics>"), ("_tripinfo.xml", b"</tripinfos>")):
+        path = prefix + suffix
         try:
+            with open(path, "rb") as f:
+                f.seek(max(0, os.path.getsize(path) - 256))
+                if closing not in f.read():
+                    return False
+        except OSError:
+            return False
+    return True
+
+def remove_outputs(prefix):
+    """Rimuove gli output parziali di una run fallita (non devono sembrare completi)."""
+    for suffix in ("_stats.xml", "_tripinfo.xml", "_pacing.json", "_config.json", "_profile.json", "_mcm.json"):
+        if os.path.exists(prefix + suffix):
+            os.remove(prefix + suffix)
+
+def archive(db, prefix, ok):
+    """Archivia la run appena finita (o la toglie se fallita): un errore non ferma il batch."""
+    try:
+        if not ok:
+            db.remove(prefix)
+            return
+        if not is_complete(prefix):
+            # Output non ancora chiusi da SUMO: archiviati ora darebbero una run vuota
+            print(f"  {prefix}: output incompleti, run non archiviata (rilancia analyze_batch.py)", flush=True)
+            return
+        db.ingest_prefix(prefix)
+        row = db.run(run_id(prefix))
+        if row is None or row["error"] or not row["trips"]:
+            reason = row["error"] or "nessun viaggio" if row else "run assente"
+            print(f"  {prefix}: archiviata senza risultati ({reason})", flush=True)
+    except sqlite3.Error as e:
+        print(f"  Archiviazione di {prefix} non riuscita ({e}): rilancia analyze_batch.py", flush=True)
+
+def build_command(job):
+    cmd = [
+        sys.executable, "main.py",
+        "--mode", job.mode,
+        "--seed", str(job.seed),
+        "--route-file", job.route_file,
+        "--prefix", job.prefix,
+        "--nogui",
+        "--backend", BACKEND,
+        "--pacing", PACING,
+        "--transport", TRANSPORT
+    ]
+    for path, value in job.overrides.items():
+        cmd.extend(["--set", f"{path}={json.dumps(value)}"])
+    return cmd
+
+def uses_shared_transport(job):
+    """True se la run usa i container vanetza condivisi (run V2X su mqtt)."""
+    backend = job.overrides.get("TRANSPORT_CONFIG.backend", TRANSPORT)
+    return job.mode == "V2X" and backend not in ISOLATED_TRANSPORTS
+
+def run_job(cmd, log_path, timeout, retries):
+    """
+    Esegue una run (con eventuali nuovi tentativi) scrivendo stdout/stderr nel suo log.
+
+    Returns:
+        (esito "OK" / "ERRORE" / "TIMEOUT", tentativi, durata dell'ultimo tentativo in s)
+    """
+    status, dt = "ERRORE", 0.0
+    for attempt in range(1, retries + 2):
+        with open(log_path, "a") as log:
+            log.write(f"=== Tentativo {attempt}: {' '.join(cmd)}\n")
+            log.flush()
             t0 = time.time()
-            # capture_output=True nasconde i log di SUMO per pulizia
-            subprocess.run(cmd, check=True, capture_output=True) 
+            # Gruppo di processi proprio: al timeout termina anche il processo SUMO (backend traci)
+            proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+            with _running_lock:
+                _running.add(proc)
+            try:
+                status = "OK" if proc.wait(timeout=timeout) == 0 else "ERRORE"
+            except subprocess.TimeoutExpired:
+                kill_process_group(proc)
+                status = "TIMEOUT"
+            finally:
+                with _running_lock:
+                    _running.discard(proc)
             dt = time.time() - t0
-            print(f"OK ({dt:.2f}s)")
-        except subprocess.CalledProcessError as e:
-            print(f"ERRORE!")
-            # Stampa l'errore se serve debugging
-            # print(e.stderr.decode())
+            log.write(f"=== Tentativo {attempt}: {status} ({dt:.2f}s)\n")
+        if status == "OK":
+            break
+    return status, attempt, dt
+
+def kill_process_group(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):  # os.killpg/SIGKILL non esistono su Windows
+        proc.kill()
+    proc.wait()
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def run_pool(jobs_list, jobs, timeout, retries):
+    """Ogni run in un processo main.py. Yields (run, esito, tentativi, durata) in ordine di completamento."""
+    # Run con container vanetza condivisi: una corsia a parte, una run alla volta
+    parallel = ThreadPoolExecutor(max_workers=max(1, jobs))
+    serial = ThreadPoolExecutor(max_workers=1)
+    futures = {}
+    for job in jobs_list:
+        executor = serial if uses_shared_transport(job) and jobs > 1 else parallel
+        futures[executor.submit(run_job, build_command(job), job.log_path, timeout, retries)] = job
+    try:
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+    finally:
+        # Batch interrotto: annulla le run in attesa e termina quelle in corso
+        for future in futures:
+            future.cancel()
+        with _running_lock:
+            running = list(_running)
+        for proc in running:
+            kill_process_group(proc)
+        parallel.shutdown(wait=True)
+        serial.shutdown(wait=True)
+
+def run_in_process(jobs_list):
+    """
+    Tutte le run in questo processo, una dopo l'altra: una sola istanza SUMO ricaricata con
+    traci.load e le stesse connessioni MQTT (main.run_sweep). Nessun timeout né nuovo tentativo.
+    """
+    import config
+    from main import run_sweep  # traci, sumolib e trasporto importati solo in questa modalità
+
+    config.SUMO_BACKEND = BACKEND
+    config.PACING_CONFIG["mode"] = PACING
+    config.TRANSPORT_CONFIG["backend"] = TRANSPORT
+    runs = [{"mode": job.mode, "seed": job.seed, "route_file": job.route_file, "prefix": job.prefix,
+             "log": job.log_path, "overrides": job.overrides, "job": job} for job in jobs_list]
+    sweep = run_sweep(runs)
+    try:
+        for run, status, dt in sweep:
+            yield run["job"], status, 1, dt
+    finally:
+        sweep.close()
+
+def run_batch(jobs=JOBS, timeout=JOB_TIMEOUT, retries=RETRIES, force=False, in_process=False, spec=None):
+    # File rotte generati una volta sola per insieme di input (riusati tra seed, modalità e batch)
+    if spec:
+        store = ArtifactStore(EXPERIMENTS_DIR, routes_dir=ROUTES_DIR)
+        os.makedirs(EXPERIMENTS_DIR, exist_ok=True)
+        all_jobs = spec_jobs(spec, store)
+    else:
+        store = ArtifactStore(OUTPUT_DIR, routes_dir=ROUTES_DIR)
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        all_jobs = default_jobs(store)
+    total = len(all_jobs)
+
+    # Run con output già completi (stesso prefisso = stessi input) saltate
+    pending = [job for job in all_jobs if force or not is_complete(job.prefix)]
+    skipped = total - len(pending)
+
+    if in_process: jobs = 1
+    how = "in-process, una istanza SUMO" if in_process else f"{jobs} in parallelo"
+    print(f"=== INIZIO BATCH: {total} Simulazioni ({skipped} già completate, {len(pending)} da eseguire, {how}) ===")
+    if store.generated_routes: print(f"File rotte generati: {store.generated_routes} (in '{ROUTES_DIR}')")
+
+    # Archivio dei risultati: run completate in batch precedenti (se mancanti) e poi ogni run appena finisce
+    db = ResultsDB(RESULTS_DB)
+    pending_prefixes = {job.prefix for job in pending}
+    completed = [job.prefix for job in all_jobs if job.prefix not in pending_prefixes]
+    db.ingest([run for run in map(run_files, completed) if run])
+
+    start_time_all = time.time()
+    done, failed, busy_time = 0, [], 0.0
+    results = run_in_process(pending) if in_process else run_pool(pending, jobs, timeout, retries)
+    try:
+        for job, status, attempts, dt in results:
+            done += 1
+            busy_time += dt
+            if status != "OK":
+                failed.append((job, status))
+                remove_outputs(job.prefix)
+            archive(db, job.prefix, status == "OK")
+            # ETA: durata media delle run finite, ripartita sulle run contemporanee
+            remaining = len(pending) - done
+            eta = busy_time / done * remaining / min(max(1, jobs), max(1, remaining))
+            retry = f", {attempts} tentativi" if attempts > 1 else ""
+            print(f"[{skipped + done}/{total}] {job.label}... "
+                  f"{status} ({dt:.2f}s{retry}) - ETA {format_eta(eta)}", flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrotto: annullo le run in attesa e termino quelle in corso...")
+        raise
+    finally:
+        results.close()
+        db.close()
 
     tot_time = time.time() - start_time_all
-    print(f"\n=== COMPLETATO in {tot_time:.1f}s. Risultati in '{OUTPUT_DIR}' ===")
+    print(f"\n=== COMPLETATO in {tot_time:.1f}s. Risultati in '{store.root}' e in '{RESULTS_DB}' ===")
+    if failed:
+        print(f"{len(failed)} run non riuscite:")
+        for job, status in failed:
+            print(f"  {status}: {job.label} -> {job.log_path}")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch di simulazioni (veicoli x seed x modalità)")
+    parser.add_argument("--jobs", "-j", type=int, default=JOBS, help="Run contemporanee (le V2X con mqtt restano una alla volta)")
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="Timeout per singola run (s, 0 = nessun limite)")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="Tentativi aggiuntivi dopo un errore o un timeout")
+    parser.add_argument("--force", action="store_true", help="Esegue anche le run con output già completi")
+    parser.add_argument("--in-process", action="store_true", help="Run in sequenza in questo processo con una sola istanza SUMO (traci.load)")
+    parser.add_argument("--spec", type=str, help="Specifica dell'esperimento (TOML/YAML/JSON, vedi experiment.py) al posto dello sweep predefinito")
+    args = parser.parse_args()
+    ok = run_batch(jobs=args.jobs, timeout=args.timeout or None, retries=args.retries, force=args.force,
+                   in_process=args.in_process, spec=args.spec)
+    sys.exit(0 if ok else 1)
 
 if __name__ == "__main__":
-    run_batch()
\ No newline at end of file
+    main()
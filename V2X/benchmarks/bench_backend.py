@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark backend SUMO: steps/sec di traci (socket) vs libsumo (in-process)
+su camMap.sumo.cfg, con la stessa pipeline di lettura stato del simulatore.
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_backend.py --vehicles 52 --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+
+def run_worker(backend: str, route_file: str, seed: int) -> dict:
+    """Esegue una simulazione completa headless (BASELINE, niente MQTT) e misura gli step."""
+    import logging
+    import config
+    from main import V2XSimulator
+    from sumo_backend import sumo
+
+    logging.getLogger().setLevel(logging.WARNING)
+    config.SUMO_GUI = False
+    config.SIMULATION_MODE = "BASELINE"
+    config.SUMO_BACKEND = backend
+    config.SUMO_SEED = seed
+    config.get_sumo_output_args = lambda: ["--no-step-log", "true"]
+
+    sim = V2XSimulator(route_override=route_file)
+    sim.initialize()
+
+    steps = 0
+    t0 = time.perf_counter()
+    while sumo.simulation.getMinExpectedNumber() > 0:
+        sim.step()
+        steps += 1
+    elapsed = time.perf_counter() - t0
+    sim.shutdown()
+
+    return {"backend": sumo.name, "steps": steps, "seconds": elapsed, "steps_per_sec": steps / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark traci vs libsumo")
+    parser.add_argument("--vehicles", type=int, default=52, help="Numero veicoli nel file rotte generato")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["traci", "libsumo"])
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--route-file", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(V2X_DIR)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.route_file, args.seed)))
+        return
+
+    from batch_run import generate_route_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        route_file = os.path.join(tmp, f"cars_{args.vehicles}.rou.xml")
+        generate_route_file(route_file, args.vehicles)
+
+        print(f"{'BACKEND':<10} | {'STEPS':>6} | {'TEMPO (s)':>9} | {'STEPS/SEC':>10}")
+        print("-" * 45)
+        summary = {}
+        for backend in args.backends:
+            rates = []
+            for _ in range(args.repeat):
+                # Un processo per run: libsumo supporta una sola istanza per processo
+                out = subprocess.run(
+                    [sys.executable, __file__, "--worker", backend, "--route-file", route_file, "--seed", str(args.seed)],
+                    check=True, capture_output=True, text=True
+                )
+                res = json.loads(out.stdout.strip().splitlines()[-1])
+                rates.append(res["steps_per_sec"])
+                print(f"{res['backend']:<10} | {res['steps']:>6} | {res['seconds']:>9.2f} | {res['steps_per_sec']:>10.1f}")
+            summary[backend] = max(rates)
+
+    if "traci" in summary and "libsumo" in summary:
+        print(f"\nSpeedup libsumo/traci (best of {args.repeat}): {summary['libsumo'] / summary['traci']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
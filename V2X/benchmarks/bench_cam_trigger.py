@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark ETSICAMTrigger: evaluate (un veicolo per chiamata) vs evaluate_batch
+(tutti i veicoli in una chiamata NumPy), su traiettorie sintetiche con veicoli
+fermi, in marcia, in curva (heading a cavallo di 0/360) e arrivi/partenze che
+riciclano gli slot della VehicleStateTable.
+
+Prima della misura verifica l'equivalenza: ad ogni step le due implementazioni
+devono decidere gli stessi invii e salvare lo stesso stato.
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_cam_trigger.py --vehicles 100 1000 5000 --steps 600
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from config import SUMO_STEP_LENGTH
+from entities.state_table import VehicleStateTable
+from triggers.etsi_cam_trigger import ETSICAMTrigger
+
+STATE_FIELDS = ("time", "x", "y", "speed", "heading", "t_gen_cam", "n_gen_cam")
+
+
+class Scenario:
+    """Traiettorie sintetiche deterministiche (seed) scritte direttamente nella tabella."""
+
+    def __init__(self, n_vehicles: int, seed: int, turnover: float = 0.01):
+        self.rng = np.random.default_rng(seed)
+        self.table = VehicleStateTable()
+        self.turnover = turnover
+        self.next_id = 0
+        for _ in range(n_vehicles):
+            self._depart()
+
+    def _depart(self):
+        sumo_id = f"veh_{self.next_id}"
+        self.next_id += 1
+        slot = self.table.allocate(sumo_id, self.next_id)
+        t = self.table
+        t.x[slot], t.y[slot] = self.rng.uniform(0, 3000, 2)
+        t.heading[slot] = self.rng.choice([0.5, 90.0, 180.0, 359.5]) + self.rng.normal(0, 1)
+        # Un quarto dei veicoli è fermo: invii solo per timeout T_GenCamMax
+        t.speed[slot] = 0.0 if self.rng.random() < 0.25 else self.rng.uniform(2, 20)
+
+    def advance(self, dt: float) -> list[tuple[str, int]]:
+        """Avanza di uno step; restituisce (ID, slot) degli arrivati (gli slot vengono riciclati)."""
+        t = self.table
+        slots = np.flatnonzero(t.active)
+        moving = slots[t.speed[slots] > 0]
+        t.speed[moving] = np.clip(t.speed[moving] + self.rng.normal(0, 0.3, len(moving)), 0.1, 30)
+        t.heading[moving] = (t.heading[moving] + self.rng.normal(0, 1.5, len(moving))) % 360
+        rad = np.radians(t.heading[moving])
+        t.x[moving] += np.sin(rad) * t.speed[moving] * dt
+        t.y[moving] += np.cos(rad) * t.speed[moving] * dt
+
+        arrived = [(t.ids[s], s) for s in slots[self.rng.random(len(slots)) < self.turnover].tolist()]
+        for sumo_id, _ in arrived:
+            t.release(sumo_id)
+            self._depart()
+        return arrived
+
+
+def run_scalar(trigger, table, slots, sim_time, states):
+    """Come V2XSimulator._evaluate_and_send: un evaluate per veicolo con stato a dizionario."""
+    sent = []
+    for slot in slots.tolist():
+        sumo_id = table.ids[slot]
+        res = trigger.evaluate(sumo_id, sim_time, table.row(slot), states.get(sumo_id))
+        if res.should_send:
+            sent.append(slot)
+            if res.new_state: states[sumo_id] = res.new_state
+    return sent
+
+
+def run_batch(trigger, table, slots, sim_time, state):
+    """Come V2XSimulator._evaluate_batch_and_send."""
+    trigger.grow_batch_state(state, table.capacity)
+    send = trigger.evaluate_batch(sim_time, table.columns("x", "y", "speed", "heading"), state, slots)
+    return slots[send].tolist()
+
+
+def check_equivalence(n_vehicles: int, steps: int, seed: int) -> int:
+    """Esegue i due percorsi in parallelo sullo stesso scenario; restituisce i CAM inviati."""
+    trigger = ETSICAMTrigger()
+    scenario = Scenario(n_vehicles, seed)
+    table = scenario.table
+    scalar_states: dict[str, dict] = {}
+    batch_state = trigger.new_batch_state(table.capacity)
+    total = 0
+
+    for step in range(1, steps + 1):
+        sim_time = round(step * SUMO_STEP_LENGTH, 2)
+        slots = table.active_slots()
+
+        sent_scalar = run_scalar(trigger, table, slots, sim_time, scalar_states)
+        sent_batch = run_batch(trigger, table, slots, sim_time, batch_state)
+        if sent_scalar != sent_batch:
+            raise SystemExit(f"Invii diversi allo step {step}: scalare={len(sent_scalar)} batch={len(sent_batch)}")
+        total += len(sent_batch)
+
+        for slot in slots.tolist():
+            expected = scalar_states.get(table.ids[slot])
+            if expected is None:
+                continue
+            got = {name: batch_state[name][slot].item() for name in STATE_FIELDS}
+            if got != {name: expected[name] for name in STATE_FIELDS}:
+                raise SystemExit(f"Stato diverso allo step {step} per {table.ids[slot]}: {got} != {expected}")
+
+        # Arrivi: come V2XSimulator._cleanup_vehicles
+        for sumo_id, slot in scenario.advance(SUMO_STEP_LENGTH):
+            scalar_states.pop(sumo_id, None)
+            trigger.reset_batch_state(batch_state, slot)
+    return total
+
+
+def measure(n_vehicles: int, steps: int, seed: int, batch: bool) -> float:
+    """ms per step (solo valutazione del trigger)."""
+    trigger = ETSICAMTrigger()
+    scenario = Scenario(n_vehicles, seed, turnover=0.0)
+    table = scenario.table
+    scalar_states: dict[str, dict] = {}
+    batch_state = trigger.new_batch_state(table.capacity)
+
+    elapsed = 0.0
+    for step in range(1, steps + 1):
+        sim_time = round(step * SUMO_STEP_LENGTH, 2)
+        slots = table.active_slots()
+        t0 = time.perf_counter()
+        if batch:
+            run_batch(trigger, table, slots, sim_time, batch_state)
+        else:
+            run_scalar(trigger, table, slots, sim_time, scalar_states)
+        elapsed += time.perf_counter() - t0
+        scenario.advance(SUMO_STEP_LENGTH)
+    return elapsed / steps * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ETSICAMTrigger scalare vs batch")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--steps", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'VEICOLI':>7} | {'CAM':>8} | {'SCALARE (ms)':>12} | {'BATCH (ms)':>10} | {'SPEEDUP':>7}")
+    print("-" * 57)
+    for n_vehicles in args.vehicles:
+        sent = check_equivalence(n_vehicles, args.steps, args.seed)
+        t_scalar = measure(n_vehicles, args.steps, args.seed, batch=False)
+        t_batch = measure(n_vehicles, args.steps, args.seed, batch=True)
+        print(f"{n_vehicles:>7} | {sent:>8} | {t_scalar:>12.3f} | {t_batch:>10.3f} | {t_scalar / t_batch:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
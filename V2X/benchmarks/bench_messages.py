@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark serializzazione messaggi: build_payload + json.dumps (percorso generico)
+vs serialize (scheletro pre-renderizzato, orjson se installato).
+
+Prima della misura verifica l'equivalenza: per ogni messaggio sintetico i due percorsi
+devono produrre lo stesso documento JSON (json.loads uguale).
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_messages.py --messages 20000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from messages import MessageFactory
+from messages.serialization import orjson
+
+
+def vehicle_data(rng: random.Random, station_type: int) -> dict:
+    """Come Vehicle.get_message_data."""
+    return {
+        "station_id": rng.randint(1, 5000), "station_type": station_type,
+        "lat": rng.uniform(41.0, 42.0), "lon": rng.uniform(12.0, 13.0),
+        "speed": rng.choice([0.0, rng.uniform(-2, 30)]), "heading": rng.uniform(0, 360),
+        "acceleration": rng.uniform(-4, 3), "length": 5, "width": 2,
+        "light_left_turn": rng.random() < 0.2, "light_right_turn": rng.random() < 0.2,
+    }
+
+
+def rsu_data(rng: random.Random, station_type: int) -> dict:
+    """Come RSU.get_message_data."""
+    return {"station_id": 100, "station_type": station_type, "lat": 41.9, "lon": 12.5, "speed": 0, "heading": 0, "acceleration": 0}
+
+
+def request_data(rng: random.Random) -> dict:
+    data = rsu_data(rng, 2)
+    executants = [{"executant_id": rng.randint(1, 50), "advised_strategy": rng.choice(["stop", "driveStraight", "takeTollingLane"]),
+                   "submanoeuvres": [{"submanoeuvre_id": 1}]} for _ in range(rng.randint(1, 3))]
+    data.update({"manoeuvre_id": 10, "cost": 50, "executants": executants})
+    return data
+
+
+# (tipo messaggio, generatore dei dati)
+CASES = {
+    "cam (veicolo)": ("cam", lambda rng: vehicle_data(rng, 5)),
+    "cam (rsu)": ("cam", lambda rng: rsu_data(rng, 15)),
+    "mcm_request": ("mcm_request", request_data),
+    "mcm_response": ("mcm_response", lambda rng: {**vehicle_data(rng, 1), "manoeuvre_id": 10, "response_code": rng.randint(0, 1), "cost": 0}),
+    "mcm_termination": ("mcm_termination", lambda rng: {**rsu_data(rng, 2), "manoeuvre_id": 10}),
+    "mcm_intent": ("mcm_intent", lambda rng: vehicle_data(rng, 1)),
+}
+
+
+def generic(message, data: dict) -> bytes:
+    """Percorso precedente: dizionario completo + json.dumps (come MQTTManager.publish)."""
+    return json.dumps(message.build_payload(data), separators=(',', ':')).encode()
+
+
+def check_equivalence(message_type: str, samples: list[dict]) -> None:
+    for gen_delta_time, data in enumerate(samples):
+        message = MessageFactory.create(message_type, gen_delta_time)
+        expected, got = json.loads(generic(message, data)), json.loads(message.serialize(data))
+        if got != expected:
+            raise SystemExit(f"{message_type}: payload diverso per {data}\n  atteso:  {expected}\n  ottenuto: {got}")
+
+
+def measure(message_type: str, samples: list[dict], fast: bool) -> float:
+    """Messaggi al secondo (creazione messaggio + serializzazione)."""
+    t0 = time.perf_counter()
+    for gen_delta_time, data in enumerate(samples):
+        message = MessageFactory.create(message_type, gen_delta_time)
+        message.serialize(data) if fast else generic(message, data)
+    return len(samples) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serializzazione CAM/MCM")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Encoder JSON: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'MESSAGGIO':>16} | {'PRIMA (msg/s)':>13} | {'DOPO (msg/s)':>12} | {'SPEEDUP':>7}")
+    print("-" * 60)
+    for name, (message_type, make_data) in CASES.items():
+        rng = random.Random(args.seed)
+        samples = [make_data(rng) for _ in range(args.messages)]
+        check_equivalence(message_type, samples)
+        before = measure(message_type, samples, fast=False)
+        after = measure(message_type, samples, fast=True)
+        print(f"{name:>16} | {before:>13,.0f} | {after:>12,.0f} | {after / before:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
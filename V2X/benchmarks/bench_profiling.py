@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark dei tempi per fase (profiling.py): costo dei punti di misura con il profiler
+disabilitato (NullProfiler) e abilitato, rispetto alla durata di uno step.
+
+1. Costo di un punto di misura (ns), senza SUMO
+2. Simulazione V2X completa headless (trasporto null, pacing afap) con il profiler abilitato
+   e disabilitato: durata media dello step, punti di misura per step (8 + 3 per messaggio) e
+   overhead stimato del profiler disabilitato; tempi per fase della run abilitata
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_profiling.py --vehicles 52 --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import subprocess
+import tempfile
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from profiling import StepProfiler, NullProfiler, PAYLOAD, PUBLISH
+
+STEP_HOOKS = 8  # begin, 6 switch, end
+MESSAGE_HOOKS = 3  # push, switch, pop
+
+
+def hook_cost(profiler, number=200_000) -> float:
+    """ns per punto di misura, con la sequenza di chiamate di un messaggio."""
+    profiler.begin()
+    push, switch, pop = profiler.push, profiler.switch, profiler.pop
+
+    def message():
+        push(PAYLOAD)
+        switch(PUBLISH)
+        pop()
+
+    return min(timeit.repeat(message, number=number, repeat=5)) / number / MESSAGE_HOOKS * 1e9
+
+
+def run_worker(profile: bool, route_file: str, seed: int) -> dict:
+    """Simulazione completa headless, V2X senza container (trasporto null)."""
+    import logging
+    import config
+    from main import V2XSimulator
+    from outbound import outbound
+    from sumo_backend import sumo
+
+    logging.getLogger().setLevel(logging.WARNING)
+    config.SUMO_GUI = False
+    config.SIMULATION_MODE = "V2X"
+    config.SUMO_BACKEND = "libsumo"
+    config.SUMO_SEED = seed
+    config.TRANSPORT_CONFIG["backend"] = "null"
+    config.PACING_CONFIG["mode"] = "afap"
+    config.PROFILING_CONFIG["enabled"] = profile
+    config.get_sumo_output_args = lambda: ["--no-step-log", "true"]
+
+    sim = V2XSimulator(route_override=route_file)
+    sim.initialize()
+
+    steps = 0
+    t0 = time.perf_counter()
+    while sumo.simulation.getMinExpectedNumber() > 0:
+        sim.step()
+        steps += 1
+    elapsed = time.perf_counter() - t0
+    messages = outbound.stats()["submitted"]
+    summary = sim.profiler.summary()
+    sim.shutdown()
+    return {"steps": steps, "seconds": elapsed, "messages": messages, "summary": summary}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark overhead dei tempi per fase")
+    parser.add_argument("--vehicles", type=int, default=52, help="Numero veicoli nel file rotte generato")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--route-file", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(V2X_DIR)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker == "on", args.route_file, args.seed)))
+        return
+
+    null_ns, enabled_ns = hook_cost(NullProfiler()), hook_cost(StepProfiler())
+    print(f"Punto di misura: {null_ns:.1f} ns disabilitato, {enabled_ns:.1f} ns abilitato\n")
+
+    from batch_run import generate_route_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        route_file = os.path.join(tmp, f"cars_{args.vehicles}.rou.xml")
+        generate_route_file(route_file, args.vehicles)
+
+        best = {}
+        for mode in ("off", "on"):
+            for _ in range(args.repeat):
+                # Un processo per run: libsumo supporta una sola istanza per processo
+                out = subprocess.run(
+                    [sys.executable, __file__, "--worker", mode, "--route-file", route_file, "--seed", str(args.seed)],
+                    check=True, capture_output=True, text=True
+                )
+                res = json.loads(out.stdout.strip().splitlines()[-1])
+                if mode not in best or res["seconds"] < best[mode]["seconds"]:
+                    best[mode] = res
+
+    off, on = best["off"], best["on"]
+    step_ns = off["seconds"] / off["steps"] * 1e9
+    hooks = STEP_HOOKS + MESSAGE_HOOKS * off["messages"] / off["steps"]
+    print(f"{'PROFILER':<9} | {'STEPS':>6} | {'STEP (ms)':>9} | {'MSG/STEP':>8} | {'OVERHEAD':>9}")
+    print("-" * 54)
+    print(f"{'off':<9} | {off['steps']:>6} | {step_ns / 1e6:>9.4f} | {off['messages'] / off['steps']:>8.1f} | "
+          f"{hooks * null_ns / step_ns:>8.2%}*")
+    print(f"{'on':<9} | {on['steps']:>6} | {on['seconds'] / on['steps'] * 1e3:>9.4f} | {on['messages'] / on['steps']:>8.1f} | "
+          f"{on['seconds'] / off['seconds'] - 1:>+9.2%}")
+    print(f"* stimato: {hooks:.1f} punti di misura per step x {null_ns:.1f} ns (best of {args.repeat})\n")
+
+    print(f"{'FASE':<14} | {'MEDIA (ms)':>10} | {'P50':>8} | {'P95':>8} | {'P99':>8} | {'QUOTA':>6}")
+    print("-" * 70)
+    for name, values in on["summary"]["phases"].items():
+        print(f"{name:<14} | {values['mean']:>10.4f} | {values['p50']:>8.4f} | {values['p95']:>8.4f} | "
+              f"{values['p99']:>8.4f} | {values['share']:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
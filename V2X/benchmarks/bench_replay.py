@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark del replay di un trace (state_trace.py): run V2X su SUMO che registra il trace,
+poi replay dello stesso trace senza SUMO.
+
+1. Equivalenza: i messaggi pubblicati (stazione, tipo, payload, nell'ordine di publish) nella
+   run live e nel replay devono coincidere (digest SHA-256). Trasporto loopback con tutte le
+   stazioni instradabili e publish sincrono: anche le MCM ricevute dai veicoli coincidono.
+   generationDeltaTime dipende dall'orologio di sistema (utils.get_generation_delta_time) ed
+   è escluso dal confronto.
+2. Tempi: durata del loop live e del replay, velocità rispetto al tempo reale (RTF) e al live
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_replay.py --vehicles 52 --repeat 3
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import tempfile
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+# generationDeltaTime nei payload JSON (orologio di sistema: diverso a ogni run)
+GENERATION_DELTA_TIME = re.compile(rb'"generationDeltaTime": ?\d+')
+
+
+def run_worker(mode: str, trace_dir: str, route_file: str, seed: int, backend: str) -> dict:
+    """Run completa headless: "live" (SUMO, registra il trace) o "replay" (dal trace)."""
+    import logging
+    import config
+    from main import V2XSimulator
+    from outbound import outbound
+    from sumo_backend import sumo
+    from transport import transport
+
+    logging.getLogger().setLevel(logging.ERROR)
+    config.SUMO_GUI = False
+    config.SIMULATION_MODE = "V2X"
+    config.SUMO_BACKEND = backend
+    config.SUMO_SEED = seed
+    config.TRANSPORT_CONFIG.update(backend="loopback", all_stations=True)
+    config.PACING_CONFIG["mode"] = "afap"
+    config.MESSAGE_ENCODING = "json"
+    config.TRACE_CONFIG.update(record=trace_dir if mode == "live" else None, replay=trace_dir if mode == "replay" else None)
+    config.get_sumo_output_args = lambda: ["--no-step-log", "true"]
+    outbound.configure(workers=0)
+
+    sim = V2XSimulator(route_override=route_file)
+    sim.initialize()
+
+    # Messaggi nell'ordine di publish (publish sincrono: quello del loop di simulazione)
+    digest, counts = hashlib.sha256(), {}
+    publish = transport.active.publish
+
+    def capture(station_id, message_type, payload):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, sort_keys=True).encode()
+        body = GENERATION_DELTA_TIME.sub(b'"generationDeltaTime":0', body)
+        digest.update(f"{station_id}:{message_type}:".encode() + body + b"\n")
+        counts[message_type] = counts.get(message_type, 0) + 1
+        return publish(station_id, message_type, payload)
+
+    transport.active.publish = capture
+
+    t0 = time.perf_counter()
+    sim.run(close=False)
+    elapsed = time.perf_counter() - t0
+    sim_seconds = sumo.simulation.getTime()
+    sim.shutdown()
+    return {"seconds": elapsed, "sim_seconds": sim_seconds, "steps": round(sim_seconds / config.SUMO_STEP_LENGTH),
+            "digest": digest.hexdigest(), "messages": counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark record/replay dello stato dei veicoli")
+    parser.add_argument("--vehicles", type=int, default=52, help="Numero veicoli nel file rotte generato")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Ripetizioni del replay (best of)")
+    parser.add_argument("--backend", type=str, choices=["traci", "libsumo"], default="libsumo", help="Backend della run live")
+    parser.add_argument("--worker", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--trace", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--route-file", type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.chdir(V2X_DIR)
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.trace, args.route_file, args.seed, args.backend)))
+        return
+
+    from batch_run import generate_route_file
+
+    def worker(mode, route_file, trace_dir):
+        # Un processo per run: libsumo supporta una sola istanza per processo
+        out = subprocess.run(
+            [sys.executable, __file__, "--worker", mode, "--trace", trace_dir, "--route-file", route_file,
+             "--seed", str(args.seed), "--backend", args.backend],
+            check=True, capture_output=True, text=True
+        )
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        route_file = os.path.join(tmp, f"cars_{args.vehicles}.rou.xml")
+        trace_dir = os.path.join(tmp, "trace")
+        generate_route_file(route_file, args.vehicles)
+
+        live = worker("live", route_file, trace_dir)
+        replays = [worker("replay", route_file, trace_dir) for _ in range(args.repeat)]
+        trace_bytes = sum(os.path.getsize(os.path.join(trace_dir, name)) for name in os.listdir(trace_dir))
+
+    for replay in replays:
+        if replay["digest"] != live["digest"] or replay["messages"] != live["messages"]:
+            print(f"ERRORE: messaggi del replay diversi dalla run live ({replay['messages']} vs {live['messages']})")
+            sys.exit(1)
+    replay = min(replays, key=lambda res: res["seconds"])
+
+    print(f"Messaggi identici: {sum(live['messages'].values())} ({', '.join(f'{k} {v}' for k, v in sorted(live['messages'].items()))}), "
+          f"digest {live['digest'][:16]}")
+    print(f"Trace: {live['steps']} step, {trace_bytes / 1024:.0f} KiB\n")
+    print(f"{'RUN':<8} | {'STEPS':>6} | {'TEMPO (s)':>9} | {'STEP (ms)':>9} | {'RTF':>8}")
+    print("-" * 52)
+    for name, res in (("live", live), ("replay", replay)):
+        print(f"{name:<8} | {res['steps']:>6} | {res['seconds']:>9.3f} | {res['seconds'] / res['steps'] * 1e3:>9.4f} | "
+              f"{res['sim_seconds'] / res['seconds']:>7.1f}x")
+    print(f"\nReplay {live['seconds'] / replay['seconds']:.1f}x più veloce della run live (best of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
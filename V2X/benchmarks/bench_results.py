@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark dell'analisi degli output (results.py): ET.parse di ogni file in un solo processo
+(come la vecchia analyze_batch.py) vs iterparse in streaming su un pool di processi.
+
+Genera un batch sintetico di run (stats + tripinfo, una parte compressa in .xml.gz) e, prima
+della misura, verifica che i due metodi producano le stesse colonne per veicolo e le stesse
+statistiche per run, e che i 95° percentili per run coincidano con np.percentile.
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_results.py --runs 40 --trips 5000 --jobs 4
+"""
+
+import os
+import sys
+import gzip
+import time
+import shutil
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from results import STATS_FIELDS, TRIPINFO_COLUMNS, AGGREGATE_COLUMNS, ResultsTable, analyze, find_runs, open_output
+
+
+def write_run(prefix, trips, rng, compress):
+    """Output sintetici di una run nel formato di SUMO."""
+    values = {name: rng.uniform(0, 500, trips).round(2) for name in TRIPINFO_COLUMNS}
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', "<tripinfos>"]
+    for i in range(trips):
+        attrs = " ".join(f'{name}="{values[name][i]:.2f}"' for name in TRIPINFO_COLUMNS)
+        lines.append(f'    <tripinfo id="{i}" {attrs} vType="DEFAULT_VEHTYPE"/>')
+    lines.append("</tripinfos>\n")
+    tripinfo = f"{prefix}_tripinfo.xml"
+    if compress:
+        with gzip.open(tripinfo + ".gz", "wt") as f:
+            f.write("\n".join(lines))
+    else:
+        with open(tripinfo, "w") as f:
+            f.write("\n".join(lines))
+
+    stats = " ".join(f'{name}="{rng.uniform(0, 100):.2f}"' for name in STATS_FIELDS)
+    with open(f"{prefix}_stats.xml", "w") as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<statistics>\n    <vehicleTripStatistics {stats}/>\n</statistics>\n')
+
+
+def parse_tree(directory):
+    """Riferimento: albero completo in memoria per ogni file, run in serie."""
+    runs, columns = [], {name: [] for name in ("id", *TRIPINFO_COLUMNS)}
+    for run in find_runs([directory]):
+        with open_output(run.stats) as f:
+            stats = ET.parse(f).getroot().find("vehicleTripStatistics")
+        runs.append({f"stats_{k}": float(stats.get(k)) for k in STATS_FIELDS})
+        with open_output(run.tripinfo) as f:
+            for trip in ET.parse(f).getroot().iter("tripinfo"):
+                columns["id"].append(trip.get("id"))
+                for name in TRIPINFO_COLUMNS:
+                    columns[name].append(float(trip.get(name)))
+    return runs, columns
+
+
+def check(directory, jobs):
+    runs, columns = parse_tree(directory)
+    table = analyze([directory], jobs=jobs)
+    for name, values in columns.items():
+        if not np.array_equal(table.vehicles[name], np.array(values, dtype=table.vehicles[name].dtype)):
+            raise SystemExit(f"Colonna '{name}' diversa tra ET.parse e streaming")
+    for expected, row in zip(runs, table.run_aggregates()):
+        if any(row[key] != value for key, value in expected.items()):
+            raise SystemExit(f"Statistiche diverse per {row['prefix']}")
+    check_percentiles(table)
+    return len(table)
+
+
+def check_percentiles(table):
+    """95° percentile per run di run_aggregates contro np.percentile (anche con pochi trip)."""
+    rng = np.random.default_rng(0)
+    trips = [1, 2, 3, 5, 19, 20, 21]
+    small = ResultsTable.from_parsed([
+        ({"prefix": f"small_{n}"}, {"id": np.arange(n).astype(str), "managed": np.zeros(n),
+                                    **{name: rng.uniform(0, 50, n) for name in TRIPINFO_COLUMNS}})
+        for n in trips
+    ])
+    for checked in (table, small):
+        v = checked.vehicles
+        for i, row in enumerate(checked.run_aggregates()):
+            for name in AGGREGATE_COLUMNS:
+                expected = np.percentile(v[name][v["run"] == i], 95)
+                if not np.isclose(row[f"{name}_p95"], expected):
+                    raise SystemExit(f"{name}_p95 di {row['prefix']}: {row[f'{name}_p95']} invece di {expected} (np.percentile)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark analisi degli output SUMO")
+    parser.add_argument("--runs", type=int, default=40)
+    parser.add_argument("--trips", type=int, default=5000, help="Tripinfo per run")
+    parser.add_argument("--compressed", type=float, default=0.5, help="Frazione di run con tripinfo .xml.gz")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_results_")
+    try:
+        rng = np.random.default_rng(args.seed)
+        for i in range(args.runs):
+            write_run(os.path.join(directory, f"V2X_v{args.trips}_s{i}"), args.trips, rng, i < args.runs * args.compressed)
+        trips = check(directory, args.jobs)
+
+        t0 = time.perf_counter()
+        parse_tree(directory)
+        tree = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        analyze([directory], jobs=1)
+        streaming = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        analyze([directory], jobs=args.jobs)
+        pool = time.perf_counter() - t0
+
+        print(f"{'RUN':>5} | {'TRIP':>8} | {'ET.parse (s)':>12} | {'STREAMING (s)':>13} | {f'POOL x{args.jobs} (s)':>13} | {'SPEEDUP':>7}")
+        print("-" * 76)
+        print(f"{args.runs:>5} | {trips:>8} | {tree:>12.2f} | {streaming:>13.2f} | {pool:>13.2f} | {tree / pool:>6.1f}x")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
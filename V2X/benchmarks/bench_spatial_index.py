@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark query dei vicini delle RSU: distanza RSU->veicolo su tutti i veicoli
+(approccio precedente, ripetuto per ogni tipo di messaggio) vs griglia uniforme
+ricostruita ad ogni step con un'unica query per RSU.
+
+Verifica anche che i due metodi restituiscano gli stessi vicini.
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_spatial_index.py --rsus 1 10 50 --vehicles 100 1000 5000
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from spatial_index import UniformGrid
+
+
+def brute_force(rsu_xy, xs, ys, radius, msg_types):
+    """Una scansione completa dei veicoli per ogni RSU e per ogni tipo di messaggio."""
+    result = []
+    for px, py in rsu_xy:
+        for _ in range(msg_types):
+            distances = np.hypot(xs - px, ys - py)
+            near = np.flatnonzero(distances <= radius)
+        result.append(near)
+    return result
+
+
+def grid(index, rsu_xy, xs, ys, radius):
+    """Ricostruzione dell'indice + una query per RSU (condivisa tra i tipi di messaggio)."""
+    index.build(xs, ys)
+    return [ids for ids, _ in index.query_many(rsu_xy, radius)]
+
+
+def measure(fn, steps):
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        fn()
+    return (time.perf_counter() - t0) / steps * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indice spaziale RSU")
+    parser.add_argument("--rsus", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--radius", type=float, default=100.0)
+    parser.add_argument("--msg-types", type=int, default=2, help="Tipi di messaggio non-CAM per RSU")
+    parser.add_argument("--area", type=float, default=3000.0, help="Lato dell'area simulata (m)")
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    index = UniformGrid(args.radius)
+
+    print(f"{'RSU':>4} | {'VEICOLI':>7} | {'BRUTE (ms)':>10} | {'GRIGLIA (ms)':>12} | {'SPEEDUP':>7}")
+    print("-" * 53)
+    for n_rsus in args.rsus:
+        rsu_xy = [tuple(p) for p in rng.uniform(0, args.area, (n_rsus, 2))]
+        for n_vehicles in args.vehicles:
+            xs = rng.uniform(0, args.area, n_vehicles)
+            ys = rng.uniform(0, args.area, n_vehicles)
+
+            # Equivalenza: stessi vicini per ogni RSU
+            expected = brute_force(rsu_xy, xs, ys, args.radius, 1)
+            got = grid(index, rsu_xy, xs, ys, args.radius)
+            for a, b in zip(expected, got):
+                if not np.array_equal(np.sort(a), np.sort(b)):
+                    raise SystemExit(f"Vicini diversi con {n_rsus} RSU e {n_vehicles} veicoli")
+
+            t_brute = measure(lambda: brute_force(rsu_xy, xs, ys, args.radius, args.msg_types), args.steps)
+            t_grid = measure(lambda: grid(index, rsu_xy, xs, ys, args.radius), args.steps)
+            print(f"{n_rsus:>4} | {n_vehicles:>7} | {t_brute:>10.3f} | {t_grid:>12.3f} | {t_brute / t_grid:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
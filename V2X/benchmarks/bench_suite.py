@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Suite di benchmark offline (senza SUMO né container): tempi per operazione di trigger,
+messaggi, publish MQTT e step del simulatore, salvati in JSON e confrontati con una baseline.
+
+Casi:
+- trigger.cam.evaluate                 ETSICAMTrigger.evaluate su stati sintetici (tutti i rami)
+- trigger.mcm_request.evaluate[n]      RSUMCMRequestTrigger.evaluate con n vicini
+- trigger.mcm_termination.evaluate[n]  RSUMCMTerminationTrigger.evaluate con n vicini
+- message.<tipo>.build_payload         build_payload + json.dumps, per ogni tipo di MessageFactory
+- message.<tipo>.serialize             serialize (scheletro pre-renderizzato)
+- mqtt.publish                         MQTTManager.publish verso un client nullo (ack immediato)
+- step[N]                              V2XSimulator.step su un backend SUMO sintetico con N
+                                       veicoli (trasporto null, publish sincrono)
+
+Ogni caso è misurato con timeit (ripetizioni da almeno 0.2 s); il JSON riporta, per caso,
+ns per operazione (minimo e mediana delle ripetizioni). `compare` confronta i minimi e termina
+con codice 1 se un caso è più lento della baseline oltre la soglia.
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_suite.py run --output benchmarks/results/latest.json
+    python3 benchmarks/bench_suite.py run --quick --only "trigger.*"
+    python3 benchmarks/bench_suite.py compare benchmarks/results/baseline.json benchmarks/results/latest.json --threshold 0.10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import timeit
+import fnmatch
+import logging
+import argparse
+import platform
+import statistics
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from traci import constants as tc
+
+import config
+from entities.state_table import VehicleStateTable, SIGNAL_BLINKER_LEFT
+from experiment import git_revision
+from messages import MessageFactory
+from triggers.etsi_cam_trigger import ETSICAMTrigger
+from triggers.mcm_trigger import RSUMCMRequestTrigger, RSUMCMTerminationTrigger
+from bench_messages import CASES as MESSAGE_CASES, generic
+
+NEIGHBORS = (10, 100, 1000)
+POPULATIONS = (10, 100, 1000, 10000)
+SAMPLES = 1000  # Operazioni per chiamata nei casi a campioni (stati, messaggi, publish)
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], None]]  # Prepara i dati e restituisce la funzione misurata
+    ops: int = 1  # Operazioni per chiamata della funzione misurata
+
+
+# --- Trigger -----------------------------------------------------------------------------
+
+def _cam_states(rng: random.Random, n: int) -> list[tuple[float, dict, Optional[dict]]]:
+    """(tempo, stato, stato dell'ultimo CAM): primo invio, timeout, soglie superate e non."""
+    samples = []
+    for _ in range(n):
+        t = rng.uniform(10, 1000)
+        state = {"x": rng.uniform(0, 3000), "y": rng.uniform(0, 3000), "speed": rng.uniform(0, 30), "heading": rng.uniform(0, 360)}
+        kind = rng.randrange(4)
+        if kind == 0:
+            prev = None
+        else:
+            dt = {1: 1.2, 2: 0.4, 3: 0.15}[kind]  # Timeout, vicino alla soglia, ancora bloccato
+            jitter = rng.choice([0.0, 0.3, 5.0])
+            prev = {"time": t - dt, "x": state["x"] - jitter, "y": state["y"], "speed": state["speed"] - jitter / 10,
+                    "heading": (state["heading"] - jitter) % 360, "t_gen_cam": rng.choice([0.1, 0.5, 1.0]), "n_gen_cam": 3}
+        samples.append((t, state, prev))
+    return samples
+
+
+def cam_trigger_case() -> Callable[[], None]:
+    trigger = ETSICAMTrigger()
+    samples = _cam_states(random.Random(0), SAMPLES)
+
+    def run():
+        for t, state, prev in samples:
+            trigger.evaluate("veh", t, state, prev)
+    return run
+
+
+def _neighbor_table(n: int, rng: np.random.Generator, blinker: bool = False) -> tuple[VehicleStateTable, list]:
+    """n vicini di una RSU come viste sulla tabella (come V2XSimulator._rsu_neighbors)."""
+    table = VehicleStateTable(capacity=n)
+    for i in range(1, n + 1):
+        slot = table.allocate(str(i), i)
+        table.x[slot], table.y[slot] = rng.uniform(400, 600, 2)
+        table.speed[slot] = rng.uniform(0, 15)
+    # Veicoli gestiti senza freccia (salvo blinker): nessuna manovra avviata, tutti i vicini esaminati
+    if blinker:
+        table.signals[table.slot_of(config.MANAGED_VEHICLES[0])] = SIGNAL_BLINKER_LEFT
+    slots = table.active_slots()
+    return table, table.neighbors(slots, rng.uniform(0, 100, len(slots)))
+
+
+def mcm_request_case(n: int) -> Callable[[], Callable[[], None]]:
+    def setup():
+        trigger = RSUMCMRequestTrigger()
+        _, neighbors = _neighbor_table(n, np.random.default_rng(n))
+        state = {"station_id": 0, "neighbors": neighbors}
+        prev = {"processed_vehicles": {}}
+
+        def run():
+            trigger.evaluate("0", 1.0, state, prev)
+        return run
+    return setup
+
+
+def mcm_termination_case(n: int) -> Callable[[], Callable[[], None]]:
+    def setup():
+        trigger = RSUMCMTerminationTrigger()
+        table, neighbors = _neighbor_table(n, np.random.default_rng(n), blinker=True)
+        active = [table.station_id[table.slot_of(vid)] for vid in config.MANAGED_VEHICLES if vid in table]
+        state = {"station_id": 0, "neighbors": neighbors, "active_manoeuvre_ids": [int(sid) for sid in active]}
+        prev = trigger.evaluate("0", 0.0, state, None).new_state  # Frecce ancora accese: nessuna Termination
+
+        def run():
+            trigger.evaluate("0", 1.0, state, prev)
+        return run
+    return setup
+
+
+# --- Messaggi ----------------------------------------------------------------------------
+
+def _message_samples(message_type: str) -> Optional[list[dict]]:
+    """Dati sintetici dai generatori di bench_messages.py (None se il tipo non ne ha uno)."""
+    generators = [gen for mtype, gen in MESSAGE_CASES.values() if mtype == message_type]
+    if not generators:
+        return None
+    rng = random.Random(0)
+    return [generators[i % len(generators)](rng) for i in range(SAMPLES)]
+
+
+def message_case(message_type: str, samples: list[dict], fast: bool) -> Callable[[], Callable[[], None]]:
+    def setup():
+        def run():
+            for gen_delta_time, data in enumerate(samples):
+                message = MessageFactory.create(message_type, gen_delta_time)
+                message.serialize(data) if fast else generic(message, data)
+        return run
+    return setup
+
+
+# --- MQTT --------------------------------------------------------------------------------
+
+class NullClient:
+    """Client paho nullo: publish riuscito e ack immediato, come un socket sempre scrivibile."""
+
+    def __init__(self, manager, station_id: int):
+        import paho.mqtt.client as mqtt
+        self._manager = manager
+        self._userdata = {"station_id": station_id}
+        self._success = mqtt.MQTT_ERR_SUCCESS
+        self._mid = 0
+
+    def publish(self, topic: str, payload: bytes):
+        self._mid += 1
+        # on_publish prima del ritorno di publish: percorso degli ack anticipati di MQTTManager
+        self._manager._on_publish(self, self._userdata, self._mid)
+        return SimpleNamespace(rc=self._success, mid=self._mid)
+
+
+def mqtt_publish_case() -> Callable[[], None]:
+    from mqtt_manager import MQTTManager
+
+    manager = MQTTManager()
+    station_id = next(sid for sid, station in config.STATIONS.items() if station.get("ip"))
+    manager._clients[station_id] = NullClient(manager, station_id)
+    manager._connected.add(station_id)
+    message_type, generator = MESSAGE_CASES["cam (veicolo)"]
+    payload = MessageFactory.create(message_type, 0).serialize(generator(random.Random(0)))
+
+    def run():
+        for _ in range(SAMPLES):
+            manager.publish(station_id, message_type, payload)
+    return run
+
+
+# --- Step del simulatore -----------------------------------------------------------------
+
+class SyntheticSumo:
+    """
+    Backend SUMO sintetico con l'interfaccia usata da V2XSimulator: n veicoli in moto
+    rettilineo in un'area centrata sulla prima RSU, con ricambio (arrivi e partenze) ad ogni
+    step. Lo step misurato include la costruzione dei risultati di sottoscrizione, l'analogo
+    della decodifica di traci/libsumo.
+    """
+
+    name = "synthetic"
+    TraCIException = RuntimeError
+
+    def __init__(self, n_vehicles: int, seed: int = 0, area: float = 1000.0, turnover: float = 0.01):
+        self.n_vehicles = n_vehicles
+        self.seed = seed
+        self.area = area
+        self.turnover = turnover
+        self.simulation = SimpleNamespace(
+            getTime=lambda: self.time, getSubscriptionResults=lambda: self._sim_results,
+            subscribe=lambda variables: None, getMinExpectedNumber=lambda: len(self.ids),
+        )
+        self.vehicle = SimpleNamespace(subscribe=lambda veh_id, variables: None, getAllSubscriptionResults=self._vehicle_results)
+        self.load([])
+
+    def load(self, args: list) -> None:
+        """Nuova run: tutti i veicoli partono al primo step."""
+        self.rng = np.random.default_rng(self.seed)
+        self.time = 0.0
+        self.next_id = 1
+        self.ids: list[str] = []
+        self._pending = self._new_ids(self.n_vehicles)
+        self._sim_results = {}
+        n, (x0, y0) = self.n_vehicles, next(iter(config.RSU_CONFIG.values()))["position"]
+        self.x = x0 + self.rng.uniform(-self.area / 2, self.area / 2, n)
+        self.y = y0 + self.rng.uniform(-self.area / 2, self.area / 2, n)
+        self.speed = self.rng.uniform(0, 20, n)
+        self.heading = self.rng.uniform(0, 360, n)
+        self._origin = (x0 - self.area / 2, y0 - self.area / 2)
+
+    def close(self) -> None:
+        pass
+
+    def _new_ids(self, count: int) -> list[str]:
+        ids = [str(i) for i in range(self.next_id, self.next_id + count)]
+        self.next_id += count
+        return ids
+
+    def simulationStep(self) -> None:
+        dt = config.SUMO_STEP_LENGTH
+        self.time += dt
+        rad = np.radians(self.heading)
+        self.x = self._origin[0] + (self.x + np.sin(rad) * self.speed * dt - self._origin[0]) % self.area
+        self.y = self._origin[1] + (self.y + np.cos(rad) * self.speed * dt - self._origin[1]) % self.area
+
+        arrived = []
+        if self._pending:
+            # Primo step: partenza dell'intera popolazione
+            departed, self.ids, self._pending = self._pending, self._pending, []
+        else:
+            idx = np.flatnonzero(self.rng.random(len(self.ids)) < self.turnover).tolist()
+            departed = self._new_ids(len(idx))
+            for i, veh_id in zip(idx, departed):
+                arrived.append(self.ids[i])
+                self.ids[i] = veh_id
+        self._sim_results = {tc.VAR_DEPARTED_VEHICLES_IDS: tuple(departed), tc.VAR_ARRIVED_VEHICLES_IDS: tuple(arrived)}
+
+    def _vehicle_results(self) -> dict:
+        return {
+            veh_id: {tc.VAR_POSITION: (x, y), tc.VAR_SPEED: speed, tc.VAR_ANGLE: heading, tc.VAR_ACCELERATION: 0.0, tc.VAR_SIGNALS: 0}
+            for veh_id, x, y, speed, heading in zip(self.ids, self.x.tolist(), self.y.tolist(), self.speed.tolist(), self.heading.tolist())
+        }
+
+
+def step_case(n_vehicles: int, steps: int, warmup: int = 5) -> Callable[[], Callable[[], None]]:
+    def setup():
+        from main import V2XSimulator
+        from outbound import outbound
+        from sumo_backend import sumo
+
+        # initialize() ripete per ogni caso gli stessi avvisi (trigger non registrati)
+        logging.getLogger().setLevel(logging.ERROR)
+        config.SUMO_GUI = False
+        config.SIMULATION_MODE = "V2X"
+        config.TRANSPORT_CONFIG.update(backend="null", all_stations=True)
+        config.get_sumo_output_args = lambda: []
+        if not outbound.running: outbound.configure(workers=0)
+
+        # Backend sintetico al posto del modulo traci/libsumo; _sumo_started: initialize() usa load
+        backend = SyntheticSumo(n_vehicles)
+        sumo.use(backend, backend.name)
+        sim = V2XSimulator()
+        sim._sumo_started = True
+        sim.initialize()
+        for _ in range(warmup):
+            sim.step()
+
+        def run():
+            for _ in range(steps):
+                sim.step()
+        return run
+    return setup
+
+
+# --- Esecuzione e confronto --------------------------------------------------------------
+
+def build_cases(quick: bool) -> list[Case]:
+    cases = [Case("trigger.cam.evaluate", lambda: cam_trigger_case(), SAMPLES)]
+    for n in NEIGHBORS:
+        cases.append(Case(f"trigger.mcm_request.evaluate[{n}]", mcm_request_case(n)))
+        cases.append(Case(f"trigger.mcm_termination.evaluate[{n}]", mcm_termination_case(n)))
+    for message_type in MessageFactory.get_available_types():
+        samples = _message_samples(message_type)
+        if samples is None:
+            print(f"  {message_type}: nessun generatore di dati in bench_messages.py, saltato")
+            continue
+        cases.append(Case(f"message.{message_type}.build_payload", message_case(message_type, samples, fast=False), SAMPLES))
+        cases.append(Case(f"message.{message_type}.serialize", message_case(message_type, samples, fast=True), SAMPLES))
+    cases.append(Case("mqtt.publish", mqtt_publish_case, SAMPLES))
+    # Ogni chiamata copre T_GenCamMax simulato: stesso carico di CAM in ogni ripetizione
+    steps = max(1, round(config.CAM_TRIGGER_CONFIG.get("t_gen_cam_max", 1.0) / config.SUMO_STEP_LENGTH))
+    for n in POPULATIONS[:-1] if quick else POPULATIONS:
+        cases.append(Case(f"step[{n}]", step_case(n, steps), steps))
+    return cases
+
+
+def measure(fn: Callable[[], None], ops: int, repeat: int) -> dict:
+    """ns per operazione: ripetizioni da almeno 0.2 s (timeit.autorange)."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    per_op = [t / number / ops * 1e9 for t in timer.repeat(repeat, number)]
+    return {"min": min(per_op), "median": statistics.median(per_op), "ops": ops * number, "repeat": repeat}
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def run(args) -> None:
+    results = {}
+    for case in build_cases(args.quick):
+        if args.only and not any(fnmatch.fnmatchcase(case.name, pattern) for pattern in args.only):
+            continue
+        try:
+            fn = case.setup()
+        except ImportError as e:
+            print(f"{case.name:<40} saltato ({e})")
+            continue
+        results[case.name] = measure(fn, case.ops, args.repeat)
+        print(f"{case.name:<40} {format_ns(results[case.name]['min']):>12}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "unit": "ns/op",
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRisultati salvati in {args.output}")
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    print(f"Baseline: {baseline.get('git_revision')} ({baseline.get('created')})")
+    print(f"Attuale:  {current.get('git_revision')} ({current.get('created')})\n")
+
+    regressions = 0
+    print(f"{'CASO':<40} | {'BASELINE':>12} | {'ATTUALE':>12} | {'VARIAZIONE':>10}")
+    print("-" * 84)
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<40} | {'-':>12} | {format_ns(result['min']):>12} | {'nuovo':>10}")
+            continue
+        change = result["min"] / old["min"] - 1
+        flag = ""
+        if change > args.threshold:
+            flag, regressions = "  REGRESSIONE", regressions + 1
+        elif change < -args.threshold:
+            flag = "  miglioramento"
+        print(f"{name:<40} | {format_ns(old['min']):>12} | {format_ns(result['min']):>12} | {change:>+10.1%}{flag}")
+    missing = sorted(set(baseline["results"]) - set(current["results"]))
+    if missing:
+        print(f"\nCasi della baseline non misurati: {', '.join(missing)}")
+
+    print(f"\n{regressions} regressioni oltre la soglia del {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite di benchmark offline con confronto su baseline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Esegue i benchmark e salva i risultati in JSON")
+    run_parser.add_argument("--output", type=str, default=os.path.join(V2X_DIR, "benchmarks", "results", "latest.json"))
+    run_parser.add_argument("--only", type=str, action="append", help="Solo i casi che corrispondono al pattern (glob, ripetibile)")
+    run_parser.add_argument("--quick", action="store_true", help=f"Senza lo step da {POPULATIONS[-1]} veicoli")
+    run_parser.add_argument("--repeat", type=int, default=5)
+
+    compare_parser = commands.add_parser("compare", help="Confronta i risultati con una baseline (codice 1 se ci sono regressioni)")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Rallentamento tollerato (0.10 = +10%%)")
+
+    args = parser.parse_args()
+    os.chdir(V2X_DIR)
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
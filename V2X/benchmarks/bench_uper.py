@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Codifica ASN.1 UPER (messages/uper.py): verifica offline e dimensioni reali dei messaggi.
+
+Per ogni messaggio sintetico codifica in UPER, decodifica e confronta con il payload JSON
+dei builder (in unità ETSI): i due devono coincidere. Riporta poi dimensione media JSON
+vs UPER (byte sul broker / over-the-air) e messaggi/s di codifica.
+
+Richiede asn1tools. Di default usa i moduli ASN.1 di V2X/asn1 (ASN1_CONFIG["asn1_dir"]);
+con --asn1-dir si verifica lo schema di un'installazione (es. la cartella asn1 di vanetza-nap).
+
+Uso (dalla cartella V2X):
+    python3 benchmarks/bench_uper.py --messages 2000
+    python3 benchmarks/bench_uper.py --asn1-dir ../../vanetza-nap/asn1
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+
+V2X_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, V2X_DIR)
+
+from config import ASN1_CONFIG
+from messages import MessageFactory
+from messages.uper import UperEncoder, to_etsi_units
+from bench_messages import CASES
+
+
+def check_round_trip(encoder: UperEncoder, message_type: str, samples: list[dict]) -> int:
+    """Verifica encode/decode contro i builder JSON; restituisce i messaggi con valori "unavailable"."""
+    unavailable = 0
+    for gen_delta_time, data in enumerate(samples):
+        message = MessageFactory.create(message_type, gen_delta_time)
+        station_id, decoded = encoder.decode_payload(message_type, encoder.encode(message, data))
+        expected = json.loads(json.dumps(message.build_payload(to_etsi_units(data))))
+        # Valori fuori range (es. velocità negative in retromarcia) codificati come "unavailable"
+        normalized = encoder.normalize_payload(message_type, expected)
+        unavailable += normalized != expected
+        if decoded != normalized or station_id != data["station_id"]:
+            raise SystemExit(f"{message_type}: round-trip diverso per {data}\n  atteso:  {normalized}\n  ottenuto: {decoded}")
+    return unavailable
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-trip e dimensioni UPER di CAM/MCM")
+    parser.add_argument("--asn1-dir", default=ASN1_CONFIG["asn1_dir"])
+    parser.add_argument("--cache-dir", default=ASN1_CONFIG.get("cache_dir"))
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # I valori codificati come "unavailable" sono contati nella colonna UNAVAIL.
+    logging.getLogger("messages.uper").setLevel(logging.ERROR)
+    t0 = time.perf_counter()
+    encoder = UperEncoder(args.asn1_dir, ASN1_CONFIG["pdus"], args.cache_dir)
+    print(f"Moduli ASN.1 pronti in {time.perf_counter() - t0:.2f}s")
+
+    print(f"{'MESSAGGIO':>16} | {'JSON (B)':>8} | {'UPER (B)':>8} | {'RIDUZIONE':>9} | {'UPER (msg/s)':>12} | {'UNAVAIL.':>8}")
+    print("-" * 79)
+    for name, (message_type, make_data) in CASES.items():
+        if encoder.pdu_key(message_type) not in encoder.pdus:
+            continue
+        rng = random.Random(args.seed)
+        samples = [make_data(rng) for _ in range(args.messages)]
+        unavailable = check_round_trip(encoder, message_type, samples)
+
+        json_bytes = uper_bytes = 0
+        t0 = time.perf_counter()
+        for gen_delta_time, data in enumerate(samples):
+            uper_bytes += len(encoder.encode(MessageFactory.create(message_type, gen_delta_time), data))
+        rate = len(samples) / (time.perf_counter() - t0)
+        for gen_delta_time, data in enumerate(samples):
+            json_bytes += len(MessageFactory.create(message_type, gen_delta_time).serialize(data))
+
+        n = len(samples)
+        print(f"{name:>16} | {json_bytes / n:>8.0f} | {uper_bytes / n:>8.1f} | {json_bytes / uper_bytes:>8.1f}x | {rate:>12,.0f} | {unavailable:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Modello di canale radio per il trasporto loopback (consegna in-process senza docker).
+
+I messaggi trasmessi via radio non arrivano subito e a tutti: per ogni collegamento
+mittente -> ricevente il modello decide se il messaggio arriva e dopo quanto.
+
+- Posizioni: snapshot per step delle stazioni (veicoli della tabella e RSU), coordinate SUMO
+- Portata: cutoff a max_range ("range") oppure path loss log-distance con shadowing
+  log-normale confrontato con la sensibilità del ricevitore ("log_distance")
+- Perdita: probabilità indipendente per collegamento, oltre al path loss
+- Latenza: minima + componente casuale (uniforme o esponenziale)
+- Coda eventi ordinata per tempo di consegna, rilasciata dal simulatore a fine step: heap di
+  blocchi (uno per step di trasmissione) con le consegne in array NumPy ordinati per istante
+- Scala: i ricevitori entro portata si trovano con UniformGrid (celle di lato max_range),
+  un'unica query_many per tutti i messaggi dello step invece del confronto tra tutte le coppie
+- Determinismo: i messaggi dello step sono ordinati per (mittente, sequenza) e le estrazioni
+  casuali vengono da un generatore derivato da (seed, tempo dello step), qualunque sia
+  l'ordine in cui i worker della pipeline di uscita li hanno pubblicati
+"""
+
+import heapq
+import logging
+import threading
+from typing import Any
+
+import numpy as np
+
+from spatial_index import UniformGrid
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_MODELS = ("range", "log_distance")
+JITTER_DISTRIBUTIONS = ("uniform", "exponential")
+
+
+class ChannelModel:
+    """
+    Canale radio tra le stazioni: send() dai thread che pubblicano, set_positions() e
+    advance() dal loop di simulazione a fine step.
+    """
+
+    def __init__(
+        self,
+        model: str = "range",
+        max_range: float = 300.0,
+        loss: float = 0.0,
+        latency: float = 0.002,
+        jitter: float = 0.0,
+        jitter_distribution: str = "uniform",
+        tx_power: float = 23.0,
+        sensitivity: float = -85.0,
+        reference_loss: float = 47.9,
+        path_loss_exponent: float = 2.7,
+        shadowing: float = 4.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            model: "range" (consegna entro max_range) o "log_distance" (path loss vs sensibilità)
+            max_range: Portata massima (m); anche lato delle celle dell'indice spaziale
+            loss: Probabilità di perdita indipendente per collegamento
+            latency: Latenza minima di consegna (s)
+            jitter: Componente casuale della latenza (s): ampiezza (uniform) o media (exponential)
+            jitter_distribution: "uniform" o "exponential"
+            tx_power: Potenza trasmessa (dBm, log_distance)
+            sensitivity: Potenza minima ricevibile (dBm, log_distance)
+            reference_loss: Path loss a 1 m (dB, log_distance; 47.9 = spazio libero a 5.9 GHz)
+            path_loss_exponent: Esponente del path loss (log_distance)
+            shadowing: Deviazione standard dello shadowing log-normale (dB, log_distance)
+            seed: Seed delle estrazioni casuali (di norma SUMO_SEED)
+        """
+        if model not in CHANNEL_MODELS:
+            raise ValueError(f"Modello di canale '{model}' non supportato (scegli tra {CHANNEL_MODELS})")
+        if jitter_distribution not in JITTER_DISTRIBUTIONS:
+            raise ValueError(f"Distribuzione del jitter '{jitter_distribution}' non supportata (scegli tra {JITTER_DISTRIBUTIONS})")
+        if max_range <= 0:
+            raise ValueError("max_range deve essere positivo")
+        if not 0.0 <= loss <= 1.0:
+            raise ValueError("loss deve essere una probabilità in [0, 1]")
+
+        self.model = model
+        self.max_range = float(max_range)
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.jitter_distribution = jitter_distribution
+        self.tx_power = tx_power
+        self.sensitivity = sensitivity
+        self.reference_loss = reference_loss
+        self.path_loss_exponent = path_loss_exponent
+        self.shadowing = shadowing
+        self.seed = seed
+
+        self._grid = UniformGrid(self.max_range)
+        self._now = 0.0
+        self._station_ids = np.zeros(0, dtype=np.int64)
+        self._sorted_ids = np.zeros(0, dtype=np.int64)
+        self._sorted_index = np.zeros(0, dtype=np.intp)
+        self._xs = np.zeros(0, dtype=np.float64)
+        self._ys = np.zeros(0, dtype=np.float64)
+
+        # Messaggi trasmessi nello step: (mittente, sequenza, topic, payload)
+        self._pending: list[tuple[int, int, str, Any]] = []
+        self._sequence: dict[int, int] = {}
+        self._lock = threading.Lock()
+        # Heap di blocchi (prima consegna, id blocco, istanti, indici dei messaggi, riceventi, messaggi):
+        # in ogni blocco le consegne sono ordinate per (istante, mittente, sequenza, ricevente)
+        self._events: list[tuple[float, int, np.ndarray, np.ndarray, np.ndarray, list]] = []
+        self._blocks = 0
+        self._in_flight = 0
+
+        # Metriche
+        self.sent = 0
+        self.unpositioned = 0  # messaggi di mittenti senza posizione nello step (non trasmessi)
+        self.links = 0  # collegamenti entro portata
+        self.lost = 0
+        self.scheduled = 0  # collegamenti riusciti, in coda eventi fino all'istante di consegna
+        self.released = 0
+        self._latency_sum = 0.0
+
+    @classmethod
+    def from_config(cls, channel_config: dict, seed: int = 0) -> "ChannelModel":
+        return cls(**{k: v for k, v in channel_config.items() if k != "enabled"}, seed=seed)
+
+    def send(self, sender: int, topic: str, payload: Any) -> None:
+        """Trasmette un messaggio via radio (thread-safe; collegamenti calcolati in advance)."""
+        with self._lock:
+            seq = self._sequence.get(sender, 0)
+            self._sequence[sender] = seq + 1
+            self._pending.append((sender, seq, topic, payload))
+
+    def set_positions(self, sim_time: float, station_ids, xs, ys) -> None:
+        """Snapshot delle posizioni delle stazioni per i messaggi trasmessi nello step sim_time."""
+        self._now = sim_time
+        self._station_ids = np.asarray(station_ids, dtype=np.int64)
+        self._xs = np.asarray(xs, dtype=np.float64)
+        self._ys = np.asarray(ys, dtype=np.float64)
+        self._grid.build(self._xs, self._ys)
+        self._sorted_index = np.argsort(self._station_ids, kind="stable")
+        self._sorted_ids = self._station_ids[self._sorted_index]
+
+    def advance(self, until: float) -> list[tuple[int, str, Any]]:
+        """
+        Calcola i collegamenti dei messaggi trasmessi dall'ultima chiamata e restituisce,
+        in ordine di consegna, quelli che arrivano entro `until`.
+
+        Returns:
+            Lista di (ricevente, topic, payload)
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            pending.sort(key=lambda message: message[:2])
+            self._schedule(pending)
+
+        due = []
+        while self._events and self._events[0][0] <= until:
+            _, block, times, owner, receivers, messages = heapq.heappop(self._events)
+            k = int(np.searchsorted(times, until, side="right"))
+            due.append((block, times[:k], owner[:k], receivers[:k], messages))
+            if k < len(times):
+                heapq.heappush(self._events, (float(times[k]), block, times[k:], owner[k:], receivers[k:], messages))
+        if not due:
+            return []
+
+        # Consegne di più blocchi: ordine per istante, poi per blocco (step di trasmissione)
+        if len(due) > 1:
+            times = np.concatenate([chunk[1] for chunk in due])
+            blocks = np.repeat(np.arange(len(due)), [len(chunk[1]) for chunk in due])
+            order = np.lexsort((np.arange(len(times)), blocks, times))
+            chunk_of, position = blocks[order], np.concatenate([np.arange(len(chunk[1])) for chunk in due])[order]
+            released = [(int(due[c][3][i]), due[c][4][due[c][2][i]]) for c, i in zip(chunk_of.tolist(), position.tolist())]
+        else:
+            _, _, owner, receivers, messages = due[0]
+            released = [(receiver, messages[m]) for m, receiver in zip(owner.tolist(), receivers.tolist())]
+        self.released += len(released)
+        self._in_flight -= len(released)
+        return [(receiver, message[2], message[3]) for receiver, message in released]
+
+    def _schedule(self, pending: list) -> None:
+        self.sent += len(pending)
+        senders = np.fromiter((message[0] for message in pending), dtype=np.int64, count=len(pending))
+
+        # Posizione dei mittenti: ricerca binaria negli id ordinati dello snapshot
+        pos = np.searchsorted(self._sorted_ids, senders)
+        located = pos < len(self._sorted_ids)
+        located[located] = self._sorted_ids[pos[located]] == senders[located]
+        self.unpositioned += int(np.count_nonzero(~located))
+        messages = np.flatnonzero(located)
+        if not len(messages):
+            return
+        origin = self._sorted_index[pos[messages]]
+
+        hits = self._grid.query_many(np.column_stack((self._xs[origin], self._ys[origin])), self.max_range)
+        counts = np.fromiter((len(ids) for ids, _ in hits), dtype=np.intp, count=len(hits))
+        owner = np.repeat(messages, counts)
+        receivers = self._station_ids[np.concatenate([ids for ids, _ in hits])]
+        distances = np.concatenate([d for _, d in hits])
+
+        # Niente collegamento verso se stessi; stazioni duplicate: una consegna, alla distanza minima
+        keep = receivers != senders[owner]
+        owner, receivers, distances = owner[keep], receivers[keep], distances[keep]
+        order = np.lexsort((distances, receivers, owner))
+        owner, receivers, distances = owner[order], receivers[order], distances[order]
+        first = np.ones(len(owner), dtype=bool)
+        first[1:] = (owner[1:] != owner[:-1]) | (receivers[1:] != receivers[:-1])
+        owner, receivers, distances = owner[first], receivers[first], distances[first]
+        self.links += len(owner)
+        if not len(owner):
+            return
+
+        rng = np.random.default_rng([self.seed, int(round(self._now * 1000))])
+        delivered = rng.random(len(owner)) >= self.loss
+        if self.model == "log_distance":
+            path_loss = (self.reference_loss
+                         + 10.0 * self.path_loss_exponent * np.log10(np.maximum(distances, 1.0))
+                         + self.shadowing * rng.standard_normal(len(owner)))
+            delivered &= self.tx_power - path_loss >= self.sensitivity
+        owner, receivers = owner[delivered], receivers[delivered]
+        self.lost += len(delivered) - len(owner)
+
+        delays = np.full(len(owner), float(self.latency))
+        if self.jitter > 0:
+            if self.jitter_distribution == "uniform":
+                delays += self.jitter * rng.random(len(owner))
+            else:
+                delays += rng.exponential(self.jitter, len(owner))
+        self.scheduled += len(owner)
+        self._latency_sum += float(delays.sum())
+
+        if not len(owner):
+            return
+        # owner segue l'ordine (mittente, sequenza) di pending
+        times = self._now + delays
+        order = np.lexsort((receivers, owner, times))
+        self._blocks += 1
+        self._in_flight += len(order)
+        heapq.heappush(self._events, (float(times[order[0]]), self._blocks, times[order], owner[order], receivers[order], pending))
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "sent": self.sent,
+            "unpositioned": self.unpositioned,
+            "links": self.links,
+            "lost": self.lost,
+            "scheduled": self.scheduled,
+            "released": self.released,
+            "in_flight": self._in_flight,
+            "avg_latency": self._latency_sum / self.scheduled if self.scheduled else 0.0,
+        }
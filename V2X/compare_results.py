@@ -1,28 +1,29 @@
 import os
 import xml.etree.ElementTree as ET
 from config import OUTPUT_DIR
+from results import parse_stats, parse_tripinfo
 
-def get_stats(filename):
-    path = os.path.join(OUTPUT_DIR, filename)
+def get_stats(prefix):
+    path = os.path.join(OUTPUT_DIR, f"{prefix}_stats.xml")
     if not os.path.exists(path):
         return None
     try:
-        tree = ET.parse(path)
-        root = tree.getroot()
         # vehicleTripStatistics contiene i dati aggregati
-        stats = root.find("vehicleTripStatistics")
-        return {
-            "duration": float(stats.get("duration")),
-            "waitingTime": float(stats.get("waitingTime")),
-            "timeLoss": float(stats.get("timeLoss")),
-            "speed": float(stats.get("speed"))
-        }
-    except Exception as e:
-        print(f"Errore lettura {filename}: {e}")
+        stats = parse_stats(path)
+        # Veicoli gestiti via V2X: medie dal tripinfo, se presente
+        tripinfo = os.path.join(OUTPUT_DIR, f"{prefix}_tripinfo.xml")
+        if os.path.exists(tripinfo):
+            vehicles = parse_tripinfo(tripinfo)
+            managed = vehicles["managed"]
+            for key in ("waitingTime", "timeLoss"):
+                stats[f"managed_{key}"] = float(vehicles[key][managed].mean()) if managed.any() else None
+        return stats
+    except (ET.ParseError, OSError) as e:
+        print(f"Errore lettura {prefix}: {e}")
         return None
 
-base = get_stats("baseline_stats.xml")
-v2x = get_stats("v2x_stats.xml")
+base = get_stats("baseline")
+v2x = get_stats("v2x")
 
 print(f"\nCONFRONTO RISULTATI (Cartella: {OUTPUT_DIR})")
 print("=" * 65)
@@ -34,12 +35,16 @@ if base and v2x:
         ("Waiting Time (s)", "waitingTime"), # Tempo fermi
         ("Time Loss (s)", "timeLoss"),       # Tempo perso rallentando
         ("Duration (s)", "duration"),        # Durata totale viaggio
-        ("Avg Speed (m/s)", "speed")         # Velocità media
+        ("Avg Speed (m/s)", "speed"),        # Velocità media
+        ("Managed Wait (s)", "managed_waitingTime"),  # Solo veicoli gestiti via V2X (tripinfo)
+        ("Managed Loss (s)", "managed_timeLoss"),
     ]
     
     for label, key in metrics:
-        val_b = base[key]
-        val_v = v2x[key]
+        val_b = base.get(key)
+        val_v = v2x.get(key)
+        if val_b is None or val_v is None:
+            continue
         delta = val_v - val_b
         print(f"{label:<20} | {val_b:<10.2f} | {val_v:<10.2f} | {delta:<+10.2f}")
 else:
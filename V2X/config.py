@@ -10,12 +10,93 @@ SUMO_CFG = "camMap.sumo.cfg"
 SUMO_STEP_LENGTH = 0.1  # 100ms - ideale per V2X 10Hz
 SUMO_GUI = True  # True per sumo-gui, False per sumo (headless)
 SUMO_SEED = 0  # Seed per la riproducibilità (es. posizioni iniziali, traffico)
+SUMO_BACKEND = "traci"  # "traci" (socket, supporta GUI) o "libsumo" (in-process, solo headless)
+
+# -----------------------------------------------------------
+# Pacing (ritmo del loop rispetto al tempo reale)
+# -----------------------------------------------------------
+# vanetza-nap esclude stazioni (OBU/RSU) se gli step arrivano troppo velocemente.
+# mode: "afap" (massima velocità), "fixed" (real-time factor fisso), "adaptive"
+# (periodo regolato sul backlog/latenza dei publish MQTT)
+PACING_CONFIG = {
+    "mode": "fixed",
+    "rtf": 10.0,  # fixed: 0.1s simulati ogni 10ms reali (lavoro dello step compreso); adaptive: periodo iniziale
+    "min_gap": 0.01,  # fixed/adaptive: pausa minima dopo ogni step (s), come la vecchia attesa di 10ms
+    "min_period": 0.0,  # adaptive: periodo minimo di uno step (s)
+    "max_period": 0.1,  # adaptive: periodo massimo di uno step (s)
+    "backlog_high": 50,  # adaptive: publish pendenti oltre cui lo step si blocca (stallo)
+    "backlog_low": 10,  # adaptive: soglia di fine stallo
+    "latency_target": 0.02,  # adaptive: latenza publish oltre cui si rallenta (s)
+}
+
+# -----------------------------------------------------------
+# Trasporto dei messaggi V2X (vedi transport.py)
+# -----------------------------------------------------------
+TRANSPORT_CONFIG = {
+    "backend": "mqtt",  # "mqtt" (container vanetza-nap), "loopback" (in-process, senza docker), "null" (scarta)
+    "all_stations": False,  # loopback/null: True = ogni entità è una stazione V2X, False = solo quelle in STATIONS
+}
+
+# Modello di canale radio del trasporto loopback (vedi channel.py): consegna via radio solo
+# entro portata, con perdite e latenza; estrazioni casuali deterministiche con SUMO_SEED
+CHANNEL_CONFIG = {
+    "enabled": False,  # True: attivo con backend "loopback" (i messaggi di ogni step vengono pubblicati prima del successivo)
+    "model": "range",  # "range": consegna entro max_range; "log_distance": path loss + shadowing vs sensibilità
+    "max_range": 300.0,  # Portata massima (m)
+    "loss": 0.0,  # Probabilità di perdita indipendente per collegamento
+    "latency": 0.002,  # Latenza minima (s)
+    "jitter": 0.003,  # Componente casuale della latenza (s): ampiezza (uniform) o media (exponential)
+    "jitter_distribution": "uniform",  # "uniform" o "exponential"
+    "tx_power": 23.0,  # dBm (log_distance)
+    "sensitivity": -85.0,  # dBm (log_distance)
+    "reference_loss": 47.9,  # Path loss a 1 m in dB (log_distance; spazio libero a 5.9 GHz)
+    "path_loss_exponent": 2.7,  # log_distance
+    "shadowing": 4.0,  # Deviazione standard dello shadowing log-normale in dB (log_distance)
+}
 
 # -----------------------------------------------------------
 # MQTT Configuration
 # -----------------------------------------------------------
 MQTT_PORT = 1883
 MQTT_KEEPALIVE = 60
+MQTT_CONNECT_TIMEOUT = 5.0  # Secondi per connect TCP + CONNACK (warm-up parallelo all'avvio)
+# Riconnessione in background (es. container vanetza riavviato): backoff esponenziale con jitter,
+# senza mai bloccare lo step. Durante l'interruzione i publish della stazione restano in uno
+# spool, svuotato alla riconnessione
+MQTT_RECONNECT_CONFIG = {
+    "min_delay": 0.5,  # Attesa prima del primo tentativo (s), raddoppiata a ogni fallimento
+    "max_delay": 30.0,  # Attesa massima tra due tentativi (s)
+    "jitter": 0.5,  # Frazione dell'attesa resa casuale (evita tentativi sincronizzati tra stazioni)
+}
+MQTT_SPOOL_CONFIG = {
+    "mcm_capacity": 256,  # MCM in attesa per stazione (ring buffer: oltre, scartate le più vecchie)
+    "mcm_ttl": 5.0,  # Validità di una MCM in attesa (s); CAM e altri tipi: solo l'ultimo messaggio
+}
+INBOUND_QUEUE_SIZE = 1024  # Messaggi MCM in ingresso in attesa di dispatch (oltre: scartati i più vecchi)
+
+# Pipeline di uscita: costruzione, serializzazione e publish in thread worker,
+# in parallelo agli step di simulazione (workers=0 -> publish sincrono nel loop)
+OUTBOUND_CONFIG = {
+    "workers": 2,  # Thread worker; ogni stazione è servita sempre dallo stesso worker (ordine garantito)
+    "queue_size": 4096,  # Capacità di ogni coda (piena -> lo step attende)
+    "flush_each_step": False,  # True: a fine step attende la pubblicazione di tutti i messaggi dello step
+}
+
+# Cache dei payload serializzati per entità (stato invariato -> stessi bytes, solo
+# generationDeltaTime aggiornato); vedi payload_cache.py
+PAYLOAD_CACHE_ENABLED = True
+
+# Codifica dei messaggi pubblicati: "json" (JSON di vanetza-nap) o "uper" (payload già
+# codificati ASN.1 UPER su MQTT_ENCODED_TOPICS; richiede asn1tools e i moduli ASN.1)
+MESSAGE_ENCODING = "json"
+ASN1_CONFIG = {
+    "asn1_dir": "asn1",  # Moduli *.asn di CAM, MCM e CDD (es. la cartella asn1 di vanetza-nap)
+    "cache_dir": ".asn1_cache",  # Compilazione salvata su disco (chiave: contenuto dei moduli)
+    "pdus": {
+        "cam": {"type": "CAM", "message_id": 2, "protocol_version": 2},
+        "mcm": {"type": "MCM", "message_id": 20, "protocol_version": 2},
+    },
+}
 
 # Topic per tipo di messaggio
 MQTT_TOPICS = {
@@ -27,6 +108,12 @@ MQTT_TOPICS = {
     "denm": "vanetza/in/denm",  # Placeholder per DENM
 }
 
+# Topic dei payload già codificati (MESSAGE_ENCODING = "uper") per tipo di messaggio: devono
+# corrispondere ai topic di ingresso encoded della build di vanetza-nap. Il config.ini del
+# repository non ne definisce (publish_encoded_payloads riguarda solo i messaggi in uscita):
+# vuoto, quindi "uper" con il trasporto mqtt richiede di compilarli
+MQTT_ENCODED_TOPICS = {}
+
 # -----------------------------------------------------------
 # Station Mapping (StationID -> IP Docker container)
 # -----------------------------------------------------------
@@ -62,12 +149,14 @@ RSU_CONFIG = {
     0: {
         "position": (500.00, 1500.00),  # Coordinate SUMO (x, y)
         "broadcast_interval": 1.0,  # Secondi (1 Hz)
+        "detection_radius": 100.0,  # Metri: veicoli considerati dai trigger della RSU
         "enabled_messages": ["cam", "mcm_request", "mcm_termination"],  # Tipi di messaggio abilitati
     },
     # Aggiungi altre RSU qui:
     # 10: {
     #     "position": (200.00, 400.00),
     #     "broadcast_interval": 1.0,
+    #     "detection_radius": 100.0,
     #     "enabled_messages": ["cam", "denm"],
     # },
 }
@@ -81,6 +170,8 @@ VEHICLE_DEFAULTS = {
     "station_type": 5,  # 5 = Passenger Car (ETSI)
     "enabled_messages": ["cam", "mcm_response"],  # Tipi di messaggio abilitati
 }
+# Veicoli SUMO gestiti da Python via V2X (MCM); gli altri sono solo traffico di sfondo
+MANAGED_VEHICLES = ["1", "2"]
 
 # -----------------------------------------------------------
 # ETSI CAM Trigger Parameters (EN 302 637-2)
@@ -94,6 +185,13 @@ CAM_TRIGGER_CONFIG = {
     "delta_heading_threshold": 4.0,  # gradi
 }
 
+# -----------------------------------------------------------
+# MCM Request Trigger Parameters (RSU)
+# -----------------------------------------------------------
+MCM_TRIGGER_CONFIG = {
+    "cooldown_time": 5.0,  # Secondi prima che un veicolo già coordinato possa essere considerato di nuovo
+}
+
 # -----------------------------------------------------------
 # MCM Configuration (Placeholder)
 # -----------------------------------------------------------
@@ -126,6 +224,39 @@ LOGGING = {
     "show_trigger_details": True,  # Mostra dettagli trigger
 }
 
+# -----------------------------------------------------------
+# Tempi per fase dello step (vedi profiling.py)
+# -----------------------------------------------------------
+# A fine run: <prefix>_profile.json con media e p50/p95/p99 di ogni fase (ms)
+PROFILING_CONFIG = {
+    "enabled": False,
+    "capacity": 4096,  # step più recenti conservati per i percentili (ring buffer)
+}
+
+# -----------------------------------------------------------
+# Latenze del flusso MCM (vedi mcm_telemetry.py)
+# -----------------------------------------------------------
+# A fine run: <prefix>_mcm.json con conteggi, percentili e istogrammi di request -> response,
+# response -> azione del veicolo e durata delle sessioni, in tempo simulato e reale
+MCM_TELEMETRY_CONFIG = {
+    "enabled": False,
+    "wall_bins_ms": [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000],  # estremi inferiori dei bin (ms)
+    "sim_bins_s": [0, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100],  # estremi inferiori dei bin (s simulati)
+    "history": 64,  # istanze recenti per (stationID, manoeuvreId, mcmType) in attesa di ricezione
+}
+
+# -----------------------------------------------------------
+# Trace dello stato dei veicoli (vedi state_trace.py)
+# -----------------------------------------------------------
+# record: directory in cui registrare lo stato per step dei veicoli (True = <prefix>_trace)
+# replay: directory di un trace da rieseguire al posto di SUMO (RSU, trigger e messaggi senza
+#         processo SUMO; i comandi di attuazione dei veicoli sono ignorati)
+TRACE_CONFIG = {
+    "record": None,
+    "replay": None,
+    "chunk_steps": 1024,  # step per file del trace
+}
+
 # -----------------------------------------------------------
 # Simulation Mode & Statistics
 # -----------------------------------------------------------
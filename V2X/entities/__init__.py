@@ -5,5 +5,6 @@ Package entities - Contiene le classi per RSU e Veicoli.
 from .base import Entity
 from .rsu import RSU
 from .vehicle import Vehicle
+from .state_table import VehicleStateTable
 
-__all__ = ["Entity", "RSU", "Vehicle"]
+__all__ = ["Entity", "RSU", "Vehicle", "VehicleStateTable"]
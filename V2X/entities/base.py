@@ -15,6 +15,11 @@ class Entity(ABC):
     Ogni entità ha un ID, una posizione e può inviare messaggi.
     """
     
+    __slots__ = ("station_id", "name", "enabled_messages", "_state_version")
+    
+    # Variabili TraCI (traci.constants) da sottoscrivere per questo tipo di entità
+    SUMO_VARIABLES: tuple[int, ...] = ()
+    
     def __init__(self, station_id: int, name: Optional[str] = None):
         """
         Args:
@@ -24,24 +29,21 @@ class Entity(ABC):
         self.station_id = station_id
         self.name = name or f"Entity_{station_id}"
         self.enabled_messages: list[str] = []
-        
-        # Stato corrente
-        self._x: float = 0.0
-        self._y: float = 0.0
-        self._lat: float = 0.0
-        self._lon: float = 0.0
+        self._state_version = 0  # Incrementata da mark_dirty() (invalidazione cache payload)
         
         logger.debug(f"Creata entità {self.name} (ID: {station_id})")
     
     @property
+    @abstractmethod
     def position(self) -> tuple[float, float]:
         """Posizione corrente (x, y) in coordinate SUMO."""
-        return self._x, self._y
+        pass
     
     @property
+    @abstractmethod
     def geo_position(self) -> tuple[float, float]:
         """Posizione corrente (lat, lon)."""
-        return self._lat, self._lon
+        pass
     
     @abstractmethod
     def update(self, sim_time: float, **kwargs) -> None:
@@ -82,6 +84,15 @@ class Entity(ABC):
         """
         pass
     
+    @property
+    def state_version(self) -> int:
+        """Versione dello stato: cambia ogni volta che i dati dei messaggi possono essere cambiati."""
+        return self._state_version
+    
+    def mark_dirty(self) -> None:
+        """Segnala che lo stato (e quindi i payload in cache) potrebbe essere cambiato."""
+        self._state_version += 1
+    
     def is_message_enabled(self, message_type: str) -> bool:
         """Verifica se un tipo di messaggio è abilitato per questa entità."""
         return message_type in self.enabled_messages
@@ -13,11 +13,14 @@ logger = logging.getLogger(__name__)
 
 class RSU(Entity):
     
-    def __init__(self, station_id: int, position: tuple[float, float], name: Optional[str] = None, broadcast_interval: float = 1.0, enabled_messages: Optional[list[str]] = None):
+    __slots__ = ("_x", "_y", "_lat", "_lon", "broadcast_interval", "detection_radius", "_last_send_time", "_current_mcm_executants", "_active_manoeuvre_ids")
+    
+    def __init__(self, station_id: int, position: tuple[float, float], name: Optional[str] = None, broadcast_interval: float = 1.0, detection_radius: float = 100.0, enabled_messages: Optional[list[str]] = None):
         super().__init__(station_id, name or f"RSU_{station_id}")
         self._x, self._y = position
         self._lat, self._lon = sumo_to_geo(self._x, self._y)
         self.broadcast_interval = broadcast_interval
+        self.detection_radius = detection_radius
         self.enabled_messages = enabled_messages or ["cam"]
         
         self._last_send_time: dict[str, float] = {}
@@ -32,12 +35,18 @@ class RSU(Entity):
     def from_config(cls, station_id: int) -> "RSU":
         config = RSU_CONFIG.get(station_id)
         if not config: raise ValueError(f"RSU {station_id} non trovata")
-        return cls(station_id=station_id, position=config["position"], name=config.get("name"), broadcast_interval=config.get("broadcast_interval", 1.0), enabled_messages=config.get("enabled_messages", ["cam"]))
+        return cls(station_id=station_id, position=config["position"], name=config.get("name"), broadcast_interval=config.get("broadcast_interval", 1.0), detection_radius=config.get("detection_radius", 100.0), enabled_messages=config.get("enabled_messages", ["cam"]))
+    
+    @property
+    def position(self) -> tuple[float, float]: return self._x, self._y
+    @property
+    def geo_position(self) -> tuple[float, float]: return self._lat, self._lon
     
-    def update(self, sim_time: float, **kwargs) -> None: pass
+    def update(self, sim_time: float, **kwargs) -> None: pass  # Stato statico: nessun mark_dirty
 
     def set_mcm_targets(self, targets_data: List[Dict[str, Any]]) -> None:
         """Imposta i target per Request e salva gli ID per la futura Termination."""
+        self.mark_dirty()
         self._current_mcm_executants = []
         
         # Reset della lista attiva con i nuovi ID
@@ -64,6 +73,7 @@ class RSU(Entity):
     
     def mark_message_sent(self, message_type: str, sim_time: float) -> None:
         self._last_send_time[message_type] = sim_time
+        if message_type in ("mcm_request", "mcm_termination"): self.mark_dirty()
         
         # Se inviamo una Request, puliamo i dati temporanei di costruzione (ma non la sessione attiva)
         if message_type == "mcm_request":
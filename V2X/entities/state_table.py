@@ -0,0 +1,239 @@
+"""
+Tabella colonnare (struct-of-arrays) dello stato dei veicoli.
+
+Ogni veicolo occupa una riga ("slot") stabile per tutta la sua permanenza in rete;
+gli slot dei veicoli arrivati vengono riciclati. Vehicle e i trigger leggono lo stato
+tramite viste a copia zero, senza costruire dizionari ad ogni step.
+"""
+
+from collections.abc import Mapping
+from typing import Callable, Optional
+
+import numpy as np
+from traci import constants as tc
+
+# Colonne numeriche: nome -> dtype
+COLUMNS = {
+    "x": np.float64,
+    "y": np.float64,
+    "speed": np.float64,
+    "heading": np.float64,
+    "acceleration": np.float64,
+    "lat": np.float64,
+    "lon": np.float64,
+    "signals": np.int32,
+    "station_id": np.int64,
+    "seq": np.int64,  # ordine di registrazione (per iterare come un dict)
+}
+
+# Variabili TraCI scalari -> colonna (VAR_POSITION è gestita a parte: tupla x, y)
+SUMO_COLUMNS = {
+    tc.VAR_SPEED: "speed",
+    tc.VAR_ANGLE: "heading",
+    tc.VAR_ACCELERATION: "acceleration",
+    tc.VAR_SIGNALS: "signals",
+}
+
+# Bit di getSignals (VEH_SIGNAL_BLINKER_RIGHT / LEFT)
+SIGNAL_BLINKER_RIGHT = 1
+SIGNAL_BLINKER_LEFT = 2
+
+
+class VehicleStateTable:
+    """
+    Stato dei veicoli in array NumPy, una riga per veicolo.
+    """
+
+    def __init__(self, capacity: int = 64, projector: Optional[Callable] = None):
+        """
+        Args:
+            capacity: Numero iniziale di slot (la tabella cresce da sola)
+            projector: Funzione (xs, ys) -> (lats, lons); se presente lat/lon sono
+                       calcolate in blocco al primo accesso dopo ogni ingest()
+        """
+        self.capacity = 0
+        self._projector = projector
+        self._geo_stale = False
+        self.ids: list[Optional[str]] = []
+        self.active = np.zeros(0, dtype=bool)
+        self._slot_of: dict[str, int] = {}
+        self._free: list[int] = []
+        self._next_seq = 0
+        self._readonly: dict[str, np.ndarray] = {}
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self._grow(capacity)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, sumo_id: str) -> bool:
+        return sumo_id in self._slot_of
+
+    def _grow(self, capacity: int) -> None:
+        """Estende tutte le colonne; gli slot esistenti restano validi."""
+        extra = capacity - self.capacity
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra, dtype=dtype)]))
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.ids.extend([None] * extra)
+        # Slot liberi in ordine crescente (pop() dalla fine)
+        self._free = list(range(capacity - 1, self.capacity - 1, -1)) + self._free
+        self.capacity = capacity
+        self._readonly.clear()
+
+    def allocate(self, sumo_id: str, station_id: int) -> int:
+        """Assegna uno slot al veicolo e ne azzera lo stato."""
+        if sumo_id in self._slot_of:
+            return self._slot_of[sumo_id]
+        if not self._free:
+            self._grow(max(2 * self.capacity, 1))
+
+        slot = self._free.pop()
+        for name in COLUMNS:
+            getattr(self, name)[slot] = 0
+        self.station_id[slot] = station_id
+        self.seq[slot] = self._next_seq
+        self._next_seq += 1
+        self.active[slot] = True
+        self.ids[slot] = sumo_id
+        self._slot_of[sumo_id] = slot
+        return slot
+
+    def release(self, sumo_id: str) -> Optional[int]:
+        """Libera lo slot del veicolo (arrivato) per riutilizzarlo."""
+        slot = self._slot_of.pop(sumo_id, None)
+        if slot is None:
+            return None
+        self.active[slot] = False
+        self.ids[slot] = None
+        self._free.append(slot)
+        return slot
+
+    def slot_of(self, sumo_id: str) -> Optional[int]:
+        return self._slot_of.get(sumo_id)
+
+    def active_slots(self) -> np.ndarray:
+        """Slot attivi in ordine di registrazione."""
+        slots = np.flatnonzero(self.active)
+        return slots[np.argsort(self.seq[slots], kind="stable")]
+
+    def ensure_geo(self) -> None:
+        """Proietta lat/lon di tutti i veicoli attivi se le posizioni sono cambiate."""
+        if not self._geo_stale:
+            return
+        self._geo_stale = False
+        slots = np.flatnonzero(self.active)
+        if len(slots):
+            self.lat[slots], self.lon[slots] = self._projector(self.x[slots], self.y[slots])
+
+    def column(self, name: str) -> np.ndarray:
+        """Vista in sola lettura (copia zero) di una colonna."""
+        if name in ("lat", "lon"):
+            self.ensure_geo()
+        view = self._readonly.get(name)
+        if view is None:
+            view = getattr(self, name).view()
+            view.flags.writeable = False
+            self._readonly[name] = view
+        return view
+
+    def columns(self, *names: str) -> dict[str, np.ndarray]:
+        """Più colonne in sola lettura, come dizionario nome -> vista."""
+        return {name: self.column(name) for name in names}
+
+    def ingest(self, results: dict) -> np.ndarray:
+        """
+        Scrive in blocco i risultati di getAllSubscriptionResults() nelle colonne.
+
+        Returns:
+            Slot aggiornati, nell'ordine dei risultati
+        """
+        slot_of = self._slot_of
+        known = [(slot_of[sumo_id], values) for sumo_id, values in results.items() if sumo_id in slot_of]
+        if not known:
+            return np.zeros(0, dtype=np.intp)
+
+        # Tutti i veicoli sono sottoscritti con lo stesso insieme di variabili
+        present = known[0][1]
+        scalar_vars = [var for var in SUMO_COLUMNS if var in present]
+        slots = np.fromiter((slot for slot, _ in known), dtype=np.intp, count=len(known))
+        if scalar_vars:
+            data = np.array([[values[var] for var in scalar_vars] for _, values in known], dtype=np.float64)
+            for col, var in enumerate(scalar_vars):
+                getattr(self, SUMO_COLUMNS[var])[slots] = data[:, col]
+        if tc.VAR_POSITION in present:
+            xy = np.array([values[tc.VAR_POSITION] for _, values in known], dtype=np.float64)
+            self.x[slots] = xy[:, 0]
+            self.y[slots] = xy[:, 1]
+            self._geo_stale = self._projector is not None
+        return slots
+
+    def row(self, slot: int) -> "VehicleRowView":
+        return VehicleRowView(self, slot)
+
+    def neighbors(self, slots: np.ndarray, distances: np.ndarray) -> list["NeighborRowView"]:
+        """Viste dei veicoli vicini a un punto, con la relativa distanza."""
+        return [NeighborRowView(self, slot, dist) for slot, dist in zip(slots.tolist(), distances.tolist())]
+
+
+class VehicleRowView(Mapping):
+    """
+    Vista in sola lettura di una riga della tabella, con interfaccia da dizionario
+    (chiavi: x, y, speed, heading, acceleration, lat, lon, signals, station_id,
+    id, light_left_turn, light_right_turn).
+    """
+
+    __slots__ = ("_table", "_slot")
+
+    _FLOAT_KEYS = ("x", "y", "speed", "heading", "acceleration", "lat", "lon")
+    _KEYS = _FLOAT_KEYS + ("signals", "station_id", "id", "light_left_turn", "light_right_turn")
+
+    def __init__(self, table: VehicleStateTable, slot: int):
+        self._table = table
+        self._slot = slot
+
+    def __getitem__(self, key):
+        table, slot = self._table, self._slot
+        if key in self._FLOAT_KEYS:
+            if key in ("lat", "lon"):
+                table.ensure_geo()
+            return float(getattr(table, key)[slot])
+        if key == "id":
+            return table.ids[slot]
+        if key == "station_id":
+            return int(table.station_id[slot])
+        if key == "signals":
+            return int(table.signals[slot])
+        if key == "light_left_turn":
+            return bool(table.signals[slot] & SIGNAL_BLINKER_LEFT)
+        if key == "light_right_turn":
+            return bool(table.signals[slot] & SIGNAL_BLINKER_RIGHT)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    @property
+    def slot(self) -> int:
+        return self._slot
+
+
+class NeighborRowView(VehicleRowView):
+    """Vista di un veicolo vicino a una RSU: aggiunge la chiave distance_to_rsu."""
+
+    __slots__ = ("_distance",)
+
+    _KEYS = VehicleRowView._KEYS + ("distance_to_rsu",)
+
+    def __init__(self, table: VehicleStateTable, slot: int, distance: float):
+        super().__init__(table, slot)
+        self._distance = distance
+
+    def __getitem__(self, key):
+        if key == "distance_to_rsu":
+            return self._distance
+        return super().__getitem__(key)
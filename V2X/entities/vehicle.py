@@ -1,55 +1,73 @@
 import logging
 from typing import Optional
-import traci
+from sumo_backend import sumo
+from traci import constants as tc
 from .base import Entity
+from .state_table import VehicleStateTable, VehicleRowView, SIGNAL_BLINKER_LEFT, SIGNAL_BLINKER_RIGHT
 from utils import sumo_to_geo, get_generation_delta_time
-from config import VEHICLE_DEFAULTS, STATION_TYPE_RULES
+from config import VEHICLE_DEFAULTS, STATION_TYPE_RULES, MANAGED_VEHICLES
 
-from mqtt_manager import mqtt_manager
+from outbound import outbound
+from mcm_telemetry import mcm_telemetry
 from messages import MessageFactory
 
 logger = logging.getLogger(__name__)
 
 class Vehicle(Entity):
+    """
+    Veicolo (OBU): vista sottile sulla propria riga della VehicleStateTable.
+    Lo stato dinamico (posizione, velocità, segnali...) vive nella tabella.
+    """
     
-    def __init__(self, station_id: int, sumo_id: str, name: Optional[str] = None, station_type: int = 5, length: int = 5, width: int = 2, enabled_messages: Optional[list[str]] = None):
+    __slots__ = ("sumo_id", "base_station_type", "length", "width", "managed_by_python", "_table", "_slot", "_view", "_prev_left", "_prev_right", "_last_processed_manoeuvre_id")
+    
+    # Stato letto ad ogni step: posizione/cinematica per i CAM, segnali per le frecce
+    SUMO_VARIABLES = (tc.VAR_POSITION, tc.VAR_SPEED, tc.VAR_ANGLE, tc.VAR_ACCELERATION, tc.VAR_SIGNALS)
+    
+    def __init__(self, station_id: int, sumo_id: str, table: VehicleStateTable, name: Optional[str] = None, station_type: int = 5, length: int = 5, width: int = 2, enabled_messages: Optional[list[str]] = None):
         super().__init__(station_id, name or f"Vehicle_{station_id}")
         self.sumo_id = sumo_id
         self.base_station_type = station_type
         self.length = length
         self.width = width
         self.enabled_messages = enabled_messages or VEHICLE_DEFAULTS.get("enabled_messages", ["cam"])
-        self._speed: float = 0.0
-        self._heading: float = 0.0
-        self._acceleration: float = 0.0
-        self._light_left_turn: bool = False
-        self._light_right_turn: bool = False
+        self._table = table
+        self._slot = table.allocate(sumo_id, station_id)
+        self._view = table.row(self._slot)
         # AGGIUNTA: Variabili di stato precedente per il rilevamento del cambio
         self._prev_left = False
         self._prev_right = False
         self._last_processed_manoeuvre_id = -1
         logger.debug(f"Veicolo {self.name} (SUMO: {sumo_id}) creato")
-        self.managed_by_python = self.sumo_id in ["1", "2"]
+        self.managed_by_python = self.sumo_id in MANAGED_VEHICLES
         if not self.managed_by_python:
             logger.info(f"Veicolo {self.sumo_id} creato in modalità SOLO-SUMO (No V2X).")
     
     @classmethod
-    def from_sumo(cls, sumo_id: str, station_id: Optional[int] = None) -> "Vehicle":
+    def from_sumo(cls, sumo_id: str, table: VehicleStateTable, station_id: Optional[int] = None) -> "Vehicle":
         from utils import get_station_id_from_veh
         if station_id is None: station_id = get_station_id_from_veh(sumo_id)
-        return cls(station_id=station_id, sumo_id=sumo_id, station_type=VEHICLE_DEFAULTS.get("station_type", 5), length=VEHICLE_DEFAULTS.get("length", 5), width=VEHICLE_DEFAULTS.get("width", 2), enabled_messages=VEHICLE_DEFAULTS.get("enabled_messages", ["cam"]))
+        return cls(station_id=station_id, sumo_id=sumo_id, table=table, station_type=VEHICLE_DEFAULTS.get("station_type", 5), length=VEHICLE_DEFAULTS.get("length", 5), width=VEHICLE_DEFAULTS.get("width", 2), enabled_messages=VEHICLE_DEFAULTS.get("enabled_messages", ["cam"]))
     
-    def update(self, sim_time: float, x: float = None, y: float = None, speed: float = None, heading: float = None, acceleration: float = None, **kwargs) -> None:
-        if x is not None and y is not None: self._x = x; self._y = y; self._lat, self._lon = sumo_to_geo(x, y)
-        if speed is not None: self._speed = speed
-        if heading is not None: self._heading = heading
-        if acceleration is not None: self._acceleration = acceleration
-        # self._light_left_turn = kwargs.get("light_left_turn", False)
-        # self._light_right_turn = kwargs.get("light_right_turn", False)
-
-        # 1. Recupera lo stato attuale delle frecce dai kwargs
-        current_left = kwargs.get("light_left_turn", False)
-        current_right = kwargs.get("light_right_turn", False)
+    def update(self, sim_time: float, x: float = None, y: float = None, speed: float = None, heading: float = None, acceleration: float = None, lat: float = None, lon: float = None, **kwargs) -> None:
+        """
+        Aggiorna lo stato. Il simulatore scrive già la tabella in blocco e chiama update(sim_time)
+        solo per la logica per-veicolo; i parametri espliciti restano per aggiornamenti singoli.
+        """
+        table, slot = self._table, self._slot
+        self.mark_dirty()
+        if x is not None and y is not None:
+            table.x[slot] = x; table.y[slot] = y
+            table.lat[slot], table.lon[slot] = (lat, lon) if lat is not None and lon is not None else sumo_to_geo(x, y)
+        if speed is not None: table.speed[slot] = speed
+        if heading is not None: table.heading[slot] = heading
+        if acceleration is not None: table.acceleration[slot] = acceleration
+        if "light_left_turn" in kwargs or "light_right_turn" in kwargs:
+            table.signals[slot] = (SIGNAL_BLINKER_LEFT if kwargs.get("light_left_turn") else 0) | (SIGNAL_BLINKER_RIGHT if kwargs.get("light_right_turn") else 0)
+
+        # 1. Recupera lo stato attuale delle frecce dalla tabella
+        current_left = self.light_left_turn
+        current_right = self.light_right_turn
 
         if not self.managed_by_python:
             # Aggiorniamo comunque i _prev per evitare glitch se mai dovesse diventare gestito
@@ -70,18 +88,28 @@ class Vehicle(Entity):
             print(f"[{sim_time:.2f}s] Veicolo {self.sumo_id}: Freccia DESTRA DISINSERITA")
 
         # 4. Fondamentale: aggiorna gli stati per il prossimo step
-        self._light_left_turn = current_left
-        self._light_right_turn = current_right
         self._prev_left = current_left
         self._prev_right = current_right
         
 
     @property
-    def speed(self) -> float: return self._speed
+    def slot(self) -> int: return self._slot
+    @property
+    def position(self) -> tuple[float, float]: return float(self._table.x[self._slot]), float(self._table.y[self._slot])
+    @property
+    def geo_position(self) -> tuple[float, float]:
+        self._table.ensure_geo()
+        return float(self._table.lat[self._slot]), float(self._table.lon[self._slot])
     @property
-    def heading(self) -> float: return self._heading
+    def speed(self) -> float: return float(self._table.speed[self._slot])
     @property
-    def acceleration(self) -> float: return self._acceleration
+    def heading(self) -> float: return float(self._table.heading[self._slot])
+    @property
+    def acceleration(self) -> float: return float(self._table.acceleration[self._slot])
+    @property
+    def light_left_turn(self) -> bool: return bool(self._table.signals[self._slot] & SIGNAL_BLINKER_LEFT)
+    @property
+    def light_right_turn(self) -> bool: return bool(self._table.signals[self._slot] & SIGNAL_BLINKER_RIGHT)
     
     def should_send_message(self, message_type: str, sim_time: float) -> bool:
         # --- MODIFICA: Se il veicolo non è gestito da Python, NON deve inviare nulla ---
@@ -97,9 +125,12 @@ class Vehicle(Entity):
 
     def get_message_data(self, message_type: str) -> dict:
         current_station_type = self._resolve_station_type(message_type)
-        return { "station_id": self.station_id, "station_type": current_station_type, "lat": self._lat, "lon": self._lon, "speed": self._speed, "heading": self._heading, "acceleration": self._acceleration, "length": self.length, "width": self.width, "light_left_turn": self._light_left_turn, "light_right_turn": self._light_right_turn }
+        lat, lon = self.geo_position
+        return { "station_id": self.station_id, "station_type": current_station_type, "lat": lat, "lon": lon, "speed": self.speed, "heading": self.heading, "acceleration": self.acceleration, "length": self.length, "width": self.width, "light_left_turn": self.light_left_turn, "light_right_turn": self.light_right_turn }
     
-    def get_state_snapshot(self) -> dict: return { "x": self._x, "y": self._y, "speed": self._speed, "heading": self._heading }
+    def get_state_snapshot(self) -> VehicleRowView:
+        """Vista in sola lettura (copia zero) della riga del veicolo, con interfaccia da dizionario."""
+        return self._view
     
     def handle_mcm_request(self, payload: dict):
         """
@@ -138,7 +169,7 @@ class Vehicle(Entity):
 
         # --- FASE 1: INVIA MCM RESPONSE ---
         # Prima di agire fisicamente, inviamo la conferma
-        self._send_mcm_response(manoeuvre_id, accepted=True)
+        self._send_mcm_response(manoeuvre_id, accepted=True, peer=basic_container.get("stationID"))
 
         # --- FASE 2: ESECUZIONE FISICA (TRIGGER) ---
         advised_change = my_instruction.get("currentStateAdvisedChange", {})
@@ -151,12 +182,15 @@ class Vehicle(Entity):
             
         else:
             logger.debug(f"Veicolo {self.name}: Strategia ignota. Nessuna azione fisica.")
+            return
+
+        mcm_telemetry.actuated(self.station_id, manoeuvre_id)
 
     def _perform_emergency_stop(self):
         """Esegue stop sicuro."""
         try:
-            current_lane_id = traci.vehicle.getLaneID(self.sumo_id)
-            current_edge_id = traci.lane.getEdgeID(current_lane_id)
+            current_lane_id = sumo.vehicle.getLaneID(self.sumo_id)
+            current_edge_id = sumo.lane.getEdgeID(current_lane_id)
             
             # PROTEZIONE: Se siamo su un edge interno (incrocio), NON fermarti.
             if current_edge_id.startswith(":"):
@@ -164,29 +198,29 @@ class Vehicle(Entity):
                 return 
 
             logger.warning(f"Veicolo {self.name}: STRATEGIA 'STOP' RICEVUTA. Eseguo manovra di arresto.")
-            traci.vehicle.setColor(self.sumo_id, (255, 0, 255)) 
-            traci.vehicle.setSpeedMode(self.sumo_id, 0)
+            sumo.vehicle.setColor(self.sumo_id, (255, 0, 255)) 
+            sumo.vehicle.setSpeedMode(self.sumo_id, 0)
             
-            current_pos = traci.vehicle.getLanePosition(self.sumo_id)
-            lane_len = traci.lane.getLength(current_lane_id)
+            current_pos = sumo.vehicle.getLanePosition(self.sumo_id)
+            lane_len = sumo.lane.getLength(current_lane_id)
             target_pos = lane_len - 1.0 
 
             # Anti-overshoot
             if target_pos <= current_pos + 5.0:
                 target_pos = min(current_pos + 10.0, lane_len - 0.5)
 
-            traci.vehicle.setStop(vehID=self.sumo_id, edgeID=current_edge_id, pos=target_pos, laneIndex=0, duration=1.0)
-        except traci.TraCIException as e:
+            sumo.vehicle.setStop(vehID=self.sumo_id, edgeID=current_edge_id, pos=target_pos, laneIndex=0, duration=1.0)
+        except sumo.TraCIException as e:
             logger.error(f"Errore critico stop {self.name}: {e}")
 
     def _perform_priority_passage(self):
         """Esegue passaggio prioritario."""
         logger.info(f"Veicolo {self.name}: STRATEGIA 'PRIORITY' RICEVUTA. Procedo.")
         try:
-            traci.vehicle.setColor(self.sumo_id, (0, 0, 255))
-            traci.vehicle.setSpeedMode(self.sumo_id, 55)
-            traci.vehicle.setSpeed(self.sumo_id, 14.0) 
-        except traci.TraCIException as e:
+            sumo.vehicle.setColor(self.sumo_id, (0, 0, 255))
+            sumo.vehicle.setSpeedMode(self.sumo_id, 55)
+            sumo.vehicle.setSpeed(self.sumo_id, 14.0) 
+        except sumo.TraCIException as e:
             logger.error(f"Errore priorità {self.name}: {e}")
 
     def _perform_slow_down(self):
@@ -200,15 +234,15 @@ class Vehicle(Entity):
         
         try:
             # Cambio colore in ARANCIONE per feedback visivo nella GUI
-            traci.vehicle.setColor(self.sumo_id, (255, 165, 0)) 
+            sumo.vehicle.setColor(self.sumo_id, (255, 165, 0)) 
             
             # Opzione A: Cambio istantaneo del limite di velocità
             # traci.vehicle.setSpeed(self.sumo_id, target_speed)
             
             # Opzione B (Più realistica): Decelerazione fluida in 3 secondi
-            traci.vehicle.slowDown(self.sumo_id, target_speed, 1.0)
+            sumo.vehicle.slowDown(self.sumo_id, target_speed, 1.0)
             
-        except traci.TraCIException as e:
+        except sumo.TraCIException as e:
             logger.error(f"Errore rallentamento {self.name}: {e}")
 
     def handle_mcm_termination(self, payload: dict):
@@ -224,32 +258,33 @@ class Vehicle(Entity):
         try:
             # 1. Ripristina il controllo automatico della velocità
             # Questo annulla sia setSpeed che slowDown
-            traci.vehicle.setSpeed(self.sumo_id, -1.0)
+            sumo.vehicle.setSpeed(self.sumo_id, -1.0)
             
             # 2. Controllo preventivo degli Stop
             # Recuperiamo la lista dei futuri stop. Se è vuota, NON chiamiamo resume.
             # Questo evita l'errore "Failed to resume... it has no stops" nel log.
-            future_stops = traci.vehicle.getNextStops(self.sumo_id)
+            future_stops = sumo.vehicle.getNextStops(self.sumo_id)
             if future_stops:
-                traci.vehicle.resume(self.sumo_id)
+                sumo.vehicle.resume(self.sumo_id)
                 logger.debug(f"Veicolo {self.name}: Stop rimosso con successo.")
 
             # 3. Ripristina il colore originale
             if self.sumo_id == "2":
-                traci.vehicle.setColor(self.sumo_id, (0, 255, 0)) # Verde
+                sumo.vehicle.setColor(self.sumo_id, (0, 255, 0)) # Verde
             else:
-                traci.vehicle.setColor(self.sumo_id, (255, 0, 0)) # Rosso
+                sumo.vehicle.setColor(self.sumo_id, (255, 0, 0)) # Rosso
                 
-        except traci.TraCIException as e:
+        except sumo.TraCIException as e:
             logger.error(f"Errore ripristino veicolo {self.name}: {e}")
 
-    def _send_mcm_response(self, manoeuvre_id: int, accepted: bool):
+    def _send_mcm_response(self, manoeuvre_id: int, accepted: bool, peer: Optional[int] = None):
         """
         Costruisce e invia il messaggio MCM Response tramite MQTT.
+        peer: stazione (RSU) che ha inviato la Request, per la telemetria MCM
         """
         try:
             # 1. Calcola il tempo attuale (per generationDeltaTime)
-            sim_time = traci.simulation.getTime()
+            sim_time = sumo.simulation.getTime()
             gen_delta_time = get_generation_delta_time(sim_time)
 
             # 2. Crea l'oggetto messaggio usando la Factory
@@ -270,13 +305,9 @@ class Vehicle(Entity):
                 "cost": 0 # Opzionale, ma se serve va qui
             })
 
-            # 4. Costruisci il payload JSON finale
-            payload = message.build_payload(response_data)
-
-            # 5. Pubblica su MQTT
-            # Usiamo lo stesso topic MCM (o uno specifico se configurato diversamente)
-            topic = "vanetza/in/mcm" 
-            mqtt_manager.publish(self.station_id, "mcm_response", payload)
+            # 4. Accoda alla pipeline di uscita (payload e publish MQTT nei worker)
+            mcm_telemetry.created(self.station_id, message, manoeuvre_id, peer=peer)
+            outbound.submit(self.station_id, "mcm_response", message, response_data)
             
             logger.info(f"Veicolo {self.name}: MCM Response inviata (Accettata={accepted})")
 
@@ -0,0 +1,256 @@
+"""
+Specifica dichiarativa degli esperimenti (sweep) e cache degli artefatti per contenuto.
+
+Un file TOML (o YAML, se PyYAML è installato; oppure JSON) dichiara gli assi dello sweep:
+il batch esegue il prodotto cartesiano dei valori.
+
+    name = "soglie_cam"
+
+    [fixed]                                   # valori comuni a tutte le run
+    "PACING_CONFIG.mode" = "afap"
+
+    [axes]                                    # assi dello sweep
+    vehicles = [2, 12, 22]                    # veicoli nel file rotte generato
+    seed = [0, 10]                            # SUMO_SEED
+    mode = ["BASELINE", "V2X"]                # SIMULATION_MODE
+    "CAM_TRIGGER_CONFIG.delta_speed_threshold" = [0.5, 1.0]
+    "RSU_CONFIG.0.detection_radius" = [50.0, 100.0]
+    "MCM_TRIGGER_CONFIG.cooldown_time" = [2.0, 5.0]
+
+Le chiavi diverse da vehicles/seed/mode sono percorsi nel modulo config
+("NOME.chiave.chiave"); le chiavi intere dei dizionari (es. l'id della RSU) si scrivono
+come testo. Gli override vengono applicati in place, prima dell'avvio di ogni run.
+
+Gli artefatti generati sono salvati sotto l'hash dei loro input:
+- file rotte: parametri e sorgente del generatore
+- output di una run: file rotte, seed, modalità, override, parametri del batch e contenuto
+  di config.py e dello scenario SUMO
+Uno sweep esteso con nuovi valori esegue quindi solo i punti nuovi; modificare config.py
+o lo scenario invalida le run precedenti.
+
+Ogni run salva anche <prefix>_config.json: configurazione completa (dopo gli override) e
+revisione git del codice, archiviate con i risultati (results_db.py).
+"""
+
+import os
+import json
+import inspect
+import hashlib
+import logging
+import subprocess
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from itertools import product
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Assi con significato proprio (non percorsi di config)
+RESERVED_AXES = ("vehicles", "seed", "mode")
+SPEC_FORMATS = (".toml", ".yaml", ".yml", ".json")
+
+
+def load_spec(path: str) -> dict:
+    """
+    Legge e valida una specifica di esperimento.
+
+    Returns:
+        {"name", "fixed": {percorso: valore}, "axes": {asse: [valori]}}
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SPEC_FORMATS:
+        raise ValueError(f"Formato della specifica '{ext}' non supportato (scegli tra {SPEC_FORMATS})")
+
+    if ext == ".toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            raw = tomllib.load(f)
+    elif ext == ".json":
+        with open(path) as f:
+            raw = json.load(f)
+    else:
+        import yaml  # Dipendenza opzionale: solo per le specifiche YAML
+        with open(path) as f:
+            raw = yaml.safe_load(f) or {}
+
+    unknown = set(raw) - {"name", "fixed", "axes"}
+    if unknown:
+        raise ValueError(f"{path}: sezioni non previste {sorted(unknown)}")
+    axes = raw.get("axes", {})
+    for name, values in axes.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"{path}: l'asse '{name}' deve essere una lista non vuota")
+    for name in RESERVED_AXES:
+        if name in raw.get("fixed", {}):
+            axes.setdefault(name, [raw["fixed"].pop(name)])
+    if "vehicles" not in axes:
+        raise ValueError(f"{path}: manca l'asse 'vehicles' (numero di veicoli del file rotte)")
+    return {
+        "name": raw.get("name", os.path.splitext(os.path.basename(path))[0]),
+        "fixed": raw.get("fixed", {}),
+        "axes": axes,
+    }
+
+
+def expand(spec: dict, defaults: dict) -> list[dict]:
+    """
+    Punti dello sweep (prodotto cartesiano degli assi, nell'ordine della specifica).
+
+    Args:
+        defaults: Valori degli assi riservati non dichiarati (es. {"seed": [0], "mode": ["V2X"]})
+
+    Returns:
+        Lista di {"vehicles", "seed", "mode", "overrides": {percorso: valore}}
+    """
+    axes = {name: spec["axes"].get(name, defaults.get(name)) for name in RESERVED_AXES}
+    axes.update((name, values) for name, values in spec["axes"].items() if name not in RESERVED_AXES)
+    names = list(axes)
+    points = []
+    for values in product(*(axes[name] for name in names)):
+        point = dict(zip(names, values))
+        overrides = dict(spec["fixed"])
+        overrides.update((name, point.pop(name)) for name in names if name not in RESERVED_AXES)
+        point["overrides"] = overrides
+        points.append(point)
+    return points
+
+
+def _resolve(config_module, path: str) -> tuple[Any, Any]:
+    """(contenitore, chiave) del valore indicato da un percorso "NOME.chiave.chiave"."""
+    name, *keys = path.split(".")
+    if not name.isupper() or not hasattr(config_module, name):
+        raise KeyError(f"Parametro di configurazione sconosciuto: {name}")
+    if not keys:
+        return config_module, name
+    container = getattr(config_module, name)
+    for i, key in enumerate(keys):
+        if not isinstance(container, dict):
+            raise KeyError(f"{path}: '{'.'.join([name, *keys[:i]])}' non è un dizionario")
+        if key not in container and key.lstrip("-").isdigit() and int(key) in container:
+            key = int(key)
+        if key not in container:
+            raise KeyError(f"{path}: chiave '{key}' inesistente")
+        if i == len(keys) - 1:
+            return container, key
+        container = container[key]
+
+
+def apply_overrides(config_module, overrides: dict) -> Callable[[], None]:
+    """
+    Applica gli override al modulo config (in place: i dizionari importati altrove li vedono).
+
+    Returns:
+        Funzione che ripristina i valori precedenti (run successive nello stesso processo)
+    """
+    previous = []
+    try:
+        for path, value in overrides.items():
+            container, key = _resolve(config_module, path)
+            if container is config_module:
+                previous.append((container, key, getattr(container, key)))
+                setattr(container, key, value)
+            else:
+                previous.append((container, key, container[key]))
+                container[key] = value
+    except Exception:
+        _restore(previous)
+        raise
+    return lambda: _restore(previous)
+
+
+def _restore(previous: list) -> None:
+    for container, key, value in reversed(previous):
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            setattr(container, key, value)
+
+
+def parse_override(assignment: str) -> tuple[str, Any]:
+    """"PERCORSO=valore" (valore JSON, altrimenti testo) -> (percorso, valore)."""
+    path, sep, text = assignment.partition("=")
+    if not sep or not path:
+        raise ValueError(f"Override non valido '{assignment}' (atteso PERCORSO=valore)")
+    try:
+        return path.strip(), json.loads(text)
+    except json.JSONDecodeError:
+        return path.strip(), text
+
+
+def config_snapshot(config_module) -> dict:
+    """Tutti i valori di configurazione (nomi MAIUSCOLI) come JSON: chiavi intere come testo."""
+    values = {name: getattr(config_module, name) for name in dir(config_module) if name.isupper()}
+    return json.loads(json.dumps(values, default=str))
+
+
+@lru_cache(maxsize=None)
+def git_revision(path: str = os.path.dirname(os.path.abspath(__file__))) -> Optional[str]:
+    """Commit del codice ("-dirty" se ci sono modifiche non committate); None fuori da un repo git."""
+    try:
+        result = subprocess.run(["git", "describe", "--always", "--dirty", "--abbrev=40"],
+                                cwd=path, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+def content_hash(inputs: Any) -> str:
+    """Hash (16 caratteri esadecimali) di input serializzabili in JSON."""
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def file_digest(*paths: str) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def scenario_files(sumo_cfg: str) -> list[str]:
+    """File dello scenario SUMO che determinano il risultato: configurazione e rete."""
+    files = [sumo_cfg]
+    base = os.path.dirname(sumo_cfg)
+    for element in ET.parse(sumo_cfg).getroot().iter("net-file"):
+        files.extend(os.path.join(base, name) for name in element.get("value", "").split(","))
+    return files
+
+
+class ArtifactStore:
+    """
+    Artefatti del batch indicizzati per hash degli input:
+    <routes_dir>/cars_<n>_<hash>.rou.xml e <root>/runs/<hash>/run_* (output, params.json, log).
+    """
+
+    def __init__(self, root: str, routes_dir: Optional[str] = None):
+        self.root = root
+        self.routes_dir = routes_dir or os.path.join(root, "routes")
+        self.generated_routes = 0
+
+    def route_file(self, generator: Callable[[str, int], None], n_vehicles: int) -> str:
+        """File rotte per n_vehicles, generato solo se non esiste già con gli stessi input."""
+        key = content_hash({"generator": inspect.getsource(generator), "vehicles": n_vehicles})
+        path = os.path.join(self.routes_dir, f"cars_{n_vehicles}_{key}.rou.xml")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Scrittura atomica: un file rotte parziale non deve mai risultare già generato
+            generator(path + ".tmp", n_vehicles)
+            os.replace(path + ".tmp", path)
+            self.generated_routes += 1
+        return path
+
+    def run_prefix(self, inputs: dict) -> str:
+        """Prefisso degli output della run con questi input (params.json scritto accanto)."""
+        run_dir = os.path.join(self.root, "runs", content_hash(inputs))
+        os.makedirs(run_dir, exist_ok=True)
+        params = os.path.join(run_dir, "params.json")
+        if not os.path.exists(params):
+            with open(params, "w") as f:
+                json.dump(inputs, f, indent=2, sort_keys=True, default=str)
+        return os.path.join(run_dir, "run")
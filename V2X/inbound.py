@@ -0,0 +1,86 @@
+"""
+Coda dei messaggi MQTT in ingresso (MCM) tra il thread di rete di paho e il loop di simulazione.
+
+Basata su collections.deque: append e popleft sono atomici in CPython, quindi il
+consumatore (step) non ha bisogno di lock. I produttori possono essere più di uno (thread di
+rete di paho, worker di outbound con il trasporto loopback): le loro metriche sono aggiornate
+sotto _stats_lock.
+La coda è limitata: a coda piena il messaggio più vecchio viene scartato e contato.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class InboundQueue:
+    """
+    Canale limitato produttore/consumatore con metriche di overflow.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Args:
+            capacity: Numero massimo di messaggi in attesa (i più vecchi vengono scartati)
+        """
+        if capacity <= 0:
+            raise ValueError("capacity deve essere positiva")
+        self.capacity = capacity
+        self._queue: deque = deque(maxlen=capacity)
+
+        # Metriche: received/high_watermark scritte dai produttori (sotto _stats_lock),
+        # processed dal consumatore; i messaggi scartati si ricavano per differenza
+        self._stats_lock = threading.Lock()
+        self.received = 0
+        self.processed = 0
+        self.high_watermark = 0
+        self._warned_dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def dropped(self) -> int:
+        """Messaggi scartati per overflow (esatto a coda ferma)."""
+        return max(self.received - self.processed - len(self._queue), 0)
+
+    def put(self, item: Any) -> None:
+        """Accoda un messaggio (thread di rete o worker). A coda piena scarta il più vecchio."""
+        with self._stats_lock:
+            self._queue.append(item)
+            self.received += 1
+            depth = len(self._queue)
+            self.high_watermark = max(self.high_watermark, depth)
+            if depth < self.capacity:
+                return
+            # Avviso al primo scarto e poi ogni 100
+            dropped = self.dropped
+            warn = dropped > self._warned_dropped and (not self._warned_dropped or dropped >= self._warned_dropped + 100)
+            if warn:
+                self._warned_dropped = dropped
+        if warn:
+            logger.warning(f"Coda messaggi in ingresso piena ({self.capacity}): scartati {dropped} messaggi")
+
+    def drain(self) -> Iterator[Any]:
+        """Estrae i messaggi in ordine di arrivo (loop di simulazione), in O(1) ciascuno."""
+        queue = self._queue
+        while True:
+            try:
+                item = queue.popleft()
+            except IndexError:
+                return
+            self.processed += 1
+            yield item
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "pending": len(self._queue),
+            "high_watermark": self.high_watermark,
+        }
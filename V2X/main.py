@@ -10,21 +10,33 @@ import json
 import argparse  # <--- AGGIUNTO
 from typing import Optional
 
-import traci
+import numpy as np
+from sumo_backend import sumo
 import sumolib
+from traci import constants as tc
 
 # Configurazione
 import config # Importiamo il modulo intero per modificarlo runtime
 from config import (
     SUMO_CFG, SUMO_STEP_LENGTH, SUMO_GUI,
-    RSU_CONFIG, LOGGING, STATIONS, MQTT_TOPICS
+    RSU_CONFIG, LOGGING, STATIONS, MQTT_TOPICS, INBOUND_QUEUE_SIZE
 )
 
 # Moduli interni
-from utils import get_station_id_from_veh, get_generation_delta_time, euclidean_distance
-from mqtt_manager import mqtt_manager
-from entities import RSU, Vehicle
-from messages import MessageFactory
+from utils import get_station_id_from_veh, get_generation_delta_time, sumo_to_geo_array
+from transport import transport, TRANSPORTS, ALL_STATIONS
+from channel import ChannelModel
+from experiment import apply_overrides, parse_override, config_snapshot, git_revision
+from outbound import outbound
+from payload_cache import payload_cache
+from mcm_telemetry import mcm_telemetry
+from state_trace import TraceRecorder, TraceReplay
+from pacing import PacingController, PACING_MODES
+from profiling import StepProfiler, SUMO_STEP, RSUS, VEHICLE_READS, TRIGGERS, PAYLOAD, PUBLISH, CLEANUP, END_STEP
+from spatial_index import UniformGrid
+from inbound import InboundQueue
+from entities import RSU, Vehicle, VehicleStateTable
+from messages import MessageFactory, BaseMessage
 from triggers import TriggerRegistry
 from triggers.mcm_trigger import RSUMCMRequestTrigger
 
@@ -38,50 +50,171 @@ logger = logging.getLogger("V2X_Simulator")
 
 class V2XSimulator:
     
-    def __init__(self, route_override=None):
+    def __init__(self, route_override=None, output_prefix=None):
         self.route_override = route_override  # <--- Salva il file rotte personalizzato
+        self.output_prefix = output_prefix  # Prefisso per i report della run (es. pacing)
         
+        self._encoder = None  # UperEncoder se MESSAGE_ENCODING = "uper"
+        self._mqtt_warmup: Optional[dict] = None  # Latenze/errori di connessione per stazione (solo mqtt)
+        self._running = False
+        self._sumo_started = False  # True: le run successive ricaricano SUMO (load) invece di avviarlo
+        self._transport_ready = False  # Trasporto, codifica e listener: configurati una volta per processo
+        self._reset_run_state()
+
+    def _reset_run_state(self):
+        """Stato di una singola run: entità, trigger, code e indici (azzerato da next_run)."""
         self.rsus: dict[int, RSU] = {}
         self.vehicles: dict[str, Vehicle] = {}
+        self.vehicle_table = VehicleStateTable(projector=sumo_to_geo_array)
+        self.spatial_index = UniformGrid()
         self.vehicle_trigger_states: dict[str, dict[str, dict]] = {}
+        self.batch_trigger_states: dict[str, dict[str, np.ndarray]] = {}
         self.triggers = {}
-        self._running = False
-        self._incoming_mcm_queue = []
+        self._channel: Optional[ChannelModel] = None  # Modello di canale del trasporto loopback
+        self._incoming_mcm_queue = InboundQueue(INBOUND_QUEUE_SIZE)  # Scritta dal thread di rete paho
+        # Indici per il dispatch degli MCM in O(destinatari)
+        self._vehicles_by_station: dict[int, list[Vehicle]] = {}
+        self._manoeuvre_participants: dict[int, dict[int, None]] = {}  # manoeuvre_id -> station_id (ordinati)
+        self._vehicle_variables: list[int] = list(Vehicle.SUMO_VARIABLES)
+        self.pacing = PacingController.from_config(config.PACING_CONFIG, SUMO_STEP_LENGTH, backlog_probe=outbound.get_backlog)
+        self.profiler = StepProfiler.from_config(config.PROFILING_CONFIG)  # NullProfiler se disabilitato
+        mcm_telemetry.configure(**config.MCM_TELEMETRY_CONFIG)
+        self.recorder: Optional[TraceRecorder] = None  # Aperto da run() se TRACE_CONFIG["record"]
     
     def initialize(self):
-        # 1. Avvia SUMO
+        # 1. Avvia SUMO (o lo ricarica con i parametri della nuova run)
         self._start_sumo()
         
         # --- CONTROLLO MODALITÀ ---
         # Leggiamo direttamente dal modulo config che è stato aggiornato nel main()
         if config.SIMULATION_MODE == "BASELINE":
             logger.info("Modalità BASELINE attiva: Logica V2X disabilitata.")
+            self._setup_subscriptions()
             return
         
-        # 2. Crea RSU e Trigger (Solo V2X)
+        # 2. Trasporto (una volta per processo), RSU e Trigger (Solo V2X)
+        if not self._transport_ready:
+            self._setup_encoding()
+            self._setup_transport()
+            # Connessioni MQTT aperte tutte in parallelo prima del primo step (nessuna connect nel loop)
+            self._mqtt_warmup = transport.warm_up()
+            self._setup_mqtt_listeners()
+            self._transport_ready = True
+        else:
+            # Run successiva: connessioni e sottoscrizioni già attive, nuovo canale con il seed della run
+            self._setup_channel(transport.name)
+            if self._channel is not None: transport.active.channel = self._channel
         self._initialize_rsus()
         self._initialize_triggers()
-        self._setup_mqtt_listeners()
+        self._setup_subscriptions()
 
         logger.info("Simulatore inizializzato (V2X Attivo)")
 
+    def next_run(self, route_override=None, output_prefix=None):
+        """
+        Prepara la run successiva nello stesso processo: stato della run azzerato, SUMO
+        ricaricato (load) con seed, rotte e output della nuova run, connessioni del trasporto
+        riusate. Seed e modalità si leggono da config come in initialize().
+        """
+        outbound.flush(timeout=5.0)
+        self.route_override = route_override
+        self.output_prefix = output_prefix
+        self._reset_run_state()
+        payload_cache.clear()
+        outbound.reset_stats()
+        self.initialize()
+
+    def _setup_subscriptions(self):
+        """
+        Sottoscrive partenze/arrivi a livello di simulazione e calcola l'insieme
+        di variabili veicolo richiesto da entità e trigger attivi.
+        """
+        variables = set(Vehicle.SUMO_VARIABLES)
+        for trigger in self.triggers.values():
+            variables.update(trigger.SUMO_VARIABLES)
+        self._vehicle_variables = sorted(variables)
+
+        sumo.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS])
+        logger.debug(f"Variabili veicolo sottoscritte: {self._vehicle_variables}")
+
+    def _setup_encoding(self):
+        """Codifica UPER: moduli ASN.1 compilati una volta all'avvio, topic encoded di vanetza."""
+        if config.MESSAGE_ENCODING != "uper": return
+        from messages.uper import UperEncoder
+        if config.TRANSPORT_CONFIG["backend"] == "mqtt":
+            missing = sorted(t for t in MQTT_TOPICS if UperEncoder.pdu_key(t) in config.ASN1_CONFIG["pdus"] and t not in config.MQTT_ENCODED_TOPICS)
+            if missing:
+                raise ValueError(f"Codifica UPER su MQTT: nessun topic encoded (MQTT_ENCODED_TOPICS) per {missing}")
+        self._encoder = UperEncoder.from_config(config.ASN1_CONFIG)
+        BaseMessage.set_encoder(self._encoder)
+        MQTT_TOPICS.update(config.MQTT_ENCODED_TOPICS)
+        # I payload in cache sono JSON (generationDeltaTime aggiornato per byte)
+        payload_cache.enabled = False
+        logger.info("Codifica messaggi: ASN.1 UPER")
+
+    def _setup_transport(self):
+        backend = config.TRANSPORT_CONFIG["backend"]
+        self._setup_channel(backend)
+        transport.select(backend, all_stations=config.TRANSPORT_CONFIG.get("all_stations", False), channel=self._channel)
+        logger.info(f"Trasporto messaggi: {backend}" + (f" (canale {self._channel.model}, portata {self._channel.max_range:.0f} m)" if self._channel else ""))
+
+    def _setup_channel(self, backend):
+        """Modello di canale del loopback, con le estrazioni casuali derivate dal seed della run."""
+        if backend != "loopback" or not config.CHANNEL_CONFIG.get("enabled"): return
+        self._channel = ChannelModel.from_config(config.CHANNEL_CONFIG, seed=config.SUMO_SEED)
+        # I collegamenti di uno step si calcolano a fine step: tutti i suoi messaggi devono essere pubblicati
+        if not outbound.flush_each_step: outbound.configure(flush_each_step=True)
+
     def _setup_mqtt_listeners(self):
-        listener_client = mqtt_manager.get_client(0) 
-        if listener_client:
-            listener_client.on_message = self._on_mqtt_message
-            topic = "vanetza/in/mcm"
-            listener_client.subscribe(topic)
+        topic = MQTT_TOPICS["mcm"]
+        if transport.name == "loopback":
+            # MCM ricevute via radio dai veicoli (tutti, o solo entro portata con il modello di canale)
+            air_topic = transport.over_the_air_topic(topic)
+            if transport.subscribe(ALL_STATIONS, air_topic, self._on_air_message):
+                logger.info(f"Ascolto attivo su topic loopback: {air_topic}")
+            return
+        # Topic di ingresso della RSU: riceve le MCM che pubblica (broker locale).
+        # La sottoscrizione è ripristinata a ogni riconnessione del container
+        if transport.subscribe(0, topic, self._on_mqtt_message):
             logger.info(f"Ascolto attivo su topic MQTT: {topic}")
+        if mcm_telemetry.enabled:
+            # Telemetria MCM: ricezioni via radio di ogni stazione (topic di uscita di vanetza)
+            air_topic = topic.replace("/in/", "/out/", 1)
+            subscribed = [sid for sid in STATIONS if transport.subscribe(sid, air_topic, self._on_mcm_reception)]
+            logger.info(f"Telemetria MCM: ascolto su {air_topic} per le stazioni {subscribed}")
 
     def _on_mqtt_message(self, client, userdata, msg):
+        self._enqueue_mcm(msg.payload, None)
+
+    def _on_air_message(self, client, userdata, msg):
+        # userdata["station_id"]: stazione ricevente (None senza modello di canale = tutte)
+        self._enqueue_mcm(msg.payload, userdata.get("station_id"), over_the_air=True)
+
+    def _on_mcm_reception(self, client, userdata, msg):
+        # Solo telemetria: gli MCM da elaborare arrivano dal topic di ingresso della RSU
         try:
-            payload = json.loads(msg.payload.decode())
-            self._incoming_mcm_queue.append(payload)
+            mcm_telemetry.received(self._decode_mcm(msg.payload), userdata.get("station_id"))
+        except Exception as e:
+            logger.error(f"Errore parsing MQTT: {e}")
+
+    def _decode_mcm(self, raw: bytes) -> dict:
+        if self._encoder: return self._encoder.decode_payload("mcm", raw)[1]
+        return json.loads(raw.decode())
+
+    def _enqueue_mcm(self, raw: bytes, receiver: Optional[int], over_the_air: bool = False):
+        try:
+            payload = self._decode_mcm(raw)
+            if over_the_air: mcm_telemetry.received(payload, receiver)
+            self._incoming_mcm_queue.put((payload, receiver))
         except Exception as e:
             logger.error(f"Errore parsing MQTT: {e}")
     
     def _start_sumo(self):
         """Avvia la simulazione SUMO con parametri dinamici."""
+        if config.TRACE_CONFIG.get("replay"):
+            self._start_replay(config.TRACE_CONFIG["replay"])
+            return
+
         binary = "sumo-gui" if config.SUMO_GUI else "sumo"
         sumo_binary = sumolib.checkBinary(binary)
         
@@ -107,107 +240,289 @@ class V2XSimulator:
         # Aggiunge argomenti statistiche (aggiornati nel main)
         cmd.extend(config.get_sumo_output_args())
         
-        traci.start(cmd)
-        logger.info(f"SUMO avviato - Mode: {config.SIMULATION_MODE} - Seed: {config.SUMO_SEED}")
+        if self._sumo_started and sumo.name == "replay": self._close_sumo()  # Run precedente in replay
+        if self._sumo_started:
+            # Stessa istanza SUMO: load chiude la run precedente (scrive i suoi output) e avvia la nuova
+            sumo.load(cmd[1:])
+            logger.info(f"SUMO ricaricato - Mode: {config.SIMULATION_MODE} - Seed: {config.SUMO_SEED} - Backend: {sumo.name}")
+            return
+
+        # libsumo gira in-process (solo headless), traci su socket
+        backend = sumo.select(config.SUMO_BACKEND, gui=config.SUMO_GUI)
+        sumo.start(cmd)
+        self._sumo_started = True
+        logger.info(f"SUMO avviato - Mode: {config.SIMULATION_MODE} - Seed: {config.SUMO_SEED} - Backend: {backend}")
+
+    def _start_replay(self, directory):
+        """Trace registrato al posto di SUMO: stessa API, nessun processo (vedi state_trace.py)."""
+        replay = sumo._module if sumo.name == "replay" else None
+        if self._sumo_started and replay is not None and replay.directory == directory:
+            replay.load([])
+        else:
+            if self._sumo_started: self._close_sumo()
+            replay = TraceReplay(directory)
+            sumo.use(replay, "replay")
+            self._sumo_started = True
+        if replay.step_length != SUMO_STEP_LENGTH:
+            logger.warning(f"Trace registrato con step di {replay.step_length}s, SUMO_STEP_LENGTH = {SUMO_STEP_LENGTH}s")
+        logger.info(f"Replay del trace {directory} - Mode: {config.SIMULATION_MODE} - {replay.n_steps} step, "
+                    f"{len(replay.ids)} veicoli (origine: {replay.meta.get('source', {})})")
+
+    def _open_recorder(self) -> Optional[TraceRecorder]:
+        """Recorder del trace della run (anche in BASELINE: lo stato dei veicoli è sottoscritto e letto comunque)."""
+        directory = config.TRACE_CONFIG.get("record")
+        if not directory:
+            return None
+        if directory is True: directory = f"{self.output_prefix or 'run'}_trace"
+        source = {"mode": config.SIMULATION_MODE, "seed": config.SUMO_SEED, "route_file": self.route_override,
+                  "backend": sumo.name, "git_revision": git_revision()}
+        return TraceRecorder.from_config(config.TRACE_CONFIG, directory, SUMO_STEP_LENGTH, source)
     
     def _initialize_rsus(self):
         for rsu_id, cfg in RSU_CONFIG.items():
             try:
-                rsu = RSU(rsu_id, cfg["position"], broadcast_interval=cfg.get("broadcast_interval", 1.0), enabled_messages=cfg.get("enabled_messages", ["cam"]))
+                rsu = RSU(rsu_id, cfg["position"], broadcast_interval=cfg.get("broadcast_interval", 1.0), detection_radius=cfg.get("detection_radius", 100.0), enabled_messages=cfg.get("enabled_messages", ["cam"]))
                 self.rsus[rsu_id] = rsu
             except Exception as e:
                 logger.error(f"Errore RSU {rsu_id}: {e}")
+
+        # Celle della griglia grandi quanto il raggio massimo: ogni query tocca al più 3x3 celle
+        if self.rsus:
+            self.spatial_index = UniformGrid(max(rsu.detection_radius for rsu in self.rsus.values()))
     
     def _initialize_triggers(self):
         for msg_type in MessageFactory.get_available_types():
             trigger = TriggerRegistry.get(msg_type)
-            if trigger: self.triggers[msg_type] = trigger
+            if not trigger: continue
+            self.triggers[msg_type] = trigger
+            # Stato per-slot dei trigger vettoriali, indicizzato come la tabella veicoli
+            if trigger.SUPPORTS_BATCH: self.batch_trigger_states[msg_type] = trigger.new_batch_state(self.vehicle_table.capacity)
     
-    def run(self):
+    def run(self, close: bool = True) -> bool:
+        """
+        Esegue la simulazione fino alla fine.
+
+        Args:
+            close: False = SUMO, pipeline di uscita e trasporto restano aperti per next_run
+                   (chiusi comunque se la run viene interrotta)
+
+        Returns:
+            False se la run è stata interrotta (Ctrl+C)
+        """
         self._running = True
+        completed = interrupted = False
+        self._report_config()
+        self.recorder = self._open_recorder()
+        self.pacing.start()
         try:
-            while self._running and traci.simulation.getMinExpectedNumber() > 0:
-                self._process_incoming_messages()
-                traci.simulationStep()
-                
-                sim_time = traci.simulation.getTime()
-                gen_delta_time = get_generation_delta_time(sim_time)
-                
-                self._process_rsus(sim_time, gen_delta_time)
-                self._process_vehicles(sim_time, gen_delta_time)
-                self._cleanup_vehicles()
-
-                # --- MODIFICA QUI: GESTIONE VELOCITÀ ---
-                if config.SUMO_GUI:
-                    # Se c'è la grafica, rallenta per simulare il tempo reale (0.1s = 100ms)
-                    # Questo permette anche a Vanetza di "stare al passo"
-                    time.sleep(0.01) 
-                else:
-                    # Se siamo in batch (senza grafica), vai alla massima velocità possibile
-                    time.sleep(0.01)    # se minore, il container di vanetza_nap, esclude un elemento dello scenario, obu's, rsu's(randomicamente)
+            while self._running and sumo.simulation.getMinExpectedNumber() > 0:
+                self.step()
+
+                # Ritmo rispetto al tempo reale (vedi PACING_CONFIG): se gli step sono troppo
+                # veloci il container di vanetza_nap esclude un elemento dello scenario (obu/rsu)
+                self.pacing.pace()
+            completed = True
 
         except KeyboardInterrupt:
-            pass
+            interrupted = True
         finally:
-            self.shutdown()
+            if self.recorder is not None: self.recorder.close()
+            self._report_pacing()
+            self._report_profile()
+            self._report_mcm()
+            if close or interrupted: self.shutdown()
+            # Errore durante la run: la prossima riparte con un nuovo SUMO, stesso trasporto
+            elif not completed: self._close_sumo()
+        return not interrupted
+
+    def _report_config(self):
+        """Configurazione della run (dopo gli override) e revisione del codice, accanto agli output."""
+        if not self.output_prefix:
+            return
+        try:
+            with open(f"{self.output_prefix}_config.json", "w") as f:
+                json.dump({"git_revision": git_revision(), "config": config_snapshot(config)}, f, indent=2)
+        except OSError as e:
+            logger.error(f"Impossibile salvare la configurazione della run: {e}")
+
+    def _report_pacing(self):
+        report = self.pacing.report()
+        report["inbound"] = self._incoming_mcm_queue.stats()
+        outbound.flush(timeout=5.0)
+        report["outbound"] = outbound.stats()
+        report["payload_cache"] = payload_cache.stats()
+        if self._mqtt_warmup: report["mqtt_warmup"] = self._mqtt_warmup
+        # Trasporto mai selezionato (BASELINE): nessuna statistica, e nessun mqtt attivato per ottenerle
+        if transport.name: report["transport"] = transport.stats()
+        if report.get("transport", {}).get("spool_dropped") or report.get("transport", {}).get("spool_expired"):
+            logger.warning(f"MQTT spool: {report['transport']['spool_dropped']} MCM scartate (spool pieno), "
+                           f"{report['transport']['spool_expired']} MCM scadute durante le disconnessioni")
+        if report["inbound"]["dropped"]:
+            logger.warning(f"Coda MCM in ingresso: scartati {report['inbound']['dropped']} messaggi su {report['inbound']['received']}")
+        logger.info(f"Pacing [{report['mode']}]: RTF raggiunto {report['achieved_rtf']:.2f}, "
+                    f"stalli {report['stalls']} ({report['stall_time']:.2f}s), backlog max {report['max_backlog']}")
+        if self.output_prefix:
+            try:
+                with open(f"{self.output_prefix}_pacing.json", "w") as f:
+                    json.dump(report, f, indent=2)
+            except OSError as e:
+                logger.error(f"Impossibile salvare il report di pacing: {e}")
+
+    def _report_profile(self):
+        summary = self.profiler.summary()
+        if summary is None:
+            return
+        slowest = sorted(summary["phases"].items(), key=lambda item: item[1]["mean"], reverse=True)[:3]
+        logger.info(f"Step: media {summary['step']['mean']:.3f} ms, p99 {summary['step']['p99']:.3f} ms; "
+                    + ", ".join(f"{name} {values['share']:.0%}" for name, values in slowest))
+        if self.output_prefix:
+            try:
+                with open(f"{self.output_prefix}_profile.json", "w") as f:
+                    json.dump(summary, f, indent=2)
+            except OSError as e:
+                logger.error(f"Impossibile salvare i tempi per fase: {e}")
+
+    def _report_mcm(self):
+        report = mcm_telemetry.report()
+        if report is None:
+            return
+        sessions, latencies = report["sessions"], report["latencies"]
+        logger.info(f"MCM: {sessions['opened']} sessioni, {sessions['completed']} completate; "
+                    + ", ".join(f"{name} p50 {latencies[name]['wall_ms']['p50']:.1f} ms" for name in
+                                ("request_to_response", "response_to_actuation", "session") if name in latencies))
+        if self.output_prefix:
+            try:
+                with open(f"{self.output_prefix}_mcm.json", "w") as f:
+                    json.dump(report, f, indent=2)
+            except OSError as e:
+                logger.error(f"Impossibile salvare la telemetria MCM: {e}")
+
+    def step(self):
+        """Esegue un singolo step di simulazione (senza pacing)."""
+        prof = self.profiler
+        prof.begin()
+        self._process_incoming_messages()
+        prof.switch(SUMO_STEP)
+        sumo.simulationStep()
+        
+        sim_time = sumo.simulation.getTime()
+        gen_delta_time = get_generation_delta_time(sim_time)
+        mcm_telemetry.set_time(sim_time)
+        
+        sim_results = sumo.simulation.getSubscriptionResults()
+        departed = sim_results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        arrived = sim_results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ())
+        
+        prof.switch(RSUS)
+        self._process_rsus(sim_time, gen_delta_time)
+        prof.switch(VEHICLE_READS)
+        self._process_vehicles(sim_time, gen_delta_time, departed, arrived)
+        prof.switch(CLEANUP)
+        self._cleanup_vehicles(arrived)
+        prof.switch(END_STEP)
+
+        # Barriera opzionale: i messaggi dello step sono pubblicati prima del successivo
+        if outbound.flush_each_step: outbound.flush()
+        # Modello di canale: collegamenti dei messaggi dello step e consegna di quelli in arrivo
+        if self._channel is not None: transport.end_step(sim_time, SUMO_STEP_LENGTH, self._station_positions)
+        prof.end()
+
+    def _station_positions(self):
+        """(station_ids, xs, ys) di veicoli attivi e RSU, per il modello di canale."""
+        table = self.vehicle_table
+        slots = np.flatnonzero(table.active)
+        rsus = list(self.rsus.values())
+        station_ids = np.concatenate([table.station_id[slots], [rsu.station_id for rsu in rsus]])
+        xs = np.concatenate([table.x[slots], [rsu.position[0] for rsu in rsus]])
+        ys = np.concatenate([table.y[slots], [rsu.position[1] for rsu in rsus]])
+        return station_ids, xs, ys
 
     def _process_incoming_messages(self):
-        while self._incoming_mcm_queue:
-            payload = self._incoming_mcm_queue.pop(0)
+        # receiver: stazione che ha ricevuto il messaggio via radio (None = tutte)
+        for payload, receiver in self._incoming_mcm_queue.drain():
             basic = payload.get("basicContainer", {})
             mcm_type = basic.get("mcmType")
             
-            if mcm_type == 1: self._dispatch_mcm_request(payload)
-            elif mcm_type == 4: self._dispatch_mcm_termination(payload)
+            if mcm_type == 1: self._dispatch_mcm_request(payload, receiver)
+            elif mcm_type == 4: self._dispatch_mcm_termination(payload, receiver)
 
-    def _dispatch_mcm_termination(self, payload):
-        for vehicle_obj in self.vehicles.values():
-            if vehicle_obj.managed_by_python:
+    def _dispatch_mcm_termination(self, payload, receiver=None):
+        manoeuvre_id = payload.get("basicContainer", {}).get("manoeuvreId")
+        if receiver is not None:
+            # Ricevuta da una sola stazione: esce dalla manovra solo lei (se partecipante)
+            participants = self._manoeuvre_participants.get(manoeuvre_id)
+            if participants is not None:
+                if receiver not in participants: return
+                del participants[receiver]
+                if not participants: del self._manoeuvre_participants[manoeuvre_id]
+            for vehicle_obj in self._vehicles_by_station.get(receiver, ()):
                 vehicle_obj.handle_mcm_termination(payload)
+            return
+
+        participants = self._manoeuvre_participants.pop(manoeuvre_id, None)
+        if participants is None:
+            # Manovra sconosciuta (Request persa o precedente all'avvio): avvisa tutti i veicoli gestiti
+            logger.debug(f"Termination per manovra {manoeuvre_id} senza partecipanti noti: broadcast")
+            recipients = [v for v in self.vehicles.values() if v.managed_by_python]
+        else:
+            recipients = [v for sid in participants for v in self._vehicles_by_station.get(sid, ())]
+
+        for vehicle_obj in recipients:
+            vehicle_obj.handle_mcm_termination(payload)
 
-    def _dispatch_mcm_request(self, payload):
+    def _dispatch_mcm_request(self, payload, receiver=None):
         container = payload.get("mcmContainer", {}).get("advisedManoeuvreContainer", [])
-        target_ids = [item["executantID"] for item in container if "executantID" in item]
+        target_ids = list(dict.fromkeys(item["executantID"] for item in container if "executantID" in item))
+        # Ricevuta da una sola stazione (modello di canale): solo se è tra gli esecutori
+        if receiver is not None: target_ids = [receiver] if receiver in target_ids else []
         if not target_ids: return
 
-        for vehicle_obj in self.vehicles.values():
-            if vehicle_obj.station_id in target_ids:
+        # I partecipanti restano associati alla manovra fino alla Termination
+        manoeuvre_id = payload.get("basicContainer", {}).get("manoeuvreId")
+        self._manoeuvre_participants.setdefault(manoeuvre_id, {}).update(dict.fromkeys(target_ids))
+
+        for station_id in target_ids:
+            for vehicle_obj in self._vehicles_by_station.get(station_id, ()):
                 vehicle_obj.handle_mcm_request(payload)
     
     def _process_rsus(self, sim_time: float, gen_delta_time: int):
-        # Snapshot semplificato per performance
-        world_vehicles = []
-        for v in self.vehicles.values():
-            snap = v.get_state_snapshot()
-            snap.update({"id": v.sumo_id, "station_id": v.station_id, "light_left_turn": v._light_left_turn, "light_right_turn": v._light_right_turn})
-            world_vehicles.append(snap)
-
-        for rsu in self.rsus.values():
+        if not self.rsus: return
+
+        # Indice spaziale ricostruito una volta per step sulle colonne della tabella,
+        # poi un'unica query vettoriale per tutte le RSU
+        table = self.vehicle_table
+        active_slots = np.flatnonzero(table.active)
+        self.spatial_index.build(table.x[active_slots], table.y[active_slots], active_slots)
+        rsus = list(self.rsus.values())
+        hits = self.spatial_index.query_many([rsu.position for rsu in rsus], [rsu.detection_radius for rsu in rsus])
+
+        for rsu, (slots, distances) in zip(rsus, hits):
+            neighbors = None
             for msg_type in rsu.enabled_messages:
                 should_send = False
                 if msg_type == "cam":
                     should_send = rsu.should_send_message(msg_type, sim_time)
                 elif msg_type in self.triggers:
-                    should_send = self._evaluate_rsu_trigger(rsu, msg_type, sim_time, world_vehicles)
+                    # Vicini calcolati una sola volta per RSU e condivisi tra i suoi trigger
+                    if neighbors is None: neighbors = self._rsu_neighbors(slots, distances)
+                    should_send = self._evaluate_rsu_trigger(rsu, msg_type, sim_time, neighbors)
 
                 if should_send:
                     self._send_message(rsu, msg_type, gen_delta_time)
                     rsu.mark_message_sent(msg_type, sim_time)
     
-    def _evaluate_rsu_trigger(self, rsu, msg_type, sim_time, world_vehicles):
+    def _rsu_neighbors(self, slots, distances):
+        """Veicoli entro il raggio della RSU, in ordine di registrazione, come viste sulla tabella."""
+        table = self.vehicle_table
+        order = np.argsort(table.seq[slots], kind="stable")
+        return table.neighbors(slots[order], distances[order])
+
+    def _evaluate_rsu_trigger(self, rsu, msg_type, sim_time, neighbors):
         trigger = self.triggers.get(msg_type)
         if not trigger: return False
 
-        rsu_neighbors = []
-        for v in world_vehicles:
-            dist = euclidean_distance(rsu._x, rsu._y, v["x"], v["y"])
-            if dist <= 100: # Ottimizzazione: passa solo veicoli vicini
-                v_copy = v.copy()
-                v_copy["distance_to_rsu"] = dist
-                rsu_neighbors.append(v_copy)
-
         current_state = rsu.get_state_snapshot()
-        current_state["neighbors"] = rsu_neighbors
+        current_state["neighbors"] = neighbors
         
         key = f"rsu_{rsu.station_id}"
         if key not in self.vehicle_trigger_states: self.vehicle_trigger_states[key] = {}
@@ -222,19 +537,35 @@ class V2XSimulator:
             return True
         return False
     
-    def _process_vehicles(self, sim_time, gen_delta_time):
-        for veh_id in traci.vehicle.getIDList():
-            if veh_id not in self.vehicles: self._register_vehicle(veh_id)
-            v = self.vehicles[veh_id]
-            x, y = traci.vehicle.getPosition(veh_id)
-            v.update(sim_time, x=x, y=y, speed=traci.vehicle.getSpeed(veh_id), heading=traci.vehicle.getAngle(veh_id), acceleration=traci.vehicle.getAcceleration(veh_id), light_left_turn=(traci.vehicle.getSignals(veh_id) & 2) != 0, light_right_turn=(traci.vehicle.getSignals(veh_id) & 1) != 0)
+    def _process_vehicles(self, sim_time, gen_delta_time, departed=(), arrived=()):
+        # Nuovi veicoli: sottoscrizione una tantum, poi lo stato arriva in blocco
+        for veh_id in departed:
+            if veh_id not in self.vehicles and veh_id not in arrived: self._register_vehicle(veh_id)
+
+        # Scrittura in blocco nella tabella (lat/lon proiettate in blocco al primo accesso)
+        table = self.vehicle_table
+        slots = table.ingest(sumo.vehicle.getAllSubscriptionResults())
+        if self.recorder is not None: self.recorder.record(sim_time, departed, arrived, table, slots)
+        self.profiler.switch(TRIGGERS)
+
+        batch_slots = {msg_type: [] for msg_type in self.batch_trigger_states}
+        for slot in slots.tolist():
+            v = self.vehicles[table.ids[slot]]
+            v.update(sim_time)
             
             for msg in v.enabled_messages:
-                self._evaluate_and_send(v, msg, sim_time, gen_delta_time)
+                if msg in batch_slots: batch_slots[msg].append(slot)
+                else: self._evaluate_and_send(v, msg, sim_time, gen_delta_time)
+
+        # Trigger vettoriali: una sola valutazione per tipo di messaggio su tutti i veicoli
+        for msg_type, candidates in batch_slots.items():
+            if candidates: self._evaluate_batch_and_send(msg_type, np.asarray(candidates, dtype=np.intp), sim_time, gen_delta_time)
     
     def _register_vehicle(self, sumo_id):
-        v = Vehicle.from_sumo(sumo_id)
+        sumo.vehicle.subscribe(sumo_id, self._vehicle_variables)
+        v = Vehicle.from_sumo(sumo_id, self.vehicle_table)
         self.vehicles[sumo_id] = v
+        self._vehicles_by_station.setdefault(v.station_id, []).append(v)
         self.vehicle_trigger_states[sumo_id] = {}
     
     def _evaluate_and_send(self, vehicle, msg_type, sim_time, gen_delta_time):
@@ -248,22 +579,128 @@ class V2XSimulator:
             self._send_message(vehicle, msg_type, gen_delta_time)
             if res.new_state: self.vehicle_trigger_states[vehicle.sumo_id][msg_type] = res.new_state
     
+    def _evaluate_batch_and_send(self, msg_type, slots, sim_time, gen_delta_time):
+        trigger, table = self.triggers[msg_type], self.vehicle_table
+        state = self.batch_trigger_states[msg_type]
+        trigger.grow_batch_state(state, table.capacity)
+        
+        send = trigger.evaluate_batch(sim_time, table.columns("x", "y", "speed", "heading", "acceleration", "signals"), state, slots)
+        for slot in slots[send].tolist():
+            self._send_message(self.vehicles[table.ids[slot]], msg_type, gen_delta_time)
+    
     def _send_message(self, entity, msg_type, gen_delta_time):
+        prof = self.profiler
+        prof.push(PAYLOAD)
         msg = MessageFactory.create(msg_type, gen_delta_time)
-        if msg: mqtt_manager.publish(entity.station_id, msg_type, msg.build_payload(entity.get_message_data(msg_type)))
+        if not msg:
+            prof.pop()
+            return
+        # Stazioni non servite dal trasporto (es. senza container): la pipeline le scarta senza usare i dati
+        if not transport.is_routable(entity.station_id):
+            payload, data = msg, None
+        else:
+            # Stato invariato: payload dalla cache con il solo generationDeltaTime aggiornato;
+            # altrimenti dati estratti ora (snapshot dello step), serializzazione e publish nei worker
+            payload, data = payload_cache.prepare(entity, msg)
+            if mcm_telemetry.enabled and msg_type.startswith("mcm"):
+                mcm_telemetry.created(entity.station_id, msg, (data or entity.get_message_data(msg_type)).get("manoeuvre_id", 0))
+        prof.switch(PUBLISH)
+        outbound.submit(entity.station_id, msg_type, payload, data)
+        prof.pop()
     
-    def _cleanup_vehicles(self):
-        active = set(traci.vehicle.getIDList())
-        for vid in list(self.vehicles.keys()):
-            if vid not in active:
-                del self.vehicles[vid]
+    def _cleanup_vehicles(self, arrived=()):
+        # Gli arrivi arrivano dalla sottoscrizione di simulazione: nessun getIDList
+        for vid in arrived:
+            if vid in self.vehicles:
+                v = self.vehicles.pop(vid)
+                payload_cache.evict(v)
+                same_station = self._vehicles_by_station.get(v.station_id, [])
+                if v in same_station: same_station.remove(v)
+                if not same_station: self._vehicles_by_station.pop(v.station_id, None)
+                slot = self.vehicle_table.release(vid)
+                if slot is not None:
+                    for msg_type, state in self.batch_trigger_states.items():
+                        self.triggers[msg_type].reset_batch_state(state, slot)
                 if vid in self.vehicle_trigger_states: del self.vehicle_trigger_states[vid]
     
+    def _close_sumo(self):
+        self._sumo_started = False
+        try: sumo.close()
+        except: pass
+
     def shutdown(self):
         self._running = False
-        try: traci.close()
-        except: pass
-        mqtt_manager.close_all()
+        self._close_sumo()
+        outbound.stop()
+        transport.close_all()
+
+def run_output_args(prefix):
+    """Argomenti SUMO per gli output di una run (statistiche e tripinfo con il prefisso della run)."""
+    return [
+        "--statistic-output", f"{prefix}_stats.xml",
+        "--tripinfo-output", f"{prefix}_tripinfo.xml",
+        "--duration-log.statistics", "true",
+        "--no-step-log", "true"
+    ]
+
+def run_sweep(runs):
+    """
+    Esegue più run nello stesso processo: una sola istanza SUMO, ricaricata con traci.load
+    tra una run e l'altra, e le stesse connessioni del trasporto (container MQTT già connessi).
+
+    Args:
+        runs: Lista di dizionari {"mode", "seed", "route_file", "prefix"}, opzionali "log"
+              (file in cui copiare i log della run) e "overrides" ({percorso in config: valore},
+              ripristinati a fine run)
+
+    Yields:
+        (run, esito "OK" / "ERRORE", durata in s) di ogni run, solo quando SUMO ne ha chiuso
+        gli output (statistiche e tripinfo): dopo il load della run successiva, o la chiusura
+        di SUMO per l'ultima run e per quelle in errore. Una run interrotta non viene restituita.
+    """
+    config.SUMO_GUI = False
+    sim = None
+    pending = None  # Run terminata, con gli output ancora aperti in SUMO
+    try:
+        for run in runs:
+            config.SUMO_SEED = run["seed"]
+            config.SIMULATION_MODE = run["mode"]
+            config.get_sumo_output_args = lambda prefix=run["prefix"]: run_output_args(prefix)
+
+            handler = logging.FileHandler(run["log"], mode="a") if run.get("log") else None
+            if handler:
+                handler.setFormatter(logging.getLogger().handlers[0].formatter)
+                logging.getLogger().addHandler(handler)
+            t0 = time.perf_counter()
+            restore = None
+            interrupted = False
+            try:
+                restore = apply_overrides(config, run.get("overrides", {}))
+                if sim is None:
+                    sim = V2XSimulator(route_override=run["route_file"], output_prefix=run["prefix"])
+                    sim.initialize()
+                else:
+                    sim.next_run(route_override=run["route_file"], output_prefix=run["prefix"])
+                if not sim.run(close=False):
+                    sim = None  # Interrotta: simulatore già chiuso
+                    interrupted = True
+                status = "OK"
+            except Exception as e:
+                logger.error(f"Errore nella run {run['prefix']}: {e}", exc_info=True)
+                if sim is not None: sim._close_sumo()  # La run successiva riavvia SUMO
+                status = "ERRORE"
+            finally:
+                if restore: restore()
+                if handler:
+                    logging.getLogger().removeHandler(handler)
+                    handler.close()
+            # Output della run precedente chiusi da SUMO con il load (o la chiusura) di questa run
+            if pending: yield pending
+            if interrupted: return
+            pending = (run, status, time.perf_counter() - t0)
+    finally:
+        if sim is not None: sim.shutdown()
+    if pending: yield pending
 
 def main():
     print("=" * 60)
@@ -276,27 +713,50 @@ def main():
     parser.add_argument("--mode", type=str, choices=["BASELINE", "V2X"], help="Override Mode")
     parser.add_argument("--prefix", type=str, default="run", help="Prefisso output")
     parser.add_argument("--nogui", action="store_true", help="Disabilita la GUI di SUMO per esecuzione veloce")
+    parser.add_argument("--backend", type=str, choices=["traci", "libsumo"], help="Backend SUMO (libsumo = in-process, solo headless)")
+    parser.add_argument("--pacing", type=str, choices=PACING_MODES, help="Ritmo del loop: afap, fixed (usa --rtf), adaptive")
+    parser.add_argument("--rtf", type=float, help="Real-time factor per il pacing fixed")
+    parser.add_argument("--outbound-workers", type=int, help="Thread di pubblicazione (0 = sincrono)")
+    parser.add_argument("--transport", type=str, choices=TRANSPORTS, help="Trasporto dei messaggi (loopback/null = senza docker)")
+    parser.add_argument("--channel", action="store_true", help="Modello di canale radio nel trasporto loopback (CHANNEL_CONFIG)")
+    parser.add_argument("--flush-each-step", action="store_true", help="Attende la pubblicazione dei messaggi a fine step")
+    parser.add_argument("--profile", action="store_true", help="Tempi per fase dello step in <prefix>_profile.json (PROFILING_CONFIG)")
+    parser.add_argument("--mcm-telemetry", action="store_true", help="Latenze del flusso MCM in <prefix>_mcm.json (MCM_TELEMETRY_CONFIG)")
+    parser.add_argument("--record-trace", type=str, metavar="DIR", help="Registra lo stato per step dei veicoli in DIR (TRACE_CONFIG)")
+    parser.add_argument("--replay-trace", type=str, metavar="DIR", help="Riesegue un trace registrato al posto di SUMO")
+    parser.add_argument("--encoding", type=str, choices=["json", "uper"], help="Codifica dei messaggi pubblicati")
+    parser.add_argument("--set", action="append", default=[], metavar="PERCORSO=VALORE",
+                        help="Override di un valore di config (es. CAM_TRIGGER_CONFIG.delta_speed_threshold=1.0; valore JSON)")
     args = parser.parse_args()
 
     # 1. Override Configurazione
     if args.seed is not None: config.SUMO_SEED = args.seed
     if args.mode is not None: config.SIMULATION_MODE = args.mode
+    if args.backend is not None: config.SUMO_BACKEND = args.backend
+    if args.pacing is not None: config.PACING_CONFIG["mode"] = args.pacing
+    if args.rtf is not None: config.PACING_CONFIG["rtf"] = args.rtf
+    if args.outbound_workers is not None: outbound.configure(workers=args.outbound_workers)
+    if args.flush_each_step: outbound.configure(flush_each_step=True)
+    if args.encoding is not None: config.MESSAGE_ENCODING = args.encoding
+    if args.transport is not None: config.TRANSPORT_CONFIG["backend"] = args.transport
+    if args.channel: config.CHANNEL_CONFIG["enabled"] = True
+    if args.profile: config.PROFILING_CONFIG["enabled"] = True
+    if args.mcm_telemetry: config.MCM_TELEMETRY_CONFIG["enabled"] = True
+    if args.record_trace is not None: config.TRACE_CONFIG["record"] = args.record_trace
+    if args.replay_trace is not None: config.TRACE_CONFIG["replay"] = args.replay_trace
+    # Override generici (es. dalle specifiche di esperimento): applicati per ultimi
+    apply_overrides(config, dict(parse_override(assignment) for assignment in args.set))
 
     if args.nogui:
         config.SUMO_GUI = False  # Forza l'uso di "sumo" (console) invece di "sumo-gui"
 
     # 2. Patch Output
     def get_dynamic_output_args():
-        return [
-            "--statistic-output", f"{args.prefix}_stats.xml",
-            "--tripinfo-output", f"{args.prefix}_tripinfo.xml",
-            "--duration-log.statistics", "true",
-            "--no-step-log", "true"
-        ]
+        return run_output_args(args.prefix)
     config.get_sumo_output_args = get_dynamic_output_args
 
     # 3. Avvio
-    sim = V2XSimulator(route_override=args.route_file)
+    sim = V2XSimulator(route_override=args.route_file, output_prefix=args.prefix)
     try:
         sim.initialize()
         sim.run()
@@ -0,0 +1,232 @@
+"""
+Latenze del flusso MCM request -> response -> termination.
+
+Ogni MCM viene marcata (tempo simulato e orologio monotono) in tre punti:
+- creazione: nel loop di simulazione (RSU in V2XSimulator._send_message, veicoli in
+  Vehicle._send_mcm_response)
+- publish: consegna al trasporto nel worker della pipeline di uscita (outbound.py)
+- ricezione: prima ricezione via radio da una stazione diversa dal mittente (topic
+  vanetza/out; col trasporto loopback il listener via radio del simulatore)
+
+I messaggi sono correlati per (stationID, manoeuvreId, mcmType); una chiave ripetuta
+(es. manoeuvreId fisso della RSU) corrisponde a più istanze, ricevute nell'ordine di
+pubblicazione. Le sessioni vanno dalla prima Request di una RSU alla sua Termination; le
+Response sono associate alla sessione della RSU a cui rispondono.
+
+Per run (<prefix>_mcm.json), con conteggi, percentili e istogramma:
+- queue / delivery per tipo: creazione -> publish, publish -> ricezione (ms)
+- request_to_response: prima Request della sessione -> ricezione della Response
+- response_to_actuation: creazione della Response -> comando TraCI dell'azione del veicolo
+- session: prima Request -> ricezione della Termination
+in tempo simulato (s) e reale (ms). Il tempo simulato di un evento è quello dell'ultimo step.
+
+Disabilitata (default) ogni punto di misura è un controllo di `enabled`.
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+from config import MCM_TELEMETRY_CONFIG
+
+PERCENTILES = (50, 95, 99)
+
+
+class _Instance:
+    """Una MCM pubblicata: tempi di creazione, publish e prima ricezione."""
+
+    __slots__ = ("message_type", "sim", "wall", "published", "received", "receivers", "session")
+
+    def __init__(self, message_type: str, sim: float, wall: float, session: Optional["_Instance"]):
+        self.message_type = message_type
+        self.sim, self.wall = sim, wall
+        self.published: Optional[float] = None
+        self.received: Optional[tuple[float, float]] = None
+        self.receivers: set = set()
+        self.session = session  # Prima Request della sessione
+
+
+class MCMTelemetry:
+    """Marcature temporali delle MCM, thread-safe (loop, worker di uscita, thread di rete)."""
+
+    def __init__(self, enabled: bool = False, wall_bins_ms: tuple = (), sim_bins_s: tuple = (), history: int = 64):
+        """
+        Args:
+            enabled: False = nessuna marcatura
+            wall_bins_ms: Estremi inferiori dei bin degli istogrammi in tempo reale (ms)
+            sim_bins_s: Estremi inferiori dei bin degli istogrammi in tempo simulato (s)
+            history: Istanze recenti conservate per chiave in attesa di ricezione
+        """
+        self._lock = threading.Lock()
+        self.configure(enabled, wall_bins_ms, sim_bins_s, history)
+
+    @classmethod
+    def from_config(cls, telemetry_config: dict) -> "MCMTelemetry":
+        return cls(**telemetry_config)
+
+    def configure(self, enabled: bool = False, wall_bins_ms: tuple = (), sim_bins_s: tuple = (), history: int = 64) -> None:
+        """Aggiorna i parametri e azzera le misure (inizio di una run)."""
+        with self._lock:
+            self.enabled = enabled
+            self.wall_bins_ms = tuple(wall_bins_ms) or (0.0,)
+            self.sim_bins_s = tuple(sim_bins_s) or (0.0,)
+            self.history = history
+            self.now = 0.0  # Tempo simulato dell'ultimo step
+            self._instances: dict[tuple[int, int, int], deque] = {}  # (stationID, manoeuvreId, mcmType) -> istanze
+            self._unpublished: dict[tuple[int, str], deque] = {}  # (stazione, tipo) -> istanze in ordine di invio
+            self._sessions: dict[tuple[int, int], _Instance] = {}  # (RSU, manoeuvreId) -> prima Request della sessione aperta
+            self._responses: dict[tuple[int, int], _Instance] = {}  # (veicolo, manoeuvreId) -> ultima Response
+            self._counts: dict[str, dict[str, int]] = {}
+            self._samples: dict[str, list] = {}
+            self._sessions_opened = 0
+            self._repeated_requests = 0  # Request di una sessione già aperta
+
+    def set_time(self, sim_time: float) -> None:
+        self.now = sim_time
+
+    def _count(self, message_type: str, event: str) -> None:
+        counts = self._counts.setdefault(message_type, {"created": 0, "published": 0, "failed": 0, "received": 0})
+        counts[event] += 1
+
+    def _sample(self, name: str, sim: Optional[float], wall: float) -> None:
+        self._samples.setdefault(name, []).append((sim, wall))
+
+    def created(self, station_id: int, message, manoeuvre_id: int, peer: Optional[int] = None) -> None:
+        """
+        MCM creata e accodata alla pipeline di uscita (prima di outbound.submit).
+
+        Args:
+            message: Istanza MCM (MESSAGE_TYPE, MCM_TYPE_ID)
+            peer: Per le Response: stazione (RSU) della Request a cui si risponde
+        """
+        if not self.enabled: return
+        wall = time.perf_counter()
+        message_type, mcm_type = message.MESSAGE_TYPE, message.MCM_TYPE_ID
+        with self._lock:
+            session_key = (station_id if peer is None else peer, manoeuvre_id)
+            session = self._sessions.get(session_key)
+            instance = _Instance(message_type, self.now, wall, session)
+            if message_type == "mcm_request":
+                if session is None:
+                    instance.session = self._sessions[session_key] = instance
+                    self._sessions_opened += 1
+                else:
+                    self._repeated_requests += 1
+            elif message_type == "mcm_response":
+                self._responses[(station_id, manoeuvre_id)] = instance
+            elif message_type == "mcm_termination":
+                # La sessione si chiude qui; la durata alla ricezione della Termination
+                self._sessions.pop(session_key, None)
+
+            self._instances.setdefault((station_id, manoeuvre_id, mcm_type), deque(maxlen=self.history)).append(instance)
+            self._unpublished.setdefault((station_id, message_type), deque(maxlen=self.history)).append(instance)
+            self._count(message_type, "created")
+
+    def published(self, station_id: int, message_type: str, t_publish: float, ok: bool) -> None:
+        """
+        Publish di una MCM sul trasporto (worker di uscita). Per stazione i messaggi sono
+        pubblicati nell'ordine di creazione.
+
+        Args:
+            t_publish: perf_counter() prima di transport.publish (la ricezione può precedere il ritorno)
+        """
+        if not self.enabled: return
+        with self._lock:
+            pending = self._unpublished.get((station_id, message_type))
+            if not pending: return
+            instance = pending.popleft()
+            instance.published = t_publish
+            self._count(message_type, "published" if ok else "failed")
+            self._sample(f"{message_type}.queue", None, t_publish - instance.wall)
+            if instance.received is not None:
+                self._sample(f"{message_type}.delivery", None, instance.received[1] - t_publish)
+
+    def received(self, payload: dict, receiver: Optional[int]) -> None:
+        """
+        MCM ricevuta da una stazione (None = tutte, loopback senza canale). Le ricezioni del
+        mittente stesso (topic di ingresso del suo broker) sono ignorate.
+        """
+        if not self.enabled: return
+        basic = _basic_container(payload)
+        if basic is None: return
+        wall = time.perf_counter()
+        sender = basic.get("stationID")
+        if receiver == sender: return
+        key = (sender, basic.get("manoeuvreId"), basic.get("mcmType"))
+        with self._lock:
+            # Prima istanza della chiave non ancora ricevuta da questa stazione
+            instance = next((i for i in self._instances.get(key, ()) if receiver not in i.receivers), None)
+            if instance is None: return
+            instance.receivers.add(receiver)
+            if instance.received is not None: return
+            instance.received = (self.now, wall)
+            self._count(instance.message_type, "received")
+            if instance.published is not None:
+                self._sample(f"{instance.message_type}.delivery", None, wall - instance.published)
+
+            session = instance.session
+            if session is None: return
+            if instance.message_type == "mcm_response":
+                self._sample("request_to_response", self.now - session.sim, wall - session.wall)
+            elif instance.message_type == "mcm_termination":
+                self._sample("session", self.now - session.sim, wall - session.wall)
+
+    def actuated(self, station_id: int, manoeuvre_id: int) -> None:
+        """Comando TraCI dell'azione richiesta, eseguito dal veicolo dopo la sua Response."""
+        if not self.enabled: return
+        wall = time.perf_counter()
+        with self._lock:
+            response = self._responses.pop((station_id, manoeuvre_id), None)
+            if response is not None:
+                self._sample("response_to_actuation", self.now - response.sim, wall - response.wall)
+
+    def _summary(self, values: list, bins: tuple, scale: float) -> dict:
+        values = np.asarray(values, dtype=np.float64) * scale
+        counts, _ = np.histogram(values, bins=[*bins, np.inf])
+        percentiles = np.percentile(values, PERCENTILES)
+        summary = {"count": len(values), "mean": float(values.mean())}
+        summary.update((f"p{p}", float(v)) for p, v in zip(PERCENTILES, percentiles))
+        summary["max"] = float(values.max())
+        summary["histogram"] = {"bins": list(bins), "counts": counts.tolist()}
+        return summary
+
+    def report(self) -> Optional[dict]:
+        """
+        Conteggi per tipo, sessioni e latenze della run (tempo reale in ms, simulato in s).
+        None se disabilitata.
+        """
+        if not self.enabled: return None
+        with self._lock:
+            latencies = {}
+            for name, samples in sorted(self._samples.items()):
+                sims = [sim for sim, _ in samples if sim is not None]
+                entry = {"wall_ms": self._summary([wall for _, wall in samples], self.wall_bins_ms, 1e3)}
+                if sims: entry["sim_s"] = self._summary(sims, self.sim_bins_s, 1.0)
+                latencies[name] = entry
+            completed = len(self._samples.get("session", ()))
+            return {
+                "messages": {name: dict(counts) for name, counts in sorted(self._counts.items())},
+                "sessions": {
+                    "opened": self._sessions_opened,
+                    "terminated": self._sessions_opened - len(self._sessions),
+                    "completed": completed,  # Termination ricevuta
+                    "repeated_requests": self._repeated_requests,
+                    "open": len(self._sessions),  # Nessuna Termination inviata entro fine run
+                },
+                "latencies": latencies,
+            }
+
+
+def _basic_container(payload: dict) -> Optional[dict]:
+    """basicContainer di una MCM, anche nel formato dei topic di uscita di vanetza ("fields")."""
+    body = payload.get("fields", payload) if isinstance(payload, dict) else None
+    if not isinstance(body, dict): return None
+    if "basicContainer" in body: return body["basicContainer"]
+    return next((v["basicContainer"] for v in body.values() if isinstance(v, dict) and "basicContainer" in v), None)
+
+
+# Istanza globale (singleton), come outbound: la usano simulatore, veicoli e worker di uscita
+mcm_telemetry = MCMTelemetry.from_config(MCM_TELEMETRY_CONFIG)
@@ -4,9 +4,11 @@ Implementa il pattern Factory per creare messaggi.
 """
 
 from abc import ABC, abstractmethod
-from typing import Type, Optional
+from typing import Type, Optional, Callable, Sequence
 import logging
 
+from .serialization import dumps, PayloadTemplate
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,6 +40,44 @@ class BaseMessage(ABC):
         """
         pass
     
+    def serialize(self, data: dict) -> bytes:
+        """
+        Costruisce e serializza il payload (JSON compatto in bytes).
+        Le sottoclassi con uno scheletro fisso lo sovrascrivono usando un PayloadTemplate.
+        """
+        return dumps(self.build_payload(data))
+    
+    # Encoder alternativo al JSON (es. UperEncoder), condiviso da tutti i messaggi
+    _encoder = None
+    
+    @classmethod
+    def set_encoder(cls, encoder) -> None:
+        """Imposta l'encoder usato da encode() (None = JSON)."""
+        BaseMessage._encoder = encoder
+    
+    def encode(self, data: dict) -> bytes:
+        """Payload da pubblicare: JSON (serialize) o la codifica dell'encoder impostato."""
+        encoder = BaseMessage._encoder
+        return self.serialize(data) if encoder is None else encoder.encode(self, data)
+    
+    # Template compilati, condivisi tra le istanze: (classe, nome) -> PayloadTemplate
+    _templates: dict[tuple[type, str], PayloadTemplate] = {}
+    
+    def _template(self, name: str, build_skeleton: Callable[[], dict], paths: Sequence[tuple[str, ...]]) -> PayloadTemplate:
+        """
+        Restituisce il template `name` della classe, compilandolo al primo uso.
+        
+        Args:
+            name: Nome della variante (es. "vehicle", "rsu")
+            build_skeleton: Costruisce un payload di esempio con i builder della classe
+            paths: Percorsi dei campi dinamici (ordine dei valori passati a render)
+        """
+        key = (type(self), name)
+        template = BaseMessage._templates.get(key)
+        if template is None:
+            template = BaseMessage._templates[key] = PayloadTemplate(build_skeleton(), paths)
+        return template
+    
     @classmethod
     def get_type(cls) -> str:
         """Restituisce il tipo di messaggio."""
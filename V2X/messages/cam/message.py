@@ -19,6 +19,30 @@ class CAMMessage(BaseMessage):
     STATION_TYPE_RSU = 15
     STATION_TYPE_OBU = 5
     
+    # Campi dinamici dei template (ordine dei valori di _rsu_values/_vehicle_values)
+    _REF_POS = ("camParameters", "basicContainer", "referencePosition")
+    _HF = ("camParameters", "highFrequencyContainer", "basicVehicleContainerHighFrequency")
+    _LIGHTS = ("camParameters", "lowFrequencyContainer", "basicVehicleContainerLowFrequency", "exteriorLights")
+    RSU_FIELDS = (
+        ("generationDeltaTime",),
+        _REF_POS + ("latitude",),
+        _REF_POS + ("longitude",),
+    )
+    VEHICLE_FIELDS = RSU_FIELDS + (
+        ("camParameters", "basicContainer", "stationType"),
+        _HF + ("heading", "headingValue"),
+        _HF + ("speed", "speedValue"),
+        _HF + ("driveDirection",),
+        _HF + ("vehicleLength", "vehicleLengthValue"),
+        _HF + ("vehicleWidth",),
+        _HF + ("longitudinalAcceleration", "value"),
+        _HF + ("accelerationControl", "brakePedalEngaged"),
+        _HF + ("accelerationControl", "gasPedalEngaged"),
+        _LIGHTS + ("lowBeamHeadlightsOn",),
+        _LIGHTS + ("leftTurnSignalOn",),
+        _LIGHTS + ("rightTurnSignalOn",),
+    )
+    
     def build_payload(self, data: dict) -> dict:
         """
         Costruisce il payload CAM in base al tipo di stazione.
@@ -40,6 +64,33 @@ class CAMMessage(BaseMessage):
         else:
             return self._build_vehicle_payload(data)
     
+    def serialize(self, data: dict) -> bytes:
+        """
+        Come json di build_payload, ma riempie lo scheletro pre-renderizzato
+        con i soli campi dinamici (nessun dizionario intermedio).
+        """
+        if data.get("station_type", self.STATION_TYPE_OBU) == self.STATION_TYPE_RSU:
+            template = self._template("rsu", lambda: self._build_rsu_payload({}), self.RSU_FIELDS)
+            return template.render(self._rsu_values(data))
+        template = self._template("vehicle", lambda: self._build_vehicle_payload({}), self.VEHICLE_FIELDS)
+        return template.render(self._vehicle_values(data))
+    
+    def _rsu_values(self, data: dict) -> tuple:
+        return (self.gen_delta_time, data.get("lat", 0), data.get("lon", 0))
+    
+    def _vehicle_values(self, data: dict) -> tuple:
+        """Stessi valori (e default) di _build_vehicle_payload, nell'ordine di VEHICLE_FIELDS."""
+        speed = data.get("speed", 0)
+        accel = data.get("acceleration", 0)
+        return (
+            self.gen_delta_time, data.get("lat", 0), data.get("lon", 0),
+            data.get("station_type", self.STATION_TYPE_OBU),
+            data.get("heading", 0), speed, 0 if speed >= 0 else 1,
+            data.get("length", 0), data.get("width", 0),
+            accel, accel < -0.5, accel > 0,
+            data.get("light_low_beam", True), data.get("light_left_turn", False), data.get("light_right_turn", False),
+        )
+    
     def _build_rsu_payload(self, data: dict) -> dict:
         """Costruisce payload CAM per RSU (statico)."""
         return {
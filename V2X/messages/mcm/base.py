@@ -10,6 +10,7 @@ from typing import Dict, Any, Optional
 # messages/mcm/base.py -> (..) messages/ -> (...) v2x_simulator/ -> messages/base.py
 # Nota: Dato che messages è un package, l'import corretto verso il genitore è:
 from ..base import BaseMessage
+from ..serialization import dumps
 
 class MCMBaseMessage(BaseMessage):
     """
@@ -91,6 +92,21 @@ class MCMBaseMessage(BaseMessage):
     STRATEGY_CONSTITUTE_GROUP = "constituteAtemporarilyGroup"
     STRATEGY_DISBAND_TEMP_GROUP = "disbandATemporarilyGroup"
 
+    # Campi dinamici del template (ordine dei valori di _basic_values); mcmContainer è
+    # serializzato a parte da _serialize_mcm_container e inserito come frammento
+    _POSITION = ("basicContainer", "position")
+    BASIC_FIELDS = (
+        ("mcmContainer",),
+        ("basicContainer", "generationDeltaTime"),
+        ("basicContainer", "stationID"),
+        ("basicContainer", "stationType"),
+        ("basicContainer", "itssRole"),
+        _POSITION + ("latitude",),
+        _POSITION + ("longitude",),
+        ("basicContainer", "manoeuvreId"),
+    )
+    RATIONAL_FIELDS = BASIC_FIELDS + (("basicContainer", "rational", "manoeuvreCooperationCost"),)
+
     def build_payload(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Implementazione del metodo astratto di BaseMessage.
@@ -107,14 +123,7 @@ class MCMBaseMessage(BaseMessage):
         Gestisce il campo 'rational' come opzionale.
         """
         station_type = data.get("station_type", self.STATION_TYPE_OBU)
-        
-        # Logica Posizione
-        lat = data.get("lat", 0)
-        lon = data.get("lon", 0)
-        
-        if station_type == self.STATION_TYPE_RSU:
-            lat = data.get("lat", 900000001) 
-            lon = data.get("lon", 1800000001)
+        lat, lon = self._resolve_position(data, station_type)
 
         # 1. Creiamo il dizionario base con i campi OBBLIGATORI
         basic_container = {
@@ -149,6 +158,38 @@ class MCMBaseMessage(BaseMessage):
 
         return basic_container
 
+    def _resolve_position(self, data: Dict[str, Any], station_type: int) -> tuple:
+        """Posizione del basicContainer: per le RSU il default è 'unavailable'."""
+        if station_type == self.STATION_TYPE_RSU:
+            return data.get("lat", 900000001), data.get("lon", 1800000001)
+        return data.get("lat", 0), data.get("lon", 0)
+
+    def serialize(self, data: Dict[str, Any]) -> bytes:
+        """
+        Scheletro pre-renderizzato per basicContainer (con o senza 'rational');
+        l'mcmContainer, specifico della sottoclasse, viene serializzato a parte.
+        """
+        if "cost" in data:
+            template = self._template("rational", lambda: self.build_payload({"cost": 0}), self.RATIONAL_FIELDS)
+        else:
+            template = self._template("basic", lambda: self.build_payload({}), self.BASIC_FIELDS)
+        return template.render(self._basic_values(data))
+
+    def _basic_values(self, data: Dict[str, Any]) -> tuple:
+        """Stessi valori (e default) di _build_basic_container, nell'ordine di BASIC/RATIONAL_FIELDS."""
+        station_type = data.get("station_type", self.STATION_TYPE_OBU)
+        lat, lon = self._resolve_position(data, station_type)
+        values = (
+            self._serialize_mcm_container(data), self.gen_delta_time, data.get("station_id", 0),
+            station_type, data.get("itss_role", self.ITSS_ROLE_NOT_AVAILABLE), lat, lon,
+            data.get("manoeuvre_id", 0),
+        )
+        return values + (data["cost"],) if "cost" in data else values
+
+    def _serialize_mcm_container(self, data: Dict[str, Any]) -> bytes:
+        """mcmContainer in JSON; le sottoclassi con struttura fissa possono usare un template."""
+        return dumps(self._build_specific_mcm_container(data))
+
     def _build_strategy_payload(self, strategy_key: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         HELPER METHOD: Costruisce il payload della strategia.
@@ -170,4 +211,4 @@ class MCMBaseMessage(BaseMessage):
         Metodo astratto: le sottoclassi (Intent, Request) DEVONO implementare 
         questo metodo per riempire il contenuto specifico del messaggio.
         """
-        pass
\ No newline at end of file
+        pass
\ No newline at end of file
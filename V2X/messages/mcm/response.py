@@ -15,6 +15,12 @@ class MCMResponseMessage(MCMBaseMessage):
     # ID numerico per il protocollo (mcmType = 2 -> Response)
     MCM_TYPE_ID = MCMBaseMessage.MCM_TYPE_RESPONSE
 
+    RESPONSE_FIELDS = (("responseContainer", "manouevreResponse"),)
+
+    def _serialize_mcm_container(self, data: Dict[str, Any]) -> bytes:
+        template = self._template("response", lambda: self._build_specific_mcm_container({}), self.RESPONSE_FIELDS)
+        return template.render((data.get("response_code", self.RESPONSE_ACCEPT),))
+
     def _build_specific_mcm_container(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Costruisce l'mcmContainer specifico per la Response.
@@ -36,4 +42,4 @@ class MCMResponseMessage(MCMBaseMessage):
                 # "declineReason": ... (Opzionale, qui omesso come da richiesta)
                 "submaneuvres": [] # Lista vuota come da richiesta
             }
-        }
\ No newline at end of file
+        }
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Serializzazione JSON dei payload V2X.
+
+- dumps(): JSON compatto in bytes, con orjson se installato (altrimenti json della stdlib)
+- PayloadTemplate: scheletro JSON pre-renderizzato una volta per classe di messaggio;
+  ad ogni invio si serializzano solo i campi dinamici e si concatenano i frammenti costanti
+"""
+
+import re
+import copy
+import json
+import math
+from typing import Any, Sequence
+
+try:
+    import orjson
+except ImportError:  # Dipendenza opzionale
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """Serializza in JSON compatto (bytes)."""
+        return orjson.dumps(obj)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serializza in JSON compatto (bytes)."""
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+
+# Valori scalari più frequenti: evitano la chiamata all'encoder
+_TRUE, _FALSE, _NULL = b"true", b"false", b"null"
+
+
+def dump_value(value: Any) -> bytes:
+    """
+    Serializza un singolo valore (scorciatoie per bool/None/int).
+    I bytes sono considerati frammenti JSON già serializzati e inseriti così come sono.
+    """
+    if type(value) is bytes: return value
+    if value is True: return _TRUE
+    if value is False: return _FALSE
+    if value is None: return _NULL
+    if type(value) is int: return str(value).encode()
+    # Stessa rappresentazione di json.dumps (repr) per i float finiti
+    if type(value) is float and math.isfinite(value): return repr(value).encode()
+    return dumps(value)
+
+
+class PayloadTemplate:
+    """
+    Scheletro JSON compilato a partire da un payload di esempio.
+
+    I campi dinamici sono indicati per percorso di chiavi (es. ("camParameters", "basicContainer",
+    "stationType")); tutto il resto viene serializzato una volta sola in frammenti di bytes.
+    render() riceve i valori dinamici nell'ordine dei percorsi (bytes = sotto-documento già
+    serializzato, es. un container costruito a parte).
+    """
+
+    _TOKEN = "\x01slot{}\x01"
+    _TOKEN_RE = re.compile(rb'"\\u0001slot(\d+)\\u0001"')
+
+    def __init__(self, skeleton: dict, paths: Sequence[tuple[str, ...]]):
+        """
+        Args:
+            skeleton: Payload di esempio (non viene modificato)
+            paths: Percorsi dei campi dinamici
+        """
+        skeleton = copy.deepcopy(skeleton)
+        for idx, path in enumerate(paths):
+            node = skeleton
+            for key in path[:-1]:
+                node = node[key]
+            if path[-1] not in node:
+                raise KeyError(f"Campo dinamico {'.'.join(path)} assente nello scheletro")
+            node[path[-1]] = self._TOKEN.format(idx)
+
+        # Sempre json della stdlib: escape deterministico dei token (\u0001)
+        rendered = json.dumps(skeleton, separators=(',', ':')).encode()
+        parts = self._TOKEN_RE.split(rendered)
+        # split con gruppo: [frammento, idx, frammento, idx, ..., frammento]
+        self._fragments: list[bytes] = parts[0::2]
+        self._order: list[int] = [int(idx) for idx in parts[1::2]]
+        if sorted(self._order) != list(range(len(paths))):
+            raise ValueError("Percorsi dinamici duplicati o non serializzabili")
+
+    def render(self, values: Sequence[Any]) -> bytes:
+        """Restituisce il payload completo in bytes."""
+        fragments = self._fragments
+        out = [fragments[0]]
+        for pos, idx in enumerate(self._order, 1):
+            out.append(dump_value(values[idx]))
+            out.append(fragments[pos])
+        return b"".join(out)
@@ -0,0 +1,281 @@
+"""
+Codifica ASN.1 UPER dei messaggi V2X (payload pre-codificati per vanetza-nap).
+
+I moduli ASN.1 (CAM, MCM e dizionario dati comune, es. la cartella asn1 di vanetza-nap)
+vengono compilati una sola volta con asn1tools; il risultato è salvato su disco, con chiave
+il contenuto dei file, e riusato agli avvii successivi.
+
+Il valore da codificare è il payload JSON prodotto dai builder dei messaggi (formato
+vanetza), convertito seguendo lo schema:
+- CHOICE: {"alternativa": valore} -> ("alternativa", valore)
+- BIT STRING con bit nominati: {"bit": bool, ...} -> (bytes, numero di bit)
+- INTEGER con range: un valore fuori range diventa il valore "unavailable" del tipo, se lo
+  schema lo definisce (es. SpeedValue 16383), altrimenti è un errore (ValueError)
+- ENUMERATED: valori numerici come nel JSON (numeric_enums)
+I dati dell'entità (unità SI) sono prima riportati alle unità ETSI (to_etsi_units).
+
+asn1tools è una dipendenza opzionale, richiesta solo con MESSAGE_ENCODING = "uper".
+"""
+
+import os
+import glob
+import pickle
+import hashlib
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Conversione SI -> unità ETSI dei dati delle entità: valore ETSI = round(valore * fattore)
+ETSI_SCALE = {
+    "lat": 1e7,  # Latitude: 0.1 microgradi
+    "lon": 1e7,  # Longitude: 0.1 microgradi
+    "speed": 100,  # SpeedValue: 0.01 m/s
+    "heading": 10,  # HeadingValue: 0.1 gradi
+    "acceleration": 10,  # AccelerationValue: 0.1 m/s^2
+    "length": 10,  # VehicleLengthValue: 0.1 m
+    "width": 10,  # VehicleWidth: 0.1 m
+}
+
+_CONSTRUCTED = {"SEQUENCE", "SET"}
+_COLLECTIONS = {"SEQUENCE OF", "SET OF"}
+# Chiavi di un membro che non descrivono il tipo (escluse quando si risolve un riferimento)
+_MEMBER_KEYS = {"name", "type", "optional", "default"}
+
+
+def to_etsi_units(data: dict) -> dict:
+    """Copia dei dati con i campi fisici riportati a interi nelle unità ETSI."""
+    etsi = dict(data)
+    for name, factor in ETSI_SCALE.items():
+        value = etsi.get(name)
+        if isinstance(value, float) or (isinstance(value, int) and not isinstance(value, bool)):
+            etsi[name] = round(value * factor)
+    return etsi
+
+
+class UperEncoder:
+    """
+    Encoder/decoder UPER per i PDU configurati (es. "cam" -> CAM, "mcm" -> MCM).
+
+    Ogni PDU è una SEQUENCE {header ItsPduHeader, <corpo>}: l'header viene riempito con
+    (protocolVersion, messageID, stationID) nell'ordine dei suoi campi, il corpo è il
+    payload JSON del messaggio.
+    """
+
+    def __init__(self, asn1_dir: str, pdus: dict[str, dict], cache_dir: Optional[str] = None):
+        """
+        Args:
+            asn1_dir: Cartella con i moduli ASN.1 (*.asn)
+            pdus: Per PDU: {"type": nome tipo ASN.1, "message_id": int, "protocol_version": int}
+            cache_dir: Cartella per la compilazione su disco (None = nessuna cache)
+        """
+        import asn1tools  # Dipendenza opzionale: importata solo se la codifica UPER è attiva
+
+        self._asn1tools = asn1tools
+        self.pdus = pdus
+        self._modules, self._spec = self._compile(asn1_dir, cache_dir)
+        self._types: dict[str, tuple[str, dict]] = {}
+        self._resolved: dict[tuple[int, Optional[str]], tuple[dict, Optional[str]]] = {}
+        self._unavailable_paths: set[str] = set()
+        for module, definition in self._modules.items():
+            for name, typedef in definition["types"].items():
+                self._types.setdefault(name, (module, typedef))
+
+        # Per PDU: (nome tipo, modulo, campi dell'header, nome e tipo del corpo)
+        self._layout: dict[str, tuple] = {}
+        for key, pdu in pdus.items():
+            module, typedef = self._lookup(pdu["type"], None)
+            header, body = [m for m in typedef["members"] if m is not None][:2]
+            header_def, _ = self._resolve(header, module)
+            header_fields = [m["name"] for m in header_def["members"] if m is not None]
+            self._layout[key] = (pdu["type"], module, header["name"], header_fields, body["name"], body)
+
+    @classmethod
+    def from_config(cls, asn1_config: dict) -> "UperEncoder":
+        return cls(asn1_config["asn1_dir"], asn1_config["pdus"], asn1_config.get("cache_dir"))
+
+    def _compile(self, asn1_dir: str, cache_dir: Optional[str]) -> tuple[dict, Any]:
+        files = sorted(glob.glob(os.path.join(asn1_dir, "*.asn")))
+        if not files:
+            raise FileNotFoundError(f"Nessun modulo ASN.1 (*.asn) in {asn1_dir}")
+
+        digest = hashlib.sha256()
+        for path in files:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        cache_path = os.path.join(cache_dir, f"uper_{digest.hexdigest()[:16]}.pickle") if cache_dir else None
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, "rb") as f:
+                    modules, spec = pickle.load(f)
+                logger.info(f"Moduli ASN.1 caricati dalla cache {cache_path}")
+                return modules, spec
+            except Exception as e:
+                logger.warning(f"Cache ASN.1 non leggibile ({e}): ricompilo")
+
+        modules = self._asn1tools.parse_files(files)
+        spec = self._asn1tools.compile_dict(modules, "uper", numeric_enums=True)
+        logger.info(f"Compilati {len(files)} moduli ASN.1 da {asn1_dir}")
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(cache_path, "wb") as f:
+                pickle.dump((modules, spec), f)
+        return modules, spec
+
+    # --- Risoluzione dei tipi ---
+
+    def _lookup(self, name: str, module: Optional[str]) -> Optional[tuple[str, dict]]:
+        """(modulo, definizione) del tipo `name` visto da `module`; None per i tipi predefiniti."""
+        if module is not None:
+            definition = self._modules[module]
+            if name in definition["types"]:
+                return module, definition["types"][name]
+            for imported, names in definition["imports"].items():
+                if name in names and imported in self._modules:
+                    return self._lookup(name, imported)
+        return self._types.get(name)
+
+    def _resolve(self, typedef: dict, module: Optional[str]) -> tuple[dict, Optional[str]]:
+        """Segue i riferimenti fino a un tipo predefinito; i vincoli più esterni prevalgono."""
+        # Le definizioni vengono dall'albero dei moduli (oggetti stabili): memoizzazione per id
+        key = (id(typedef), module)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            resolved = self._resolved[key] = self._follow(typedef, module)
+        return resolved
+
+    def _follow(self, typedef: dict, module: Optional[str]) -> tuple[dict, Optional[str]]:
+        while True:
+            found = self._lookup(typedef["type"], module)
+            if found is None:
+                return typedef, module
+            module, inner = found
+            outer = {k: v for k, v in typedef.items() if k not in _MEMBER_KEYS}
+            typedef = {**inner, **outer}
+
+    # --- JSON (formato vanetza) <-> valori asn1tools ---
+
+    def _to_asn1(self, typedef: dict, module: Optional[str], value: Any, path: str) -> Any:
+        typedef, module = self._resolve(typedef, module)
+        kind = typedef["type"]
+
+        if kind in _CONSTRUCTED:
+            members = {m["name"]: m for m in typedef["members"] if m is not None}
+            unknown = set(value) - set(members)
+            if unknown:
+                raise ValueError(f"{path}: campi non previsti dallo schema {sorted(unknown)}")
+            return {name: self._to_asn1(members[name], module, v, f"{path}.{name}") for name, v in value.items()}
+
+        if kind in _COLLECTIONS:
+            return [self._to_asn1(typedef["element"], module, v, f"{path}[{i}]") for i, v in enumerate(value)]
+
+        if kind == "CHOICE":
+            (name, inner), = value.items()
+            members = {m["name"]: m for m in typedef["members"] if m is not None}
+            if name not in members:
+                raise ValueError(f"{path}: alternativa '{name}' non prevista dallo schema")
+            return name, self._to_asn1(members[name], module, inner, f"{path}.{name}")
+
+        if kind == "BIT STRING" and isinstance(value, dict):
+            bits = {name: int(pos) for name, pos in typedef.get("named-bits", [])}
+            size = _bit_string_size(typedef, bits)
+            number = 0
+            for name, flag in value.items():
+                if name not in bits:
+                    raise ValueError(f"{path}: bit '{name}' non previsto dallo schema")
+                if flag:
+                    number |= 1 << (size - 1 - bits[name])
+            nbytes = (size + 7) // 8
+            return (number << (8 * nbytes - size)).to_bytes(nbytes, "big"), size
+
+        if kind == "INTEGER" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = round(value)
+            constraint = typedef.get("restricted-to") or []
+            # Vincolo estensibile (None nella lista): i valori fuori dalla radice sono ammessi
+            if constraint and None not in constraint and not _in_constraint(value, constraint):
+                unavailable = (typedef.get("named-numbers") or {}).get("unavailable")
+                if unavailable is None:
+                    raise ValueError(f"{path}: {value} fuori dal range dello schema {constraint}")
+                if path not in self._unavailable_paths:
+                    self._unavailable_paths.add(path)
+                    logger.warning(f"{path}: {value} fuori dal range dello schema {constraint}, codificato come unavailable ({unavailable})")
+                else:
+                    logger.debug(f"{path}: {value} fuori range, codificato come unavailable ({unavailable})")
+                value = unavailable
+        return value
+
+    def _from_asn1(self, typedef: dict, module: Optional[str], value: Any) -> Any:
+        typedef, module = self._resolve(typedef, module)
+        kind = typedef["type"]
+
+        if kind in _CONSTRUCTED:
+            members = {m["name"]: m for m in typedef["members"] if m is not None}
+            return {name: self._from_asn1(members[name], module, v) for name, v in value.items()}
+        if kind in _COLLECTIONS:
+            return [self._from_asn1(typedef["element"], module, v) for v in value]
+        if kind == "CHOICE":
+            name, inner = value
+            members = {m["name"]: m for m in typedef["members"] if m is not None}
+            return {name: self._from_asn1(members[name], module, inner)}
+        if kind == "BIT STRING" and typedef.get("named-bits"):
+            data, size = value
+            number = int.from_bytes(data, "big") >> (8 * len(data) - size)
+            return {name: bool(number >> (size - 1 - int(pos)) & 1) if int(pos) < size else False
+                    for name, pos in typedef["named-bits"]}
+        return value
+
+    # --- API ---
+
+    @staticmethod
+    def pdu_key(message_type: str) -> str:
+        """PDU di un tipo di messaggio (tutte le varianti MCM condividono il PDU "mcm")."""
+        return "mcm" if message_type.startswith("mcm") else message_type
+
+    def encode_payload(self, message_type: str, payload: dict, station_id: int) -> bytes:
+        """Codifica in UPER un payload JSON (unità ETSI) con il relativo ItsPduHeader."""
+        key = self.pdu_key(message_type)
+        pdu = self.pdus[key]
+        type_name, module, header_name, header_fields, body_name, body = self._layout[key]
+        header = dict(zip(header_fields, (pdu.get("protocol_version", 2), pdu["message_id"], station_id)))
+        value = {header_name: header, body_name: self._to_asn1(body, module, payload, body_name)}
+        return self._spec.encode(type_name, value)
+
+    def normalize_payload(self, message_type: str, payload: dict) -> dict:
+        """Payload JSON come viene codificato (interi fuori range sostituiti da "unavailable")."""
+        type_name, module, header_name, header_fields, body_name, body = self._layout[self.pdu_key(message_type)]
+        return self._from_asn1(body, module, self._to_asn1(body, module, payload, body_name))
+
+    def decode_payload(self, message_type: str, encoded: bytes) -> tuple[int, dict]:
+        """Decodifica un PDU UPER: (stationID dell'header, payload in formato JSON)."""
+        type_name, module, header_name, header_fields, body_name, body = self._layout[self.pdu_key(message_type)]
+        value = self._spec.decode(type_name, encoded)
+        return value[header_name][header_fields[2]], self._from_asn1(body, module, value[body_name])
+
+    def encode(self, message, data: dict) -> bytes:
+        """Costruisce il payload del messaggio dai dati dell'entità e lo codifica in UPER."""
+        etsi = to_etsi_units(data)
+        return self.encode_payload(message.MESSAGE_TYPE, message.build_payload(etsi), etsi.get("station_id", 0))
+
+
+def _in_constraint(value: int, constraint: list) -> bool:
+    """True se il valore rispetta il vincolo (range (low, high), con MIN/MAX, o valori singoli)."""
+    for entry in constraint:
+        if isinstance(entry, tuple):
+            low, high = entry
+            if (not isinstance(low, int) or value >= low) and (not isinstance(high, int) or value <= high):
+                return True
+        elif not isinstance(entry, int) or value == entry:
+            return True
+    return False
+
+
+def _bit_string_size(typedef: dict, bits: dict[str, int]) -> int:
+    """Numero di bit: dimensione fissa dello schema, altrimenti il minimo che contiene i bit nominati."""
+    size = max(bits.values(), default=-1) + 1
+    for entry in typedef.get("size") or []:
+        if isinstance(entry, int):
+            return max(size, entry)
+        if isinstance(entry, tuple) and isinstance(entry[0], int):
+            return max(size, entry[0])
+    return size
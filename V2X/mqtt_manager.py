@@ -1,34 +1,104 @@
 """
 Gestore centralizzato delle connessioni MQTT.
+
+Una stazione disconnessa (es. container vanetza riavviato) viene riconnessa in background
+con backoff esponenziale e jitter: nessuna connect avviene nel thread che pubblica. Nel
+frattempo i suoi messaggi restano in uno spool limitato, svuotato alla riconnessione:
+- CAM (e tipi non MCM): solo l'ultimo messaggio per tipo
+- MCM: tutte, in ordine, fino al TTL (ring buffer: oltre la capacità scartate le più vecchie)
 """
 
-import json
+import time
+import random
 import logging
-from typing import Optional
+import threading
+from collections import deque
+from typing import Optional, Union, Iterable
+from concurrent.futures import ThreadPoolExecutor
 import paho.mqtt.client as mqtt
 
-from config import MQTT_PORT, MQTT_KEEPALIVE, STATIONS, MQTT_TOPICS
+from messages.serialization import dumps
+from transport import Transport
+from config import (MQTT_PORT, MQTT_KEEPALIVE, MQTT_CONNECT_TIMEOUT, MQTT_RECONNECT_CONFIG,
+                    MQTT_SPOOL_CONFIG, STATIONS, MQTT_TOPICS)
 
 logger = logging.getLogger(__name__)
 
 
-class MQTTManager:
+class _StationSpool:
+    """Messaggi in attesa di una stazione disconnessa."""
+
+    __slots__ = ("latest", "mcm")
+
+    def __init__(self, capacity: int):
+        self.latest: dict[str, tuple[str, bytes]] = {}  # tipo -> (topic, payload)
+        self.mcm: deque[tuple[float, str, bytes]] = deque(maxlen=capacity)  # (scadenza, topic, payload)
+
+    def put(self, message_type: str, topic: str, payload: bytes, expires: float) -> tuple[bool, bool]:
+        """Accoda un messaggio; restituisce (messaggio precedente sostituito, MCM più vecchia scartata)."""
+        if message_type.startswith("mcm"):
+            dropped = len(self.mcm) == self.mcm.maxlen
+            self.mcm.append((expires, topic, payload))
+            return False, dropped
+        superseded = message_type in self.latest
+        self.latest[message_type] = (topic, payload)
+        return superseded, False
+
+    def drain(self, now: float) -> tuple[list[tuple[str, bytes]], int]:
+        """(messaggi ancora validi in ordine di invio, MCM scadute)."""
+        pending = [(topic, payload) for expires, topic, payload in self.mcm if expires > now]
+        expired = len(self.mcm) - len(pending)
+        pending.extend(self.latest.values())
+        return pending, expired
+
+    def __len__(self) -> int:
+        return len(self.mcm) + len(self.latest)
+
+
+class MQTTManager(Transport):
     """
     Gestisce le connessioni MQTT verso i vari container Docker.
     Implementa un pattern singleton-like per riutilizzare le connessioni.
     """
     
+    name = "mqtt"
+    
     def __init__(self):
         self._clients: dict[int, mqtt.Client] = {}
         self._connected: set[int] = set()
         self._missing_stations: set[int] = set()
+        self._subscriptions: dict[int, dict[str, object]] = {}  # stazione -> topic -> callback
+        
+        # Riconnessione in background e spool dei messaggi durante l'interruzione
+        self._reconnecting: set[int] = set()
+        self._spools: dict[int, _StationSpool] = {}
+        self._state_lock = threading.Lock()
+        self._closing = threading.Event()
+        self.reconnects = 0
+        self.spooled = 0
+        self.spool_superseded = 0
+        self.spool_dropped = 0
+        self.spool_expired = 0
+        self.spool_drained = 0
+        
+        # Tracciamento completamento publish (usato dal pacing adattivo)
+        self._inflight: dict[tuple[int, int], float] = {}
+        self._early_acks: set[tuple[int, int]] = set()
+        self._inflight_lock = threading.Lock()
+        self._publish_latency = 0.0  # media mobile esponenziale (s)
+    
+    def is_routable(self, station_id: int) -> bool:
+        """True se la stazione ha un container (IP) configurato a cui pubblicare."""
+        return bool(STATIONS.get(station_id, {}).get("ip"))
     
     def get_client(self, station_id: int) -> Optional[mqtt.Client]:
         """
-        Recupera o crea un client MQTT per lo specifico StationID.
+        Recupera il client MQTT connesso per lo specifico StationID.
+        Se la stazione non è connessa avvia la connessione in background e restituisce None
+        senza attendere.
         """
-        if station_id in self._clients and station_id in self._connected:
-            return self._clients[station_id]
+        if station_id in self._connected:
+            return self._clients.get(station_id)
         
         # --- MODIFICA: Se sappiamo già che manca, ritorniamo None senza loggare ---
         if station_id in self._missing_stations:
@@ -42,59 +112,198 @@ class MQTTManager:
                 self._missing_stations.add(station_id)
             return None
         
-        target_ip = station_config.get("ip")
-        if not target_ip:
+        if not station_config.get("ip"):
             if station_id not in self._missing_stations:
                 logger.warning(f"IP non configurato per station {station_id}")
                 self._missing_stations.add(station_id)
             return None
         
-        try:
-            client = mqtt.Client(client_id=f"v2x_sim_{station_id}")
-            client.on_connect = self._on_connect
-            client.on_disconnect = self._on_disconnect
-            client.user_data_set({"station_id": station_id})
+        self._schedule_reconnect(station_id)
+        return None
+    
+    def _new_client(self, userdata: dict) -> mqtt.Client:
+        # La riconnessione è gestita da _reconnect_loop (backoff con jitter), non dal loop di paho
+        client = mqtt.Client(client_id=f"v2x_sim_{userdata['station_id']}", reconnect_on_failure=False)
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_connect_fail = self._on_connect_fail
+        client.on_publish = self._on_publish
+        client.user_data_set(userdata)
+        return client
+    
+    def warm_up(self, station_ids: Optional[Iterable[int]] = None, timeout: float = MQTT_CONNECT_TIMEOUT) -> dict:
+        """
+        Connette in parallelo le stazioni con container configurato e attende il CONNACK,
+        così nessuna connect avviene dentro lo step (tempo di avvio = broker più lento).
+        Le stazioni non connesse passano alla riconnessione in background.
+        
+        Args:
+            station_ids: Stazioni da connettere (default: tutte quelle in STATIONS)
+            timeout: Tempo massimo per connect TCP + CONNACK di ciascuna stazione (s)
             
-            client.connect(target_ip, MQTT_PORT, MQTT_KEEPALIVE)
+        Returns:
+            {"elapsed": s, "stations": {station_id: {"connected", "latency", "error"}}}
+        """
+        ids = STATIONS if station_ids is None else station_ids
+        targets = [sid for sid in ids if self.is_routable(sid) and sid not in self._connected]
+        stations = {}
+        t0 = time.perf_counter()
+        if targets:
+            with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="mqtt-warmup") as pool:
+                stations = dict(zip(targets, pool.map(lambda sid: self._connect_station(sid, timeout), targets)))
+        elapsed = time.perf_counter() - t0
+        
+        failed = [sid for sid, result in stations.items() if not result["connected"]]
+        for station_id in failed:
+            logger.error(f"Impossibile connettersi a {STATIONS[station_id]['ip']} per station {station_id}: "
+                         f"{stations[station_id]['error']}")
+            self._schedule_reconnect(station_id)
+        logger.info(f"MQTT warm-up: {len(stations) - len(failed)}/{len(stations)} stazioni connesse in {elapsed:.2f}s")
+        if failed:
+            logger.warning(f"MQTT warm-up: stazioni non connesse {failed} (riconnessione in background)")
+        return {"elapsed": elapsed, "stations": stations}
+    
+    def _connect_station(self, station_id: int, timeout: float) -> dict:
+        """
+        Connessione bloccante (connect TCP + CONNACK) con un nuovo client; usata solo dal
+        warm-up e dai thread di riconnessione. Il client viene registrato da _on_connect.
+        La connect TCP avviene nel thread di rete del client (connect_async): l'attesa del
+        chiamante è limitata da `timeout` qualunque sia il timeout di socket di paho.
+        """
+        target_ip = STATIONS[station_id]["ip"]
+        userdata = {"station_id": station_id, "connack": threading.Event()}
+        client = self._new_client(userdata)
+        try:
+            client.connect_async(target_ip, MQTT_PORT, MQTT_KEEPALIVE)
+            t0 = time.perf_counter()
             client.loop_start()
-            
-            self._clients[station_id] = client
-            self._connected.add(station_id)
-            
-            logger.info(f"Connesso a {target_ip} per station {station_id}")
-            return client
-            
+            if not userdata["connack"].wait(timeout):
+                raise TimeoutError(f"CONNACK non ricevuto entro {timeout}s")
+            if userdata.get("connect_failed"):
+                raise ConnectionError(f"connect TCP a {target_ip}:{MQTT_PORT} fallita")
+            if userdata.get("rc"):
+                raise ConnectionError(f"connessione rifiutata, rc={userdata['rc']}")
         except Exception as e:
-            logger.error(f"Impossibile connettersi a {target_ip}: {e}")
-            return None
+            try:
+                client.loop_stop()
+                client.disconnect()
+            except Exception:
+                pass
+            return {"connected": False, "latency": None, "error": str(e)}
+        
+        latency = time.perf_counter() - t0
+        logger.info(f"Connesso a {target_ip} per station {station_id} in {latency * 1e3:.0f} ms")
+        return {"connected": True, "latency": latency, "error": None}
+    
+    def _schedule_reconnect(self, station_id: int) -> None:
+        """Avvia (se non già attivo) il thread di riconnessione della stazione."""
+        with self._state_lock:
+            if self._closing.is_set() or station_id in self._reconnecting:
+                return
+            self._reconnecting.add(station_id)
+        threading.Thread(target=self._reconnect_loop, args=(station_id,),
+                         name=f"mqtt-reconnect-{station_id}", daemon=True).start()
+    
+    def _reconnect_loop(self, station_id: int) -> None:
+        """Tentativi di connessione con backoff esponenziale e jitter fino al successo o a close_all."""
+        config = MQTT_RECONNECT_CONFIG
+        delay = config["min_delay"]
+        attempts = 0
+        try:
+            while not self._closing.wait(delay * (1.0 - config["jitter"] * random.random())):
+                if station_id in self._connected:
+                    return
+                stale = self._clients.get(station_id)
+                attempts += 1
+                result = self._connect_station(station_id, MQTT_CONNECT_TIMEOUT)
+                if result["connected"]:
+                    self.reconnects += 1
+                    logger.info(f"Station {station_id} riconnessa al tentativo {attempts}")
+                    if stale is not None and stale is not self._clients.get(station_id):
+                        stale.loop_stop()
+                    return
+                delay = min(delay * 2, config["max_delay"])
+                logger.debug(f"Riconnessione station {station_id} fallita ({result['error']}), "
+                             f"prossimo tentativo tra ~{delay:.1f}s")
+        finally:
+            with self._state_lock:
+                self._reconnecting.discard(station_id)
     
     def _on_connect(self, client, userdata, flags, rc):
         station_id = userdata.get("station_id", "unknown")
         if rc == 0:
             logger.debug(f"MQTT connesso per station {station_id}")
+            self._clients[station_id] = client
+            for topic, callback in self._subscriptions.get(station_id, {}).items():
+                self._apply_subscription(client, station_id, topic, callback)
+            with self._state_lock:
+                spool = self._spools.pop(station_id, None)
+                self._connected.add(station_id)
+            if spool is not None:
+                self._drain(client, station_id, spool)
         else:
             logger.error(f"MQTT connessione fallita per station {station_id}, rc={rc}")
+            userdata["rc"] = rc
+        # Sblocca l'attesa del CONNACK (anche in caso di rifiuto)
+        connack = userdata.get("connack")
+        if connack is not None:
+            connack.set()
+    
+    def _on_connect_fail(self, client, userdata):
+        # Connect TCP fallita nel thread di rete: sblocca subito l'attesa di _connect_station
+        userdata["connect_failed"] = True
+        connack = userdata.get("connack")
+        if connack is not None:
+            connack.set()
     
     def _on_disconnect(self, client, userdata, rc):
         station_id = userdata.get("station_id", "unknown")
+        # Client sostituito o scartato (es. tentativo fallito): nessun effetto sulla stazione
+        if self._clients.get(station_id) is not client:
+            return
         logger.warning(f"MQTT disconnesso per station {station_id}")
-        if station_id in self._connected:
+        with self._state_lock:
             self._connected.discard(station_id)
+        # I publish QoS 0 pendenti vanno persi con la connessione
+        with self._inflight_lock:
+            for key in [k for k in self._inflight if k[0] == station_id]:
+                del self._inflight[key]
+        # rc == 0: disconnect() volontario (close_all)
+        if rc != 0:
+            self._schedule_reconnect(station_id)
+    
+    def _on_publish(self, client, userdata, mid):
+        key = (userdata.get("station_id"), mid)
+        with self._inflight_lock:
+            t0 = self._inflight.pop(key, None)
+            if t0 is None:
+                # Callback arrivata prima che publish() restituisse il mid
+                self._early_acks.add(key)
+                return
+            self._publish_latency += 0.1 * ((time.perf_counter() - t0) - self._publish_latency)
     
-    def publish(self, station_id: int, message_type: str, payload: dict) -> bool:
+    def get_publish_backlog(self) -> tuple[int, float]:
         """
-        Pubblica un messaggio su un topic specifico.
+        Restituisce (publish non ancora scritti sul socket, latenza media di completamento in s).
+        """
+        with self._inflight_lock:
+            return len(self._inflight), self._publish_latency
+    
+    def publish(self, station_id: int, message_type: str, payload: Union[dict, bytes]) -> bool:
+        """
+        Pubblica un messaggio su un topic specifico. Se la stazione è disconnessa il
+        messaggio resta nello spool fino alla riconnessione (non bloccante).
         
         Args:
             station_id: ID della stazione destinataria
             message_type: Tipo di messaggio (es. "cam", "mcm")
-            payload: Dizionario del payload da serializzare
+            payload: Payload già serializzato (bytes, es. BaseMessage.serialize) o dizionario da serializzare
             
         Returns:
-            True se pubblicato con successo
+            True se pubblicato con successo o accodato nello spool
         """
         client = self.get_client(station_id)
-        if not client:
+        if client is None and not self.is_routable(station_id):
             return False
         
         topic = MQTT_TOPICS.get(message_type)
@@ -103,17 +312,76 @@ class MQTTManager:
             return False
         
         try:
-            msg_str = json.dumps(payload, separators=(',', ':'))
-            result = client.publish(topic, msg_str)
-            return result.rc == mqtt.MQTT_ERR_SUCCESS
+            msg = payload if isinstance(payload, bytes) else dumps(payload)
+            if client is not None:
+                rc = self._send(client, station_id, topic, msg)
+                if rc != mqtt.MQTT_ERR_NO_CONN:
+                    return rc == mqtt.MQTT_ERR_SUCCESS
+            if self._spool(station_id, message_type, topic, msg):
+                return True
+            # Riconnessa tra il controllo e lo spool: invio diretto
+            return self._send(self._clients[station_id], station_id, topic, msg) == mqtt.MQTT_ERR_SUCCESS
         except Exception as e:
             logger.error(f"Errore pubblicazione MQTT: {e}")
             return False
     
+    def _send(self, client: mqtt.Client, station_id: int, topic: str, msg: bytes) -> int:
+        t0 = time.perf_counter()
+        result = client.publish(topic, msg)
+        if result.rc == mqtt.MQTT_ERR_SUCCESS:
+            key = (station_id, result.mid)
+            with self._inflight_lock:
+                if key in self._early_acks:
+                    self._early_acks.discard(key)
+                else:
+                    self._inflight[key] = t0
+        return result.rc
+    
+    def _spool(self, station_id: int, message_type: str, topic: str, msg: bytes) -> bool:
+        """Accoda il messaggio di una stazione disconnessa; False se nel frattempo è connessa."""
+        with self._state_lock:
+            if station_id in self._connected:
+                return False
+            spool = self._spools.get(station_id)
+            if spool is None:
+                spool = self._spools[station_id] = _StationSpool(MQTT_SPOOL_CONFIG["mcm_capacity"])
+            superseded, dropped = spool.put(message_type, topic, msg, time.monotonic() + MQTT_SPOOL_CONFIG["mcm_ttl"])
+            self.spool_superseded += superseded
+            self.spool_dropped += dropped
+            self.spooled += 1
+        self._schedule_reconnect(station_id)
+        return True
+    
+    def _drain(self, client: mqtt.Client, station_id: int, spool: _StationSpool) -> None:
+        """Invia i messaggi accumulati durante la disconnessione (thread di rete di paho)."""
+        pending, expired = spool.drain(time.monotonic())
+        sent = sum(self._send(client, station_id, topic, msg) == mqtt.MQTT_ERR_SUCCESS for topic, msg in pending)
+        with self._state_lock:
+            self.spool_drained += sent
+            self.spool_expired += expired
+        logger.info(f"Station {station_id}: inviati {sent} messaggi in attesa ({expired} MCM scadute)")
+    
+    def stats(self) -> dict:
+        with self._state_lock:
+            pending = sum(len(spool) for spool in self._spools.values())
+            return {
+                "backend": self.name,
+                "connected": len(self._connected),
+                "reconnecting": sorted(self._reconnecting),
+                "reconnects": self.reconnects,
+                "spooled": self.spooled,
+                "spool_superseded": self.spool_superseded,
+                "spool_dropped": self.spool_dropped,
+                "spool_expired": self.spool_expired,
+                "spool_drained": self.spool_drained,
+                "spool_pending": pending,
+            }
+    
     def close_all(self):
-        """Chiude tutte le connessioni MQTT."""
+        """Chiude tutte le connessioni MQTT e ferma le riconnessioni in background."""
         logger.info("Chiusura connessioni MQTT...")
-        for station_id, client in self._clients.items():
+        self._closing.set()
+        for station_id, client in list(self._clients.items()):
             try:
                 client.loop_stop()
                 client.disconnect()
@@ -121,21 +389,34 @@ class MQTTManager:
             except Exception as e:
                 logger.error(f"Errore chiusura client {station_id}: {e}")
         
+        pending = sum(len(spool) for spool in self._spools.values())
+        if pending:
+            logger.warning(f"MQTT: {pending} messaggi in attesa di riconnessione non inviati")
         self._clients.clear()
         self._connected.clear()
+        self._spools.clear()
 
     def subscribe(self, station_id: int, topic: str, callback) -> bool:
         """
         Sottoscrive una station a un topic specifico con una callback.
+        La sottoscrizione viene ripristinata a ogni (ri)connessione della stazione.
         """
-        client = self.get_client(station_id)
-        if not client:
+        if not self.is_routable(station_id):
+            self.get_client(station_id)  # warning una sola volta
             return False
         
+        self._subscriptions.setdefault(station_id, {})[topic] = callback
+        client = self.get_client(station_id)
+        if client is None:
+            logger.info(f"Station {station_id} non ancora connessa: sottoscrizione a {topic} alla connessione")
+            return True
+        return self._apply_subscription(client, station_id, topic, callback)
+    
+    def _apply_subscription(self, client: mqtt.Client, station_id: int, topic: str, callback) -> bool:
         try:
             # Paho MQTT richiede che la callback sia associata al client
-            client.subscribe(topic)
             client.message_callback_add(topic, callback)
+            client.subscribe(topic)
             logger.info(f"Station {station_id} sottoscritta a {topic}")
             return True
         except Exception as e:
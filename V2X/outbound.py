@@ -0,0 +1,227 @@
+"""
+Pipeline di uscita dei messaggi V2X, disaccoppiata dallo step di simulazione.
+
+Il loop di simulazione accoda (station_id, tipo, messaggio, dati); un pool di thread
+worker codifica il payload (BaseMessage.encode: JSON o UPER) e lo pubblica sul trasporto (transport.py), così l'I/O di rete
+si sovrappone agli step successivi.
+
+- Ordine per stazione: ogni stazione è assegnata sempre allo stesso worker (station_id % workers)
+- Code limitate: a coda piena submit() attende (backpressure sul loop, nessun messaggio perso)
+- flush(): barriera che attende la pubblicazione di tutto quanto accodato (opzionale a fine step)
+- Metriche: profondità delle code e latenza accodamento -> publish
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Any, Optional
+
+from config import OUTBOUND_CONFIG
+from transport import transport
+from mcm_telemetry import mcm_telemetry
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Sentinella di chiusura dei worker
+
+
+class OutboundPipeline:
+    """
+    Stadio di uscita asincrono con worker shardati per stazione.
+    Con workers=0 la pubblicazione resta sincrona (nessun thread).
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 4096, flush_each_step: bool = False):
+        """
+        Args:
+            workers: Numero di thread worker (0 = pubblicazione sincrona nel loop)
+            queue_size: Capacità di ciascuna coda per worker
+            flush_each_step: Se True il simulatore chiama flush() alla fine di ogni step
+        """
+        self.workers = workers
+        self.queue_size = queue_size
+        self.flush_each_step = flush_each_step
+
+        self._queues: list[queue.Queue] = []
+        self._threads: list[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+        # Messaggi accodati e non ancora pubblicati (per flush e backlog)
+        self._pending = 0
+        self._idle = threading.Condition()
+
+        # Metriche
+        self._metrics_lock = threading.Lock()
+        self.submitted = 0
+        self.published = 0
+        self.failed = 0
+        self.unroutable = 0  # messaggi di stazioni senza container configurato (scartati subito)
+        self.blocked = 0  # submit che hanno trovato la coda piena
+        self.max_depth = 0
+        self._latency = 0.0  # media mobile esponenziale accodamento -> publish (s)
+        self.max_latency = 0.0
+
+    @classmethod
+    def from_config(cls, outbound_config: dict) -> "OutboundPipeline":
+        return cls(**outbound_config)
+
+    def configure(self, **params) -> None:
+        """Aggiorna i parametri (prima dell'avvio dei worker)."""
+        if self._threads:
+            raise RuntimeError("Pipeline già avviata: configurare prima del primo messaggio")
+        for key, value in params.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Parametro outbound sconosciuto: {key}")
+            setattr(self, key, value)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self) -> None:
+        """Avvia i worker (idempotente; chiamato anche dal primo submit)."""
+        with self._start_lock:
+            if self._threads or self.workers <= 0:
+                return
+            self._queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+            for idx, q in enumerate(self._queues):
+                t = threading.Thread(target=self._worker, args=(q,), name=f"outbound-{idx}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            logger.info(f"Pipeline di uscita avviata: {self.workers} worker, code da {self.queue_size}")
+
+    def submit(self, station_id: int, message_type: str, message: Any, data: Optional[dict]) -> bool:
+        """
+        Accoda un messaggio da pubblicare.
+
+        Args:
+            station_id: Stazione mittente (determina client del trasporto e worker)
+            message_type: Tipo di messaggio (es. "cam", "mcm_request")
+            message: Istanza BaseMessage (encode viene eseguito dal worker) o payload già serializzato (bytes)
+            data: Dati dell'entità già estratti nel loop (non devono cambiare dopo l'accodamento; None per i bytes)
+
+        Returns:
+            True se accodato (o pubblicato, in modalità sincrona)
+        """
+        # Stazioni senza container (veicoli solo-SUMO): nessun payload da costruire
+        if not transport.is_routable(station_id):
+            with self._metrics_lock:
+                self.unroutable += 1
+            return False
+        if self.workers <= 0:
+            with self._metrics_lock:
+                self.submitted += 1
+            return self._publish(station_id, message_type, message, data, time.perf_counter())
+        if not self._threads:
+            self.start()
+
+        q = self._queues[station_id % len(self._queues)]
+        with self._idle:
+            self._pending += 1
+        item = (station_id, message_type, message, data, time.perf_counter())
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            with self._metrics_lock:
+                self.blocked += 1
+            q.put(item)
+
+        with self._metrics_lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, q.qsize())
+        return True
+
+    def _worker(self, q: queue.Queue) -> None:
+        while True:
+            item = q.get()
+            if item is _STOP:
+                return
+            try:
+                self._publish(*item)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle.notify_all()
+
+    def _publish(self, station_id: int, message_type: str, message: Any, data: Optional[dict], t_submit: float) -> bool:
+        t_publish = time.perf_counter()
+        try:
+            payload = message if isinstance(message, bytes) else message.encode(data)
+            ok = transport.publish(station_id, message_type, payload)
+        except Exception as e:
+            logger.error(f"Errore costruzione/pubblicazione {message_type} per station {station_id}: {e}")
+            ok = False
+
+        latency = time.perf_counter() - t_submit
+        with self._metrics_lock:
+            if ok:
+                self.published += 1
+            else:
+                self.failed += 1
+            self._latency += 0.1 * (latency - self._latency)
+            self.max_latency = max(self.max_latency, latency)
+        if mcm_telemetry.enabled and message_type.startswith("mcm"):
+            mcm_telemetry.published(station_id, message_type, t_publish, ok)
+        return ok
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Barriera: attende che tutti i messaggi accodati siano stati pubblicati.
+
+        Returns:
+            False se il timeout scade prima
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def pending(self) -> int:
+        """Messaggi accodati e non ancora pubblicati."""
+        return self._pending
+
+    def get_backlog(self) -> tuple[int, float]:
+        """
+        Backlog complessivo per il pacing adattivo: (messaggi in coda + publish del trasporto
+        non completati, latenza media più alta tra coda e completamento del publish in s).
+        """
+        inflight, transport_latency = transport.get_publish_backlog()
+        return self._pending + inflight, max(self._latency, transport_latency)
+
+    def reset_stats(self) -> None:
+        """Azzera le metriche (nuova run nello stesso processo; i worker restano attivi)."""
+        with self._metrics_lock:
+            self.submitted = self.published = self.failed = self.unroutable = self.blocked = self.max_depth = 0
+            self._latency = self.max_latency = 0.0
+
+    def stats(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "published": self.published,
+                "failed": self.failed,
+                "unroutable": self.unroutable,
+                "pending": self._pending,
+                "blocked": self.blocked,
+                "max_queue_depth": self.max_depth,
+                "avg_latency": self._latency,
+                "max_latency": self.max_latency,
+            }
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Pubblica quanto resta in coda (entro timeout) e ferma i worker."""
+        if not self._threads:
+            return
+        if not self.flush(timeout):
+            logger.warning(f"Pipeline di uscita: {self._pending} messaggi non pubblicati alla chiusura")
+        for q in self._queues:
+            q.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+        self._queues.clear()
+
+
+# Istanza globale (singleton), come transport
+outbound = OutboundPipeline.from_config(OUTBOUND_CONFIG)
@@ -0,0 +1,163 @@
+"""
+Controllo del ritmo (pacing) del loop di simulazione rispetto al tempo reale.
+
+Modalità:
+- "afap":     as-fast-as-possible, nessuna attesa tra gli step
+- "fixed":    real-time factor fisso (periodo step = step_length / rtf, lavoro compreso)
+- "adaptive": il periodo si adatta alla capacità dei container vanetza-nap,
+              misurata come pubblicazioni MQTT non ancora completate e loro latenza
+
+Se vanetza-nap riceve gli step troppo velocemente esclude alcune stazioni (OBU/RSU): in
+fixed e adaptive ogni step è seguito comunque da una pausa minima (min_gap, come la
+vecchia attesa fissa di 10 ms dopo lo step), anche se il lavoro ha consumato il periodo;
+la modalità adattiva rallenta (aumento moltiplicativo del periodo) quando il backlog
+cresce e accelera (diminuzione additiva) quando i container stanno al passo.
+"""
+
+import time
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+PACING_MODES = ("afap", "fixed", "adaptive")
+
+
+class PacingController:
+    """
+    Regola la durata reale di ogni step e raccoglie le statistiche della run
+    (RTF raggiunto, stalli).
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        step_length: float,
+        rtf: float = 10.0,
+        min_period: float = 0.0,
+        max_period: float = 0.1,
+        min_gap: float = 0.0,
+        period_decrease: float = 0.0005,
+        backlog_high: int = 50,
+        backlog_low: int = 10,
+        latency_target: float = 0.02,
+        stall_timeout: float = 1.0,
+        backlog_probe: Optional[Callable[[], tuple[int, float]]] = None,
+    ):
+        """
+        Args:
+            mode: "afap", "fixed" o "adaptive"
+            step_length: Durata di uno step in tempo simulato (s)
+            rtf: Real-time factor per la modalità fixed e periodo iniziale di adaptive
+            min_period / max_period: Limiti del periodo reale di uno step (adaptive)
+            min_gap: Pausa minima tra la fine di uno step e l'inizio del successivo (s, fixed e adaptive)
+            period_decrease: Riduzione additiva del periodo quando non c'è congestione (s)
+            backlog_high: Pubblicazioni pendenti oltre cui lo step viene bloccato (stallo)
+            backlog_low: Soglia a cui lo stallo termina
+            latency_target: Latenza di pubblicazione oltre cui il periodo raddoppia (s)
+            stall_timeout: Attesa massima per uno stallo (s)
+            backlog_probe: Funzione che restituisce (pubblicazioni pendenti, latenza media s)
+        """
+        if mode not in PACING_MODES:
+            raise ValueError(f"Modalità pacing '{mode}' non supportata (scegli tra {PACING_MODES})")
+
+        self.mode = mode
+        self.step_length = step_length
+        self.rtf = rtf
+        self.min_period = min_period
+        self.max_period = max_period
+        self.min_gap = min_gap
+        self.period_decrease = period_decrease
+        self.backlog_high = backlog_high
+        self.backlog_low = backlog_low
+        self.latency_target = latency_target
+        self.stall_timeout = stall_timeout
+        self.backlog_probe = backlog_probe or (lambda: (0, 0.0))
+
+        self.period = 0.0 if mode == "afap" else step_length / rtf
+
+        # Statistiche della run
+        self._t_start: Optional[float] = None
+        self._deadline = 0.0
+        self.steps = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.max_backlog = 0
+
+    @classmethod
+    def from_config(cls, pacing_config: dict, step_length: float, backlog_probe=None) -> "PacingController":
+        """Crea il controller a partire da un dizionario tipo config.PACING_CONFIG."""
+        params = dict(pacing_config)
+        mode = params.pop("mode", "fixed")
+        return cls(mode, step_length, backlog_probe=backlog_probe, **params)
+
+    def start(self) -> None:
+        """
+        Da chiamare prima del primo step: il primo step (il più lento, con le prime
+        sottoscrizioni e pubblicazioni) rientra nel tempo reale della run.
+        """
+        self._t_start = time.perf_counter()
+        self._deadline = self._t_start
+
+    def pace(self) -> None:
+        """Da chiamare alla fine di ogni step: attende quanto necessario."""
+        if self._t_start is None:
+            self.start()  # start() non chiamato: il tempo reale parte dalla fine del primo step
+        self.steps += 1
+
+        if self.mode == "afap":
+            return
+
+        if self.mode == "adaptive":
+            self._adapt()
+
+        self._deadline += self.period
+        now = time.perf_counter()
+        if now - self._deadline > self.period:
+            # In ritardo di più di uno step: riallinea invece di recuperare a raffica
+            self._deadline = now
+        # Pausa minima dopo il lavoro dello step: il periodo non la assorbe quando il carico cresce
+        self._deadline = max(self._deadline, now + self.min_gap)
+        if self._deadline > now:
+            time.sleep(self._deadline - now)
+
+    def _adapt(self) -> None:
+        backlog, latency = self.backlog_probe()
+        self.max_backlog = max(self.max_backlog, backlog)
+
+        if backlog > self.backlog_high:
+            self._stall()
+            self.period = min(max(self.period, self.min_period, 0.001) * 2, self.max_period)
+        elif latency > self.latency_target:
+            self.period = min(max(self.period, 0.001) * 2, self.max_period)
+        else:
+            self.period = max(self.period - self.period_decrease, self.min_period)
+
+    def _stall(self) -> None:
+        """Blocca lo step finché il backlog non scende sotto backlog_low (o timeout)."""
+        self.stalls += 1
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < self.stall_timeout:
+            time.sleep(0.001)
+            if self.backlog_probe()[0] <= self.backlog_low:
+                break
+        else:
+            logger.warning(f"Pacing: backlog MQTT ancora > {self.backlog_low} dopo {self.stall_timeout}s")
+        self.stall_time += time.perf_counter() - t0
+        self._deadline = time.perf_counter()
+
+    def report(self) -> dict:
+        """Statistiche della run: RTF raggiunto, stalli, periodo finale."""
+        wall = time.perf_counter() - self._t_start if self._t_start is not None else 0.0
+        sim = self.steps * self.step_length
+        return {
+            "mode": self.mode,
+            "steps": self.steps,
+            "sim_time": sim,
+            "wall_time": wall,
+            "achieved_rtf": sim / wall if wall > 0 else 0.0,
+            "stalls": self.stalls,
+            "stall_time": self.stall_time,
+            "max_backlog": self.max_backlog,
+            "final_period": self.period,
+        }
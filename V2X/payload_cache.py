@@ -0,0 +1,173 @@
+"""
+Cache dei payload serializzati per entità e tipo di messaggio.
+
+Un'entità con stato invariato (RSU, veicoli fermi) ripubblica lo stesso payload: la cache
+conserva i bytes già serializzati e al riuso aggiorna solo generationDeltaTime.
+
+- Chiave: stato dell'entità quantizzato nelle unità ETSI (0.1 µdeg, 0.01 m/s, 0.1°, 0.1 m/s²)
+- Dirty tracking: Entity.mark_dirty() (chiamato da update()) incrementa la versione di stato;
+  a versione invariata la voce è valida senza rileggere i dati, altrimenti si confronta la chiave
+- Le voci vengono riempite dal worker della pipeline di uscita che serializza il messaggio
+- Solo payload JSON: con la codifica UPER la cache è disattivata (generationDeltaTime non allineato ai byte)
+- evict(): rimozione delle voci dei veicoli usciti dalla rete
+"""
+
+import logging
+import threading
+from typing import Any, Optional
+
+from config import PAYLOAD_CACHE_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Risoluzione ETSI dei campi dinamici: valore quantizzato = round(valore * fattore)
+ETSI_QUANTA = {
+    "lat": 1e7,  # Latitude: 0.1 microgradi
+    "lon": 1e7,  # Longitude: 0.1 microgradi
+    "speed": 100,  # SpeedValue: 0.01 m/s
+    "heading": 10,  # HeadingValue: 0.1 gradi
+    "acceleration": 10,  # LongitudinalAccelerationValue: 0.1 m/s^2
+}
+
+_GDT_KEY = b'"generationDeltaTime":'
+
+
+def quantize(data: dict) -> Optional[tuple]:
+    """
+    Chiave di cache dei dati di un messaggio, o None se non memorizzabile
+    (dati con liste/dizionari, es. gli executants di una MCM Request).
+    """
+    key = []
+    for name, value in data.items():
+        factor = ETSI_QUANTA.get(name)
+        if factor is not None:
+            value = round(value * factor)
+        elif isinstance(value, (list, dict)):
+            return None
+        key.append((name, value))
+    return tuple(key)
+
+
+def split_generation_time(payload: bytes) -> Optional[tuple[bytes, bytes]]:
+    """Divide il payload attorno al valore di generationDeltaTime (prima occorrenza)."""
+    start = payload.find(_GDT_KEY)
+    if start < 0:
+        return None
+    start += len(_GDT_KEY)
+    end = start
+    while end < len(payload) and payload[end:end + 1].isdigit():
+        end += 1
+    return payload[:start], payload[end:]
+
+
+class _FillingMessage:
+    """Messaggio in cache miss: serializza nel worker e memorizza il risultato."""
+
+    __slots__ = ("message", "cache", "entity", "key", "version")
+
+    def __init__(self, message, cache: "PayloadCache", entity, key: tuple, version: int):
+        self.message = message
+        self.cache = cache
+        self.entity = entity
+        self.key = key
+        self.version = version
+
+    def encode(self, data: dict) -> bytes:
+        payload = self.message.encode(data)
+        self.cache._store(self.entity, self.message.MESSAGE_TYPE, self.key, self.version, payload)
+        return payload
+
+
+class PayloadCache:
+    """
+    Memoizzazione dei payload per entità. Letta dal loop di simulazione, riempita dai worker
+    della pipeline di uscita.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # entità -> tipo messaggio -> (chiave, versione di stato, testa, coda)
+        self._entries: dict[Any, dict[str, tuple[tuple, int, bytes, bytes]]] = {}
+        self._lock = threading.Lock()
+
+        # Metriche
+        self.hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.evictions = 0
+
+    def prepare(self, entity, message) -> tuple[Any, Optional[dict]]:
+        """
+        Prepara un messaggio per OutboundPipeline.submit.
+
+        Returns:
+            (payload in bytes, None) se in cache, altrimenti (messaggio da serializzare, dati)
+        """
+        message_type = message.MESSAGE_TYPE
+        if not self.enabled:
+            return message, entity.get_message_data(message_type)
+
+        version = entity.state_version
+        with self._lock:
+            per_entity = self._entries.setdefault(entity, {})
+            entry = per_entity.get(message_type)
+        if entry is not None and entry[1] == version:
+            return self._hit(entry, message)
+
+        data = entity.get_message_data(message_type)
+        key = quantize(data)
+        if key is None:
+            self.uncacheable += 1
+            return message, data
+        if entry is not None and entry[0] == key:
+            entry = (key, version, entry[2], entry[3])
+            with self._lock:
+                per_entity[message_type] = entry
+            return self._hit(entry, message)
+
+        self.misses += 1
+        return _FillingMessage(message, self, entity, key, version), data
+
+    def _hit(self, entry: tuple, message) -> tuple[bytes, None]:
+        self.hits += 1
+        return b"".join((entry[2], str(message.gen_delta_time).encode(), entry[3])), None
+
+    def _store(self, entity, message_type: str, key: tuple, version: int, payload: bytes) -> None:
+        parts = split_generation_time(payload)
+        if parts is None:
+            return
+        with self._lock:
+            per_entity = self._entries.get(entity)
+            # Entità rimossa nel frattempo (veicolo arrivato): nessuna voce
+            if per_entity is not None:
+                per_entity[message_type] = (key, version, *parts)
+
+    def evict(self, entity) -> None:
+        """Rimuove le voci di un'entità (es. veicolo uscito dalla rete)."""
+        with self._lock:
+            if self._entries.pop(entity, None) is not None:
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Svuota la cache e azzera le metriche (nuova run nello stesso processo)."""
+        with self._lock:
+            self._entries.clear()
+        self.hits = self.misses = self.uncacheable = self.evictions = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(per_entity) for per_entity in self._entries.values())
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "uncacheable": self.uncacheable,
+            "evictions": self.evictions,
+            "entries": entries,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Istanza globale (singleton), come outbound
+payload_cache = PayloadCache(enabled=PAYLOAD_CACHE_ENABLED)
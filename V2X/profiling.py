@@ -0,0 +1,139 @@
+"""
+Tempi delle fasi dello step di simulazione (V2XSimulator.step).
+
+Fasi, con tempi esclusivi (una fase annidata non viene contata anche in quella che la contiene):
+- incoming:      MCM ricevuti (_process_incoming_messages)
+- sumo_step:     simulationStep e risultati della sottoscrizione di simulazione
+- rsus:          RSU (indice spaziale, trigger), esclusa la creazione dei messaggi
+- vehicle_reads: letture TraCI dei veicoli (nuove sottoscrizioni, risultati -> tabella)
+- triggers:      aggiornamento dei veicoli e valutazione dei loro trigger
+- payload:       costruzione dei messaggi (MessageFactory, cache dei payload) di RSU e veicoli
+- publish:       consegna alla pipeline di uscita (outbound.submit; il publish vero e proprio
+                 se outbound lavora in modo sincrono)
+- cleanup:       veicoli arrivati (_cleanup_vehicles)
+- end_step:      barriera flush_each_step e modello di canale
+
+Le durate (orologio monotono, ns) degli ultimi `capacity` step sono in un ring buffer
+preallocato, da cui vengono p50/p95/p99; medie e quota sul tempo di step sono sull'intera
+run. L'attesa del pacing tra uno step e l'altro è esclusa.
+
+Disabilitato (default) il simulatore usa NullProfiler: ogni punto di misura è una chiamata
+a un metodo vuoto.
+"""
+
+from time import perf_counter_ns
+from typing import Optional
+
+import numpy as np
+
+PHASES = ("incoming", "sumo_step", "rsus", "vehicle_reads", "triggers", "payload", "publish", "cleanup", "end_step")
+INCOMING, SUMO_STEP, RSUS, VEHICLE_READS, TRIGGERS, PAYLOAD, PUBLISH, CLEANUP, END_STEP = range(len(PHASES))
+PERCENTILES = (50, 95, 99)
+
+
+class StepProfiler:
+    """
+    Misura a "cambio di fase": switch(fase) attribuisce il tempo trascorso alla fase corrente e
+    passa alla nuova; push/pop per le fasi annidate (i messaggi inviati dentro RSU e trigger).
+    """
+
+    enabled = True
+
+    def __init__(self, capacity: int = 4096):
+        """
+        Args:
+            capacity: Step più recenti conservati per i percentili
+        """
+        if capacity <= 0:
+            raise ValueError("capacity deve essere positiva")
+        self.capacity = capacity
+        # Una riga per step: durata di ogni fase e, nell'ultima colonna, dello step intero
+        self._buffer = np.zeros((capacity, len(PHASES) + 1), dtype=np.int64)
+        self._totals = np.zeros(len(PHASES) + 1, dtype=np.int64)
+        self._row = [0] * len(PHASES)
+        self._stack: list[int] = []
+        self._phase = INCOMING
+        self._t = self._t_step = 0
+        self.steps = 0
+
+    @classmethod
+    def from_config(cls, profiling_config: dict) -> "StepProfiler":
+        """StepProfiler da un dizionario tipo config.PROFILING_CONFIG (NullProfiler se disabilitato)."""
+        params = {k: v for k, v in profiling_config.items() if k != "enabled"}
+        return cls(**params) if profiling_config.get("enabled") else NullProfiler()
+
+    def begin(self) -> None:
+        """Inizio dello step (fase incoming)."""
+        self._row = [0] * len(PHASES)
+        self._stack.clear()
+        self._phase = INCOMING
+        self._t = self._t_step = perf_counter_ns()
+
+    def switch(self, phase: int) -> None:
+        now = perf_counter_ns()
+        self._row[self._phase] += now - self._t
+        self._phase, self._t = phase, now
+
+    def push(self, phase: int) -> None:
+        """Entra in una fase annidata (pop torna alla fase corrente)."""
+        self._stack.append(self._phase)
+        self.switch(phase)
+
+    def pop(self) -> None:
+        self.switch(self._stack.pop())
+
+    def end(self) -> None:
+        """Fine dello step: riga nel ring buffer."""
+        now = perf_counter_ns()
+        self._row[self._phase] += now - self._t
+        row = self._buffer[self.steps % self.capacity]
+        row[:-1] = self._row
+        row[-1] = now - self._t_step
+        self._totals += row
+        self.steps += 1
+
+    def summary(self) -> Optional[dict]:
+        """
+        Per fase e per lo step intero (ms): media sulla run, percentili e massimo sugli ultimi
+        `capacity` step, quota del tempo di step. None se nessuno step è stato misurato.
+        """
+        if not self.steps:
+            return None
+        window = self._buffer[:min(self.steps, self.capacity)] / 1e6
+        percentiles = np.percentile(window, PERCENTILES, axis=0)
+        means = self._totals / 1e6 / self.steps
+        step_total = max(int(self._totals[-1]), 1)
+
+        def entry(i):
+            values = {"mean": float(means[i])}
+            values.update((f"p{p}", float(percentiles[k, i])) for k, p in enumerate(PERCENTILES))
+            values["max"] = float(window[:, i].max())
+            return values
+
+        phases = {name: dict(entry(i), share=float(self._totals[i] / step_total)) for i, name in enumerate(PHASES)}
+        return {"unit": "ms", "steps": self.steps, "window": len(window), "step": entry(len(PHASES)), "phases": phases}
+
+
+class NullProfiler:
+    """Profiler disabilitato: stessi metodi di StepProfiler, nessuna misura."""
+
+    enabled = False
+    steps = 0
+
+    def begin(self) -> None:
+        pass
+
+    def switch(self, phase: int) -> None:
+        pass
+
+    def push(self, phase: int) -> None:
+        pass
+
+    def pop(self) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def summary(self) -> None:
+        return None
@@ -0,0 +1,189 @@
+"""
+Proiezione SUMO (x, y) -> WGS84 (lat, lon) in-process e vettorizzata.
+
+Legge una sola volta il blocco <location> della rete (netOffset, projParameter)
+tramite sumolib e converte interi array di coordinate con NumPy, evitando una
+chiamata TraCI convertGeo per veicolo per step.
+
+Proiezioni supportate: UTM / Transverse Mercator (+proj=utm, +proj=tmerc con lat_0=0),
+con serie di Krüger al 6° ordine (Karney 2011, errore ~nm).
+Per stringhe non supportate si ricade su sumo.simulation.convertGeo.
+"""
+
+import os
+import logging
+from typing import Optional
+
+import numpy as np
+import sumolib
+
+from sumo_backend import sumo
+
+logger = logging.getLogger(__name__)
+
+# Ellissoidi supportati: (semiasse maggiore a, schiacciamento f)
+ELLIPSOIDS = {
+    "WGS84": (6378137.0, 1 / 298.257223563),
+    "GRS80": (6378137.0, 1 / 298.257222101),
+}
+
+
+def _parse_proj_parameter(proj_parameter: str) -> dict:
+    """Converte '+proj=utm +zone=32 +south' in {'proj': 'utm', 'zone': '32', 'south': True}."""
+    params = {}
+    for token in proj_parameter.split():
+        token = token.lstrip("+")
+        if "=" in token:
+            key, value = token.split("=", 1)
+            params[key] = value
+        elif token:
+            params[token] = True
+    return params
+
+
+class GeoProjection:
+    """
+    Proiezione inversa dalle coordinate cartesiane SUMO a lat/lon WGS84.
+    """
+
+    def __init__(self, net_offset: tuple[float, float], proj_parameter: str):
+        """
+        Args:
+            net_offset: Attributo netOffset della rete (x, y)
+            proj_parameter: Attributo projParameter della rete (stringa PROJ)
+        """
+        self.net_offset = net_offset
+        self.proj_parameter = proj_parameter
+        self.supported = self._setup(_parse_proj_parameter(proj_parameter))
+
+        if not self.supported:
+            logger.warning(f"Proiezione '{proj_parameter}' non supportata: uso TraCI convertGeo")
+
+    @classmethod
+    def from_net_file(cls, net_file: str) -> "GeoProjection":
+        """Legge netOffset/projParameter dal tag <location> di un file .net.xml."""
+        location = next(sumolib.xml.parse(net_file, "location"), None)
+        if location is None:
+            raise ValueError(f"Tag <location> non trovato in {net_file}")
+
+        offset_x, offset_y = (float(v) for v in location.netOffset.split(","))
+        return cls((offset_x, offset_y), location.projParameter)
+
+    def _setup(self, params: dict) -> bool:
+        """Precalcola le costanti della Transverse Mercator. False se non supportata."""
+        proj = params.get("proj")
+        ellps = params.get("ellps", params.get("datum", "WGS84"))
+        if ellps not in ELLIPSOIDS:
+            return False
+
+        if proj == "utm":
+            try:
+                zone = int(params["zone"])
+            except (KeyError, ValueError):
+                return False
+            self._lon0 = np.radians(zone * 6 - 183)
+            self._k0 = 0.9996
+            self._x0 = 500000.0
+            self._y0 = 10000000.0 if params.get("south") else 0.0
+        elif proj == "tmerc":
+            if float(params.get("lat_0", 0)) != 0:
+                return False
+            self._lon0 = np.radians(float(params.get("lon_0", 0)))
+            self._k0 = float(params.get("k_0", params.get("k", 1.0)))
+            self._x0 = float(params.get("x_0", 0))
+            self._y0 = float(params.get("y_0", 0))
+        else:
+            return False
+
+        a, f = ELLIPSOIDS[ellps]
+        n = f / (2 - f)
+        n2, n3, n4, n5, n6 = n ** 2, n ** 3, n ** 4, n ** 5, n ** 6
+
+        # Raggio rettificante e coefficienti beta della serie inversa di Krüger
+        self._A = a / (1 + n) * (1 + n2 / 4 + n4 / 64 + n6 / 256)
+        self._beta = np.array([
+            n / 2 - 2 * n2 / 3 + 37 * n3 / 96 - n4 / 360 - 81 * n5 / 512 + 96199 * n6 / 604800,
+            n2 / 48 + n3 / 15 - 437 * n4 / 1440 + 46 * n5 / 105 + 1118711 * n6 / 3870720,
+            17 * n3 / 480 - 37 * n4 / 840 - 209 * n5 / 4480 + 5569 * n6 / 90720,
+            4397 * n4 / 161280 - 11 * n5 / 504 - 830251 * n6 / 7257600,
+            4583 * n5 / 161280 - 108847 * n6 / 3991680,
+            20648693 * n6 / 638668800,
+        ])
+        self._e = np.sqrt(f * (2 - f))
+        return True
+
+    def to_geo(self, x, y) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Converte array di coordinate SUMO in lat/lon (gradi decimali).
+
+        Args:
+            x: Array (o scalare) di coordinate X SUMO
+            y: Array (o scalare) di coordinate Y SUMO
+
+        Returns:
+            Tupla (latitude, longitude) di array float64
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        if not self.supported:
+            return self._to_geo_traci(x, y)
+
+        # Coordinate proiettate: SUMO aggiunge netOffset alle coordinate di proiezione
+        xi = (y - self.net_offset[1] - self._y0) / (self._k0 * self._A)
+        eta = (x - self.net_offset[0] - self._x0) / (self._k0 * self._A)
+
+        # zeta' = zeta - sum(beta_j * sin(2j * zeta)) con zeta = xi + i*eta, somma di Clenshaw
+        zeta = xi + 1j * eta
+        two_cos = 2 * np.cos(2 * zeta)
+        y1 = np.zeros_like(zeta)
+        y2 = np.zeros_like(zeta)
+        for beta in self._beta[::-1]:
+            y1, y2 = two_cos * y1 - y2 + beta, y1
+        zeta_p = zeta - np.sin(2 * zeta) * y1
+        xi_p, eta_p = zeta_p.real, zeta_p.imag
+
+        sinh_eta_p = np.sinh(eta_p)
+        cos_xi_p = np.cos(xi_p)
+        tau_p = np.sin(xi_p) / np.hypot(sinh_eta_p, cos_xi_p)
+        lon = self._lon0 + np.arctan2(sinh_eta_p, cos_xi_p)
+
+        # Latitudine conforme -> geodetica (Newton, 2 iterazioni bastano in doppia precisione)
+        e = self._e
+        e2m = 1 - e * e
+        tau = tau_p / e2m
+        for _ in range(2):
+            tau1 = np.sqrt(1 + tau * tau)
+            sig = np.sinh(e * np.arctanh(e * tau / tau1))
+            tau_i = tau * np.sqrt(1 + sig * sig) - sig * tau1
+            tau += (tau_p - tau_i) / np.sqrt(1 + tau_i * tau_i) * (1 + e2m * tau * tau) / (e2m * tau1)
+
+        return np.degrees(np.arctan(tau)), np.degrees(lon)
+
+    def _to_geo_traci(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Fallback: una chiamata convertGeo per punto."""
+        lat = np.empty(x.shape)
+        lon = np.empty(x.shape)
+        for idx in np.ndindex(x.shape):
+            lon[idx], lat[idx] = sumo.simulation.convertGeo(float(x[idx]), float(y[idx]))
+        return lat, lon
+
+
+_projection: Optional[GeoProjection] = None
+
+
+def _net_file_from_cfg(sumo_cfg: str) -> str:
+    """Ricava il percorso della rete dal file .sumo.cfg."""
+    net = next(sumolib.xml.parse(sumo_cfg, "net-file"), None)
+    if net is None:
+        raise ValueError(f"net-file non trovato in {sumo_cfg}")
+    return os.path.join(os.path.dirname(sumo_cfg), net.value)
+
+
+def get_projection() -> GeoProjection:
+    """Restituisce la proiezione della rete di SUMO_CFG (caricata una sola volta)."""
+    global _projection
+    if _projection is None:
+        from config import SUMO_CFG
+        _projection = GeoProjection.from_net_file(_net_file_from_cfg(SUMO_CFG))
+    return _projection
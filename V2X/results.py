@@ -0,0 +1,271 @@
+"""
+Analisi degli output SUMO delle run: statistic-output (*_stats.xml) e tripinfo-output
+(*_tripinfo.xml), anche compressi (.xml.gz).
+
+- Parsing in streaming con iterparse: ogni elemento viene scartato dopo la lettura, la
+  memoria non dipende dalla dimensione del file
+- Run analizzate in parallelo su un pool di processi (un task per run: stats + tripinfo)
+- Tabella colonnare per veicolo (array NumPy, una riga per ogni tripinfo di tutte le run),
+  salvabile in .npz o in Parquet (se pyarrow è installato)
+- Aggregati per run e per veicolo calcolati sulla tabella con operazioni vettoriali
+
+Le run si trovano cercando i file *_stats.xml nelle cartelle indicate. I parametri della run
+vengono da params.json nella stessa cartella (run di una specifica, vedi experiment.py)
+oppure dal nome del file (<MODE>_v<veicoli>_s<seed>, batch predefinito).
+
+    table = analyze(["batch_results"], jobs=8)
+    table.run_aggregates()       # una riga per run
+    table.vehicle_aggregates()   # una riga per (modalità, veicoli, id veicolo), media sui seed
+"""
+
+import os
+import re
+import gzip
+import json
+import logging
+import xml.etree.ElementTree as ET
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from config import MANAGED_VEHICLES
+
+logger = logging.getLogger(__name__)
+
+# Attributi di vehicleTripStatistics (medie di SUMO sulla run)
+STATS_FIELDS = ("count", "routeLength", "speed", "duration", "waitingTime", "timeLoss", "departDelay")
+# Colonne numeriche della tabella per veicolo (attributi di <tripinfo>)
+TRIPINFO_COLUMNS = ("depart", "arrival", "duration", "routeLength", "waitingTime", "timeLoss")
+# Colonne aggregate per run e per veicolo
+AGGREGATE_COLUMNS = ("duration", "waitingTime", "timeLoss")
+# Versione del calcolo degli aggregati per run (ResultsTable.run_aggregates): da incrementare
+# quando cambia, così gli archivi con i valori precedenti vengono ricostruiti (results_db.py)
+AGGREGATE_VERSION = 2
+
+_LEGACY_NAME = re.compile(r"^(?P<mode>[A-Z0-9]+)_v(?P<vehicles>\d+)_s(?P<seed>\d+)$")
+_STATS_NAME = re.compile(r"^(.*)_stats\.xml(\.gz)?$")
+
+# File di una run: prefisso, parametri, stats e tripinfo (None se mancante)
+RunFiles = namedtuple("RunFiles", ["prefix", "params", "stats", "tripinfo"])
+
+
+def open_output(path: str):
+    """File di output SUMO in binario, decompresso al volo se .gz."""
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _output_file(prefix: str, kind: str) -> Optional[str]:
+    for path in (f"{prefix}_{kind}.xml", f"{prefix}_{kind}.xml.gz"):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def run_files(prefix: str) -> Optional[RunFiles]:
+    """File di output della run con questo prefisso; None se manca lo stats."""
+    stats = _output_file(prefix, "stats")
+    if stats is None:
+        return None
+    params_path = os.path.join(os.path.dirname(prefix), "params.json")
+    if os.path.exists(params_path):
+        with open(params_path) as f:
+            params = json.load(f)
+    else:
+        legacy = _LEGACY_NAME.match(os.path.basename(prefix))
+        params = {"mode": legacy["mode"], "vehicles": int(legacy["vehicles"]), "seed": int(legacy["seed"])} if legacy else {}
+    return RunFiles(prefix, params, stats, _output_file(prefix, "tripinfo"))
+
+
+def find_runs(directories: list[str]) -> list[RunFiles]:
+    """Run con output stats nelle cartelle (ricerca ricorsiva), ordinate per prefisso."""
+    runs = []
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            prefixes = {os.path.join(root, match.group(1)) for match in map(_STATS_NAME.match, files) if match}
+            runs.extend(run_files(prefix) for prefix in prefixes)
+    runs.sort(key=lambda run: run.prefix)
+    return runs
+
+
+def parse_stats(path: str) -> dict:
+    """Attributi di vehicleTripStatistics (float); {} se assente."""
+    with open_output(path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == "vehicleTripStatistics":
+                return {k: float(elem.get(k)) for k in STATS_FIELDS if elem.get(k) is not None}
+            elem.clear()
+    return {}
+
+
+def parse_tripinfo(path: str, managed=MANAGED_VEHICLES) -> dict[str, np.ndarray]:
+    """
+    Colonne per veicolo di un tripinfo-output: "id", "managed" (veicolo gestito via V2X)
+    e TRIPINFO_COLUMNS.
+    """
+    ids: list[str] = []
+    columns = {name: array("d") for name in TRIPINFO_COLUMNS}
+    with open_output(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            if event == "end" and elem.tag == "tripinfo":
+                ids.append(elem.get("id"))
+                for name, values in columns.items():
+                    values.append(float(elem.get(name, "nan")))
+                # Elemento già letto: rimosso dalla radice (memoria costante)
+                root.clear()
+    table = {name: np.frombuffer(values, dtype=np.float64) if len(values) else np.zeros(0) for name, values in columns.items()}
+    table["id"] = np.array(ids, dtype=str)
+    table["managed"] = np.isin(table["id"], list(managed))
+    return table
+
+
+def parse_run(run: RunFiles) -> tuple[dict, dict[str, np.ndarray]]:
+    """(riga della run: prefisso, parametri e stats; colonne per veicolo). Eseguita nei worker."""
+    record = {"prefix": run.prefix, **run.params}
+    try:
+        record.update({f"stats_{k}": v for k, v in parse_stats(run.stats).items()})
+        vehicles = parse_tripinfo(run.tripinfo) if run.tripinfo else _empty_vehicles()
+    except (ET.ParseError, OSError, EOFError) as e:
+        logger.warning(f"Output non leggibile per {run.prefix}: {e}")
+        record["error"] = str(e)
+        vehicles = _empty_vehicles()
+    return record, vehicles
+
+
+def _empty_vehicles() -> dict[str, np.ndarray]:
+    table = {name: np.zeros(0) for name in TRIPINFO_COLUMNS}
+    table["id"] = np.zeros(0, dtype=str)
+    table["managed"] = np.zeros(0, dtype=bool)
+    return table
+
+
+class ResultsTable:
+    """
+    Risultati di un insieme di run: righe per run e tabella colonnare per veicolo, con la
+    colonna "run" (indice in runs) a collegarle. Le righe di ogni run sono contigue.
+    """
+
+    def __init__(self, runs: list[dict], vehicles: dict[str, np.ndarray]):
+        self.runs = runs
+        self.vehicles = vehicles
+
+    @classmethod
+    def from_parsed(cls, parsed: list[tuple[dict, dict[str, np.ndarray]]]) -> "ResultsTable":
+        runs = [record for record, _ in parsed]
+        counts = [len(columns["id"]) for _, columns in parsed]
+        vehicles = {"run": np.repeat(np.arange(len(runs)), counts)}
+        for name in ("id", "managed", *TRIPINFO_COLUMNS):
+            vehicles[name] = np.concatenate([columns[name] for _, columns in parsed]) if parsed else _empty_vehicles()[name]
+        return cls(runs, vehicles)
+
+    def __len__(self) -> int:
+        return len(self.vehicles["run"])
+
+    def run_aggregates(self, columns=AGGREGATE_COLUMNS) -> list[dict]:
+        """
+        Per run: parametri, stats di SUMO e, dalla tabella, numero di trip, media e 95°
+        percentile di ogni colonna su tutti i veicoli e media sui veicoli gestiti.
+        """
+        v, n = self.vehicles, len(self.runs)
+        run = v["run"]
+        trips = np.bincount(run, minlength=n)
+        managed = np.bincount(run, weights=v["managed"], minlength=n)
+        # Per il percentile: ordinamento per (run, valore), interpolazione lineare tra le due
+        # posizioni vicine a 0.95 * (trip - 1) di ogni run (come np.percentile)
+        starts = np.concatenate([[0], np.cumsum(trips)[:-1]])
+        position = 0.95 * np.maximum(trips - 1, 0)
+        p95_low = starts + np.floor(position).astype(np.intp)
+        p95_high = starts + np.ceil(position).astype(np.intp)
+        p95_fraction = position - np.floor(position)
+
+        aggregates = [dict(record, trips=int(trips[i]), managed_trips=int(managed[i])) for i, record in enumerate(self.runs)]
+        for name in columns:
+            values = v[name]
+            mean = _safe_divide(np.bincount(run, weights=values, minlength=n), trips)
+            managed_mean = _safe_divide(np.bincount(run, weights=values * v["managed"], minlength=n), managed)
+            if len(values):
+                ordered = values[np.lexsort((values, run))]
+                last = len(ordered) - 1
+                low, high = ordered[np.minimum(p95_low, last)], ordered[np.minimum(p95_high, last)]
+                p95 = np.where(trips > 0, low + (high - low) * p95_fraction, np.nan)
+            else:
+                p95 = np.full(n, np.nan)
+            for i, row in enumerate(aggregates):
+                row[f"{name}_mean"] = float(mean[i])
+                row[f"{name}_p95"] = float(p95[i])
+                row[f"managed_{name}_mean"] = float(managed_mean[i])
+        return aggregates
+
+    def vehicle_aggregates(self, keys=("mode", "vehicles"), columns=AGGREGATE_COLUMNS) -> list[dict]:
+        """Per (parametri keys della run, id veicolo): media e numero di run (tipicamente i seed)."""
+        v = self.vehicles
+        groups: dict[tuple, int] = {}
+        run_group = np.array([groups.setdefault(tuple(record.get(key) for key in keys), len(groups)) for record in self.runs], dtype=np.intp)
+        labels = list(groups)
+        ids, id_codes = np.unique(v["id"], return_inverse=True)
+        combined = run_group[v["run"]] * max(len(ids), 1) + id_codes
+        cells, cell_of_row = np.unique(combined, return_inverse=True)
+        count = np.bincount(cell_of_row, minlength=len(cells))
+        managed = np.bincount(cell_of_row, weights=v["managed"], minlength=len(cells)) > 0
+
+        rows = []
+        means = {name: np.bincount(cell_of_row, weights=v[name], minlength=len(cells)) / count for name in columns}
+        for c, cell in enumerate(cells.tolist()):
+            group, vehicle = divmod(cell, max(len(ids), 1))
+            row = dict(zip(keys, labels[group]))
+            row.update(vehicle_id=str(ids[vehicle]), managed=bool(managed[c]), runs=int(count[c]))
+            row.update((f"{name}_mean", float(means[name][c])) for name in columns)
+            rows.append(row)
+        return rows
+
+    def save(self, path: str) -> None:
+        """Tabella per veicolo (con i parametri di run) in .npz o .parquet (richiede pyarrow)."""
+        columns = dict(self.vehicles)
+        for key in ("mode", "vehicles", "seed"):
+            values = [record.get(key) for record in self.runs]
+            if any(value is not None for value in values):
+                columns[key] = np.array(values)[columns["run"]] if len(columns["run"]) else np.array(values)
+        if path.endswith(".parquet"):
+            import pyarrow as pa  # Dipendenza opzionale: solo per l'export Parquet
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table(columns), path)
+        else:
+            np.savez_compressed(path, prefix=np.array([record["prefix"] for record in self.runs]), **columns)
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+
+def parse_runs(runs: list[RunFiles], jobs: Optional[int] = None) -> list[tuple[dict, dict[str, np.ndarray]]]:
+    """
+    parse_run di ogni run, nell'ordine di runs.
+
+    Args:
+        jobs: Processi di parsing (None = numero di CPU, 1 = nel processo corrente)
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs <= 1 or len(runs) <= 1:
+        return [parse_run(run) for run in runs]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # Blocchi di più run per task: meno overhead di IPC con molte run piccole
+        return list(pool.map(parse_run, runs, chunksize=max(1, len(runs) // (jobs * 4))))
+
+
+def analyze(directories: list[str], jobs: Optional[int] = None) -> ResultsTable:
+    """
+    Analizza tutte le run trovate nelle cartelle.
+
+    Args:
+        directories: Cartelle in cui cercare gli output (es. ["batch_results"])
+        jobs: Processi di parsing (None = numero di CPU, 1 = nel processo corrente)
+    """
+    runs = find_runs(directories)
+    parsed = parse_runs(runs, jobs)
+    logger.info(f"Analizzate {len(runs)} run ({sum(len(columns['id']) for _, columns in parsed)} trip)")
+    return ResultsTable.from_parsed(parsed)
@@ -0,0 +1,303 @@
+"""
+Archivio SQLite dei risultati delle run (al posto di final_results.csv).
+
+- Una riga per run in `runs`, chiave run_id (<cartella>/<nome> del prefisso degli output):
+  parametri, statistiche di SUMO e aggregati della tabella per veicolo (results.py)
+- Ingestione incrementale: batch_run.py archivia ogni run appena finisce, analyze_batch.py
+  le run non ancora archiviate. Upsert idempotente per run_id; le run con output invariati
+  (dimensione e mtime dei file) vengono saltate senza rileggere l'XML
+- Parametri dello sweep indicizzati: mode, vehicles e seed come colonne, gli override
+  (es. "CAM_TRIGGER_CONFIG.delta_speed_threshold") come righe (nome, valore) di `params`
+- Provenienza: configurazione completa e revisione git di ogni run, da <prefix>_config.json
+- Colonne per veicolo nella tabella `vehicles`: ResultsTable ricostruita senza l'XML
+
+L'archivio è ricostruibile dagli output delle run: se lo schema o il calcolo degli aggregati
+(AGGREGATE_VERSION) cambia viene ricreato e riempito alla successiva ingestione.
+
+    with ResultsDB() as db:
+        db.ingest(find_runs(["batch_results"]))
+        db.runs(mode="V2X", vehicles=42)
+        db.runs({"CAM_TRIGGER_CONFIG.delta_speed_threshold": [0.5, 1.0]})
+        db.table(mode="V2X").vehicle_aggregates()
+"""
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+from typing import Any, Optional
+
+import numpy as np
+
+from results import STATS_FIELDS, TRIPINFO_COLUMNS, AGGREGATE_COLUMNS, AGGREGATE_VERSION, RunFiles, ResultsTable, run_files, parse_runs
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DB = "results.db"
+# Run parsate e scritte per transazione (memoria limitata anche con campagne molto grandi)
+INGEST_CHUNK = 256
+
+# Parametri dello sweep con una colonna propria in `runs`; gli altri sono in `params`
+SWEEP_COLUMNS = ("mode", "vehicles", "seed", "git_revision")
+METRIC_COLUMNS = (
+    *(f"stats_{name}" for name in STATS_FIELDS),
+    "trips", "managed_trips",
+    *(f"{name}_{kind}" for name in AGGREGATE_COLUMNS for kind in ("mean", "p95")),
+    *(f"managed_{name}_mean" for name in AGGREGATE_COLUMNS),
+)
+RUN_COLUMNS = ("run_id", "prefix", "mode", "vehicles", "seed", "params", "git_revision",
+               "fingerprint", "ingested_at", "error", *METRIC_COLUMNS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    mode TEXT,
+    vehicles INTEGER,
+    seed INTEGER,
+    params TEXT,
+    config TEXT,
+    git_revision TEXT,
+    fingerprint TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    error TEXT,
+    {", ".join(f"{name} {'INTEGER' if name.endswith('trips') else 'REAL'}" for name in METRIC_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS runs_sweep ON runs (mode, vehicles, seed);
+CREATE INDEX IF NOT EXISTS runs_vehicles ON runs (vehicles, seed);
+CREATE INDEX IF NOT EXISTS runs_seed ON runs (seed);
+CREATE INDEX IF NOT EXISTS runs_revision ON runs (git_revision);
+CREATE TABLE IF NOT EXISTS params (
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS params_value ON params (name, value);
+CREATE TABLE IF NOT EXISTS vehicles (
+    run_id TEXT NOT NULL,
+    vehicle_id TEXT NOT NULL,
+    managed INTEGER NOT NULL,
+    {", ".join(f"{name} REAL" for name in TRIPINFO_COLUMNS)},
+    PRIMARY KEY (run_id, vehicle_id)
+) WITHOUT ROWID;
+"""
+# Schema e calcolo degli aggregati: i fingerprint coprono solo gli output, un cambio dei
+# calcoli deve comunque ricostruire l'archivio
+SCHEMA_VERSION = zlib.crc32(f"{SCHEMA}\naggregates {AGGREGATE_VERSION}".encode()) & 0x7FFFFFFF
+
+_UPSERT = (f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}, config) VALUES ({', '.join(':' + name for name in RUN_COLUMNS)}, :config) "
+           f"ON CONFLICT (run_id) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name in RUN_COLUMNS[1:])}, config = excluded.config")
+
+
+def run_id(prefix: str) -> str:
+    """
+    Identificativo della run: ultima cartella e nome del prefisso degli output
+    (batch_results/V2X_v12_s0, <hash>/run per le run di una specifica).
+    """
+    path = os.path.abspath(prefix)
+    return f"{os.path.basename(os.path.dirname(path))}/{os.path.basename(path)}"
+
+
+def fingerprint(run: RunFiles) -> str:
+    """Dimensione e mtime dei file letti dall'ingestione (cambiano se la run viene rieseguita)."""
+    parts = []
+    for path in (run.stats, run.tripinfo, f"{run.prefix}_config.json"):
+        try:
+            st = os.stat(path) if path else None
+        except OSError:
+            st = None
+        parts.append(f"{st.st_size}:{st.st_mtime_ns}" if st else "-")
+    return ";".join(parts)
+
+
+def _read_snapshot(prefix: str) -> dict:
+    """<prefix>_config.json scritto da main.py ({} per run precedenti o senza prefisso)."""
+    try:
+        with open(f"{prefix}_config.json") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _run_row(values: tuple) -> dict:
+    """Riga di runs come dizionario: RUN_COLUMNS, params decodificato e "overrides"."""
+    row = dict(zip(RUN_COLUMNS, values))
+    row["params"] = json.loads(row["params"]) if row["params"] else {}
+    row["overrides"] = row["params"].get("overrides", {})
+    return row
+
+
+def _param_value(value: Any) -> Any:
+    """Valore di un parametro in SQLite: numeri e testo nativi (confrontabili), il resto come JSON."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return json.dumps(value, sort_keys=True)
+
+
+class ResultsDB:
+    """Archivio dei risultati (un file SQLite, un solo processo che scrive: il batch o l'analisi)."""
+
+    def __init__(self, path: str = RESULTS_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30.0)
+        # WAL: l'analisi può leggere mentre il batch archivia le run
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            tables = [name for (name,) in self._conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            if tables:
+                logger.warning(f"{path}: schema o aggregati cambiati, archivio ricreato (le run verranno rilette dagli output)")
+            with self._conn:
+                for name in tables:
+                    self._conn.execute(f"DROP TABLE {name}")
+                self._conn.executescript(SCHEMA)
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "ResultsDB":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Ingestione
+    # ------------------------------------------------------------------
+
+    def ingest(self, runs: list[RunFiles], jobs: Optional[int] = None) -> int:
+        """
+        Archivia le run nuove o con output modificati (le altre non vengono rilette).
+
+        Args:
+            jobs: Processi di parsing (come results.parse_runs)
+
+        Returns:
+            Numero di run archiviate
+        """
+        known = dict(self._conn.execute("SELECT run_id, fingerprint FROM runs"))
+        changed = []
+        for run in runs:
+            key, fp = run_id(run.prefix), fingerprint(run)
+            if known.get(key) != fp:
+                changed.append((key, fp, run))
+        for start in range(0, len(changed), INGEST_CHUNK):
+            chunk = changed[start:start + INGEST_CHUNK]
+            self._store(chunk, ResultsTable.from_parsed(parse_runs([run for _, _, run in chunk], jobs)))
+        if changed:
+            logger.info(f"{self.path}: archiviate {len(changed)} run ({len(runs) - len(changed)} invariate)")
+        return len(changed)
+
+    def ingest_prefix(self, prefix: str) -> int:
+        """Archivia una run appena terminata (nel processo corrente)."""
+        run = run_files(prefix)
+        return self.ingest([run], jobs=1) if run else 0
+
+    def _store(self, chunk: list[tuple[str, str, RunFiles]], table: ResultsTable) -> None:
+        keys = [key for key, _, _ in chunk]
+        now = time.time()
+        with self._conn:
+            self._conn.executemany("DELETE FROM params WHERE run_id = ?", [(key,) for key in keys])
+            self._conn.executemany("DELETE FROM vehicles WHERE run_id = ?", [(key,) for key in keys])
+            for (key, fp, run), row in zip(chunk, table.run_aggregates()):
+                snapshot = _read_snapshot(run.prefix)
+                values = {name: row.get(name) for name in METRIC_COLUMNS}
+                values.update(
+                    run_id=key, prefix=run.prefix, mode=run.params.get("mode"), vehicles=run.params.get("vehicles"),
+                    seed=run.params.get("seed"), params=json.dumps(run.params, sort_keys=True, default=str),
+                    config=json.dumps(snapshot["config"]) if "config" in snapshot else None,
+                    git_revision=snapshot.get("git_revision"), fingerprint=fp, ingested_at=now, error=row.get("error"),
+                )
+                self._conn.execute(_UPSERT, values)
+                self._conn.executemany(
+                    "INSERT INTO params (run_id, name, value) VALUES (?, ?, ?)",
+                    [(key, name, _param_value(value)) for name, value in run.params.get("overrides", {}).items()])
+            v = table.vehicles
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO vehicles VALUES ({', '.join('?' * (3 + len(TRIPINFO_COLUMNS)))})",
+                zip(np.array(keys, dtype=object)[v["run"]].tolist(), v["id"].tolist(), v["managed"].tolist(),
+                    *(v[name].tolist() for name in TRIPINFO_COLUMNS)))
+
+    def remove(self, prefix: str) -> None:
+        """Toglie dall'archivio la run con questo prefisso (es. rieseguita e fallita)."""
+        key = run_id(prefix)
+        with self._conn:
+            for name in ("vehicles", "params", "runs"):
+                self._conn.execute(f"DELETE FROM {name} WHERE run_id = ?", (key,))
+
+    # ------------------------------------------------------------------
+    # Query
+    # ------------------------------------------------------------------
+
+    def _where(self, filters: dict) -> tuple[str, list]:
+        """
+        Condizione SQL per i filtri {parametro: valore o lista di valori}: colonne di runs per
+        SWEEP_COLUMNS, altrimenti override (percorso in config) cercati in params.
+        """
+        clauses, args = [], []
+        for name, value in filters.items():
+            values = [_param_value(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])]
+            marks = ", ".join("?" * len(values))
+            if name in SWEEP_COLUMNS:
+                clauses.append(f"{name} IN ({marks})")
+            else:
+                clauses.append(f"run_id IN (SELECT run_id FROM params WHERE name = ? AND value IN ({marks}))")
+                args.append(name)
+            args.extend(values)
+        return " AND ".join(clauses) or "1", args
+
+    def runs(self, where: Optional[dict] = None, **filters) -> list[dict]:
+        """
+        Run archiviate che soddisfano tutti i filtri, ordinate per run_id.
+
+        Args:
+            where: Filtri con chiavi non valide come argomenti (override: {"RSU_CONFIG.0.detection_radius": 50.0})
+            **filters: Filtri sui parametri dello sweep (mode="V2X", vehicles=[12, 42])
+
+        Returns:
+            Righe come dizionari: RUN_COLUMNS, params decodificato e "overrides"
+        """
+        sql, args = self._where({**(where or {}), **filters})
+        return [_run_row(values) for values in
+                self._conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE {sql} ORDER BY run_id", args)]
+
+    def run(self, key: str) -> Optional[dict]:
+        """Riga archiviata della run (run_id), come in runs(); None se assente."""
+        values = self._conn.execute(f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE run_id = ?", (key,)).fetchone()
+        return _run_row(values) if values is not None else None
+
+    def table(self, where: Optional[dict] = None, **filters) -> ResultsTable:
+        """ResultsTable delle run selezionate (come runs()), con le colonne per veicolo archiviate."""
+        self._conn.execute("BEGIN")  # runs e veicoli dalla stessa versione dell'archivio
+        try:
+            runs = self.runs(where, **filters)
+            sql, args = self._where({**(where or {}), **filters})
+            rows = self._conn.execute(
+                f"SELECT run_id, vehicle_id, managed, {', '.join(TRIPINFO_COLUMNS)} FROM vehicles "
+                f"WHERE run_id IN (SELECT run_id FROM runs WHERE {sql}) ORDER BY run_id", args).fetchall()
+        finally:
+            self._conn.rollback()
+        index = {row["run_id"]: i for i, row in enumerate(runs)}
+        columns = list(zip(*rows)) if rows else [()] * (3 + len(TRIPINFO_COLUMNS))
+        vehicles = {
+            "run": np.array([index[key] for key in columns[0]], dtype=np.intp),
+            "id": np.array(columns[1], dtype=str),
+            "managed": np.array(columns[2], dtype=bool),
+        }
+        for i, name in enumerate(TRIPINFO_COLUMNS):
+            vehicles[name] = np.array(columns[3 + i], dtype=np.float64)  # NULL (NaN in origine) -> NaN
+        return ResultsTable(runs, vehicles)
+
+    def snapshot(self, key: str) -> dict:
+        """Configurazione completa e revisione git della run (None se non registrate)."""
+        row = self._conn.execute("SELECT config, git_revision FROM runs WHERE run_id = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return {"config": json.loads(row[0]) if row[0] else None, "git_revision": row[1]}
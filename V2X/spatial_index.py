@@ -0,0 +1,107 @@
+"""
+Indice spaziale a griglia uniforme per le query "veicoli entro r dal punto p".
+
+Ad ogni step la griglia viene ricostruita in blocco dalle colonne x/y della
+VehicleStateTable (un argsort sulle chiavi di cella, O(n log n) in NumPy); le query
+esaminano solo le celle che intersecano il cerchio, con una ricerca binaria per
+colonna di celle, invece di calcolare la distanza da ogni RSU a ogni veicolo.
+"""
+
+import numpy as np
+
+# Le chiavi di cella combinano (cx, cy) in un intero a 64 bit: cx nei 32 bit alti
+_CELL_BITS = 32
+_CELL_OFFSET = 1 << (_CELL_BITS - 1)
+
+
+class UniformGrid:
+    """
+    Griglia uniforme con celle quadrate di lato cell_size (metri SUMO).
+    """
+
+    def __init__(self, cell_size: float = 100.0):
+        """
+        Args:
+            cell_size: Lato della cella; conviene pari al raggio di query più usato
+        """
+        if cell_size <= 0:
+            raise ValueError("cell_size deve essere positivo")
+        self.cell_size = float(cell_size)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._ids = np.zeros(0, dtype=np.intp)
+        self._xs = np.zeros(0, dtype=np.float64)
+        self._ys = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _cell(self, coord):
+        return np.floor(np.asarray(coord, dtype=np.float64) / self.cell_size).astype(np.int64) + _CELL_OFFSET
+
+    def build(self, xs: np.ndarray, ys: np.ndarray, ids: np.ndarray = None) -> None:
+        """
+        Ricostruisce l'indice.
+
+        Args:
+            xs, ys: Coordinate SUMO dei punti
+            ids: Identificativi dei punti (es. slot della tabella); di default 0..n-1
+        """
+        ids = np.arange(len(xs), dtype=np.intp) if ids is None else np.asarray(ids, dtype=np.intp)
+        keys = (self._cell(xs) << _CELL_BITS) | self._cell(ys)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._ids = ids[order]
+        self._xs = np.asarray(xs, dtype=np.float64)[order]
+        self._ys = np.asarray(ys, dtype=np.float64)[order]
+
+    def query_radius(self, px: float, py: float, radius: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Punti entro radius da (px, py), bordo incluso.
+
+        Returns:
+            Tupla (ids, distanze) nell'ordine interno dell'indice
+        """
+        return self.query_many([(px, py)], radius)[0]
+
+    def query_many(self, points, radii) -> list[tuple[np.ndarray, np.ndarray]]:
+        """
+        Query di raggio per più punti (es. tutte le RSU) in un solo passaggio vettoriale.
+
+        Args:
+            points: Sequenza di (x, y)
+            radii: Raggio unico o uno per punto
+
+        Returns:
+            Lista di tuple (ids, distanze), una per punto
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), (len(points),))
+        if not len(points):
+            return []
+        if not len(self._keys):
+            return [(self._ids[:0], self._xs[:0])] * len(points)
+
+        px, py = points[:, 0], points[:, 1]
+        cx0 = self._cell(px - radii)
+        cy0, cy1 = self._cell(py - radii), self._cell(py + radii)
+
+        # Stesso numero di colonne di celle per ogni punto (le colonne in più filtrano a vuoto);
+        # per ogni colonna l'intervallo [cy0, cy1] è contiguo nelle chiavi ordinate
+        n_cols = int((self._cell(px + radii) - cx0).max()) + 1
+        columns = (cx0[:, None] + np.arange(n_cols)) << _CELL_BITS
+        starts = np.searchsorted(self._keys, (columns | cy0[:, None]).ravel(), side="left")
+        ends = np.searchsorted(self._keys, (columns | cy1[:, None]).ravel(), side="right")
+        lengths = np.maximum(ends - starts, 0)
+
+        # Espansione degli intervalli [start, end) in indici candidati, con il punto di appartenenza
+        total = int(lengths.sum())
+        offsets = np.cumsum(lengths) - lengths
+        candidates = np.repeat(starts - offsets, lengths) + np.arange(total)
+        owner = np.repeat(np.arange(len(points)).repeat(n_cols), lengths)
+
+        distances = np.hypot(self._xs[candidates] - px[owner], self._ys[candidates] - py[owner])
+        inside = distances <= radii[owner]
+        ids, distances, owner = self._ids[candidates[inside]], distances[inside], owner[inside]
+
+        bounds = np.cumsum(np.bincount(owner, minlength=len(points)))[:-1]
+        return list(zip(np.split(ids, bounds), np.split(distances, bounds)))
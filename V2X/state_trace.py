@@ -0,0 +1,237 @@
+"""
+Registrazione e replay dello stato dei veicoli per step, senza SUMO.
+
+Il recorder scrive, ad ogni step, le righe della VehicleStateTable lette da SUMO (veicolo,
+x, y, speed, heading, acceleration, bit di getSignals) e partenze/arrivi della
+sottoscrizione di simulazione. Il replay espone la stessa interfaccia di traci usata da
+V2XSimulator (simulationStep, risultati delle sottoscrizioni, load/close) leggendo il
+trace: RSU, trigger e messaggi girano invariati, senza processo SUMO, e producono gli
+stessi messaggi della run registrata (con publish sincrono, --outbound-workers 0, o
+--flush-each-step). I comandi di attuazione sui veicoli (setSpeed, slowDown, setColor, ...)
+sono ignorati (le letture di corsia restituiscono valori neutri): le traiettorie sono quelle
+registrate. La proiezione geografica deve essere quella in-process (projection.py): nel replay
+non c'è convertGeo.
+
+Formato (una directory, array .npy memory-mappable con np.load(mmap_mode="r")):
+    trace.json                  versione, step_length, step per chunk, ID dei veicoli, origine
+    chunk_00000.steps.npy       per step: tempo e offset della prima riga/evento nel chunk
+    chunk_00000.rows.npy        righe dei veicoli (nell'ordine dei risultati di SUMO)
+    chunk_00000.events.npy      partenze e arrivi (nell'ordine di SUMO)
+    ...
+Un chunk raccoglie `chunk_steps` step; trace.json è riscritto a ogni chunk, quindi una run
+interrotta lascia un trace valido fino all'ultimo chunk completo.
+"""
+
+import os
+import json
+import logging
+from typing import Optional
+
+import numpy as np
+from traci import constants as tc
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+META_FILE = "trace.json"
+
+STEP_DTYPE = np.dtype([("time", "<f8"), ("rows", "<i8"), ("events", "<i8")])
+ROW_DTYPE = np.dtype([
+    ("vehicle", "<i4"), ("x", "<f8"), ("y", "<f8"), ("speed", "<f8"),
+    ("heading", "<f8"), ("acceleration", "<f8"), ("signals", "<i4"),
+])
+EVENT_DTYPE = np.dtype([("vehicle", "<i4"), ("arrived", "u1")])
+
+# Colonne della tabella registrate (x, y insieme in VAR_POSITION)
+ROW_COLUMNS = ("x", "y", "speed", "heading", "acceleration", "signals")
+
+
+def chunk_path(directory: str, index: int, kind: str) -> str:
+    return os.path.join(directory, f"chunk_{index:05d}.{kind}.npy")
+
+
+class TraceRecorder:
+    """Scrive il trace di una run, un chunk di step alla volta."""
+
+    def __init__(self, directory: str, step_length: float, chunk_steps: int = 1024, source: Optional[dict] = None):
+        """
+        Args:
+            directory: Directory del trace (creata; i chunk esistenti vengono sovrascritti)
+            step_length: Durata dello step di SUMO (s)
+            chunk_steps: Step per chunk
+            source: Metadati della run registrata (modalità, seed, rotte, revisione)
+        """
+        if chunk_steps <= 0:
+            raise ValueError("chunk_steps deve essere positivo")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.step_length = step_length
+        self.chunk_steps = chunk_steps
+        self.source = source or {}
+        self.ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self.chunks: list[dict] = []
+        self.steps = 0
+        self._reset_chunk()
+
+    @classmethod
+    def from_config(cls, trace_config: dict, directory: str, step_length: float, source: Optional[dict] = None) -> "TraceRecorder":
+        return cls(directory, step_length, trace_config.get("chunk_steps", 1024), source)
+
+    def _reset_chunk(self) -> None:
+        self._steps: list[tuple] = []
+        self._rows: list[np.ndarray] = []
+        self._events: list[tuple[int, int]] = []
+        self._n_rows = 0
+
+    def _vehicle(self, sumo_id: str) -> int:
+        index = self._index.get(sumo_id)
+        if index is None:
+            index = self._index[sumo_id] = len(self.ids)
+            self.ids.append(sumo_id)
+        return index
+
+    def record(self, sim_time: float, departed, arrived, table, slots: np.ndarray) -> None:
+        """
+        Uno step: partenze/arrivi della sottoscrizione di simulazione e righe della tabella
+        appena scritte da ingest (slot nell'ordine dei risultati).
+        """
+        self._steps.append((sim_time, self._n_rows, len(self._events)))
+        self._events.extend((self._vehicle(veh_id), 0) for veh_id in departed)
+        self._events.extend((self._vehicle(veh_id), 1) for veh_id in arrived)
+        if len(slots):
+            rows = np.empty(len(slots), dtype=ROW_DTYPE)
+            ids = table.ids
+            rows["vehicle"] = [self._vehicle(ids[slot]) for slot in slots.tolist()]
+            for name in ROW_COLUMNS:
+                rows[name] = getattr(table, name)[slots]
+            self._rows.append(rows)
+            self._n_rows += len(rows)
+        self.steps += 1
+        if len(self._steps) >= self.chunk_steps:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._steps:
+            return
+        index = len(self.chunks)
+        rows = np.concatenate(self._rows) if self._rows else np.zeros(0, dtype=ROW_DTYPE)
+        np.save(chunk_path(self.directory, index, "steps"), np.array(self._steps, dtype=STEP_DTYPE))
+        np.save(chunk_path(self.directory, index, "rows"), rows)
+        np.save(chunk_path(self.directory, index, "events"), np.array(self._events, dtype=EVENT_DTYPE))
+        self.chunks.append({"steps": len(self._steps), "rows": len(rows), "events": len(self._events)})
+        self._reset_chunk()
+        self._write_meta()
+
+    def _write_meta(self) -> None:
+        meta = {
+            "version": TRACE_VERSION,
+            "step_length": self.step_length,
+            "chunk_steps": self.chunk_steps,
+            "steps": sum(chunk["steps"] for chunk in self.chunks),
+            "chunks": self.chunks,
+            "ids": self.ids,
+            "source": self.source,
+        }
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        """Scrive l'ultimo chunk (anche parziale)."""
+        self._flush()
+        logger.info(f"Trace salvato in {self.directory}: {self.steps} step, {len(self.ids)} veicoli")
+
+
+class _Namespace:
+    """Dominio dell'API traci (simulation, vehicle, lane) con i soli metodi usati dal simulatore."""
+
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class TraceReplay:
+    """
+    Backend SUMO che rilegge un trace (stessa interfaccia di traci/libsumo per V2XSimulator).
+    Da installare con sumo.use(TraceReplay(directory), "replay").
+    """
+
+    TraCIException = RuntimeError
+
+    # Comandi di attuazione del veicolo (Vehicle.handle_mcm_*): ignorati nel replay
+    ACTUATION = ("setColor", "setSpeedMode", "setSpeed", "slowDown", "setStop", "resume")
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get("version") != TRACE_VERSION:
+            raise ValueError(f"{directory}: versione del trace {meta.get('version')} non supportata (attesa {TRACE_VERSION})")
+        self.directory = directory
+        self.meta = meta
+        self.step_length = meta["step_length"]
+        self.chunk_steps = meta["chunk_steps"]
+        self.n_steps = meta["steps"]
+        self.ids = meta["ids"]
+
+        def noop(*args, **kwargs):
+            return None
+
+        def convert_geo(*args, **kwargs):
+            raise self.TraCIException("convertGeo non disponibile nel replay")
+
+        self.simulation = _Namespace(
+            getTime=lambda: self.time, getSubscriptionResults=lambda: self._sim_results,
+            subscribe=noop, getMinExpectedNumber=lambda: self.n_steps - self.cursor, convertGeo=convert_geo,
+        )
+        self.vehicle = _Namespace(
+            subscribe=noop, getAllSubscriptionResults=self._vehicle_results, getNextStops=lambda veh_id: (),
+            getLaneID=lambda veh_id: "", getLanePosition=lambda veh_id: 0.0,
+            **{name: noop for name in self.ACTUATION},
+        )
+        self.lane = _Namespace(getEdgeID=lambda lane_id: "", getLength=lambda lane_id: 0.0)
+        self.load([])
+
+    def load(self, args: list) -> None:
+        """Riparte dal primo step (next_run su un replay)."""
+        self.cursor = 0
+        self.time = 0.0
+        self._chunk_index = -1
+        self._rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._sim_results: dict = {}
+
+    def close(self) -> None:
+        self._chunk = None
+
+    def _load_chunk(self, index: int) -> None:
+        self._chunk = tuple(np.load(chunk_path(self.directory, index, kind), mmap_mode="r") for kind in ("steps", "rows", "events"))
+        self._chunk_index = index
+
+    def simulationStep(self) -> None:
+        if self.cursor >= self.n_steps:
+            raise self.TraCIException("Trace terminato")
+        index, step = divmod(self.cursor, self.chunk_steps)
+        if index != self._chunk_index:
+            self._load_chunk(index)
+        steps, rows, events = self._chunk
+        last = step + 1 == len(steps)
+        row_end = len(rows) if last else steps["rows"][step + 1]
+        event_end = len(events) if last else steps["events"][step + 1]
+
+        self.time = float(steps["time"][step])
+        self._rows = rows[steps["rows"][step]:row_end]
+        step_events = events[steps["events"][step]:event_end]
+        ids = self.ids
+        departed = tuple(ids[v] for v, arrived in zip(step_events["vehicle"].tolist(), step_events["arrived"].tolist()) if not arrived)
+        arrived = tuple(ids[v] for v, arrived in zip(step_events["vehicle"].tolist(), step_events["arrived"].tolist()) if arrived)
+        self._sim_results = {tc.VAR_DEPARTED_VEHICLES_IDS: departed, tc.VAR_ARRIVED_VEHICLES_IDS: arrived}
+        self.cursor += 1
+
+    def _vehicle_results(self) -> dict:
+        rows, ids = self._rows, self.ids
+        return {
+            ids[v]: {tc.VAR_POSITION: (x, y), tc.VAR_SPEED: speed, tc.VAR_ANGLE: heading, tc.VAR_ACCELERATION: acceleration, tc.VAR_SIGNALS: signals}
+            for v, x, y, speed, heading, acceleration, signals in zip(
+                rows["vehicle"].tolist(), rows["x"].tolist(), rows["y"].tolist(), rows["speed"].tolist(),
+                rows["heading"].tolist(), rows["acceleration"].tolist(), rows["signals"].tolist())
+        }
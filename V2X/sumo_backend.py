@@ -0,0 +1,86 @@
+"""
+Astrazione del backend SUMO.
+
+Il simulatore parla con SUMO tramite uno tra due backend con la stessa API:
+- "traci":   processo SUMO separato, comunicazione via socket (supporta sumo-gui)
+- "libsumo": SUMO caricato in-process, nessun marshaling su socket (solo headless)
+
+oppure, senza SUMO, un oggetto con la stessa API installato con use() (es. il replay di un
+trace, vedi state_trace.py).
+
+Tutti i moduli usano il proxy `sumo` invece di importare traci direttamente:
+
+    from sumo_backend import sumo
+    sumo.vehicle.getSpeed(veh_id)
+"""
+
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("traci", "libsumo")
+
+
+class SumoBackend:
+    """
+    Proxy verso il modulo backend selezionato (traci o libsumo).
+    Gli attributi (vehicle, simulation, TraCIException, ...) vengono inoltrati al modulo attivo.
+    """
+
+    def __init__(self, name: str = "traci"):
+        self._module = None
+        self.name = None
+        self.select(name)
+
+    def select(self, name: str, gui: bool = False) -> str:
+        """
+        Seleziona il backend da usare.
+
+        Args:
+            name: "traci" o "libsumo"
+            gui: True se si usa sumo-gui (libsumo non la supporta -> fallback a traci)
+
+        Returns:
+            Nome del backend effettivamente attivo
+        """
+        if name not in BACKENDS:
+            raise ValueError(f"Backend SUMO '{name}' non supportato (scegli tra {BACKENDS})")
+
+        if name == "libsumo" and gui:
+            logger.warning("libsumo non supporta sumo-gui: uso il backend traci")
+            name = "traci"
+
+        try:
+            module = importlib.import_module(name)
+        except ImportError as e:
+            if name == "traci":
+                raise
+            logger.warning(f"Backend {name} non disponibile ({e}): uso il backend traci")
+            name, module = "traci", importlib.import_module("traci")
+
+        self._module = module
+        self.name = name
+        return name
+
+    def use(self, module, name: str) -> str:
+        """
+        Usa come backend un oggetto con l'API di traci (es. state_trace.TraceReplay).
+
+        Returns:
+            Nome del backend attivo
+        """
+        self._module = module
+        self.name = name
+        return name
+
+    @property
+    def is_libsumo(self) -> bool:
+        return self.name == "libsumo"
+
+    def __getattr__(self, attr):
+        return getattr(self._module, attr)
+
+
+# Istanza globale (singleton), come mqtt_manager
+sumo = SumoBackend()
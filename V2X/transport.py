@@ -0,0 +1,304 @@
+"""
+Astrazione del trasporto dei messaggi V2X.
+
+Il simulatore pubblica e riceve i messaggi tramite uno tra tre trasporti con la stessa API:
+- "mqtt":     container vanetza-nap via paho (mqtt_manager), un broker per stazione
+- "loopback": consegna in-process tra le stazioni, senza docker né rete
+- "null":     messaggi scartati (misura del solo costo di simulazione e codifica)
+
+Tutti i moduli usano il proxy `transport` invece di importare mqtt_manager direttamente:
+
+    from transport import transport
+    transport.publish(station_id, "cam", payload)
+
+Il loopback riproduce ciò che fanno mosquitto e vanetza-nap: un messaggio pubblicato da una
+stazione su "vanetza/in/<tipo>" arriva ai sottoscrittori dello stesso topic sulla stazione
+(broker locale) e, via radio, ai sottoscrittori di "vanetza/out/<tipo>" di tutte le altre
+stazioni. Il payload viene consegnato invariato. Una sottoscrizione con station_id
+ALL_STATIONS riceve i messaggi via radio di qualunque ricevente (userdata["station_id"]).
+
+Con un modello di canale (channel.py) i messaggi via radio raggiungono solo le stazioni
+entro portata, con perdite e latenza: restano nella coda eventi del canale e vengono
+consegnati da end_step() allo step in cui arrivano. Senza canale la consegna è immediata
+e le sottoscrizioni ALL_STATIONS ricevono ogni messaggio una volta (ricevente None).
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from typing import Callable, Iterable, Optional, Union
+
+from config import STATIONS, MQTT_TOPICS
+from messages.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ("mqtt", "loopback", "null")
+ALL_STATIONS = None  # station_id di subscribe: messaggi ricevuti da qualunque stazione (loopback)
+
+# Messaggio consegnato alle callback (stessi attributi usati di paho.MQTTMessage)
+LoopbackMessage = namedtuple("LoopbackMessage", ["topic", "payload"])
+
+
+class Transport(ABC):
+    """
+    Interfaccia comune dei trasporti. Le callback di subscribe hanno la firma di paho:
+    callback(client, userdata, msg) con msg.topic e msg.payload (bytes).
+    """
+
+    name = ""
+
+    @abstractmethod
+    def is_routable(self, station_id: int) -> bool:
+        """True se la stazione può pubblicare (per mqtt: container con IP configurato)."""
+
+    @abstractmethod
+    def publish(self, station_id: int, message_type: str, payload: Union[dict, bytes]) -> bool:
+        """Pubblica un payload (bytes o dizionario) sul topic del tipo di messaggio."""
+
+    @abstractmethod
+    def subscribe(self, station_id: int, topic: str, callback: Callable) -> bool:
+        """Registra una callback per i messaggi ricevuti dalla stazione su un topic."""
+
+    def warm_up(self, station_ids: Optional[Iterable[int]] = None) -> dict:
+        """Apre le connessioni prima del primo step ({} se non c'è nulla da connettere)."""
+        return {}
+
+    def get_publish_backlog(self) -> tuple[int, float]:
+        """(publish non ancora completati, latenza media di completamento in s)."""
+        return 0, 0.0
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def end_step(self, sim_time: float, step_length: float, positions: Callable[[], tuple]) -> None:
+        """
+        Fine dello step sim_time, dopo la pubblicazione dei suoi messaggi (default: nulla).
+
+        Args:
+            sim_time: Tempo dello step appena simulato (s)
+            step_length: Durata di uno step (s)
+            positions: Funzione che restituisce (station_ids, xs, ys) delle stazioni nello step
+        """
+
+    def close_all(self) -> None:
+        """Chiude connessioni e risorse del trasporto."""
+
+
+class _LocalTransport(Transport):
+    """Base dei trasporti in-process: stazioni servite e conteggio dei messaggi."""
+
+    def __init__(self, all_stations: bool = False):
+        """
+        Args:
+            all_stations: True = ogni entità è una stazione V2X; False = solo quelle in STATIONS
+        """
+        self.all_stations = all_stations
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def is_routable(self, station_id: int) -> bool:
+        return self.all_stations or station_id in STATIONS
+
+    def _topic(self, message_type: str) -> Optional[str]:
+        topic = MQTT_TOPICS.get(message_type)
+        if not topic:
+            logger.error(f"Topic non configurato per messaggio tipo '{message_type}'")
+        return topic
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "all_stations": self.all_stations, "published": self.published}
+
+
+class NullTransport(_LocalTransport):
+    """Scarta tutti i messaggi: nessuna sottoscrizione riceve mai nulla."""
+
+    name = "null"
+
+    def publish(self, station_id: int, message_type: str, payload: Union[dict, bytes]) -> bool:
+        if not self.is_routable(station_id) or not self._topic(message_type):
+            return False
+        with self._lock:
+            self.published += 1
+        return True
+
+    def subscribe(self, station_id: int, topic: str, callback: Callable) -> bool:
+        return self.is_routable(station_id)
+
+
+class LoopbackTransport(_LocalTransport):
+    """
+    Consegna in-process con la semantica di vanetza-nap. Senza canale le callback vengono
+    eseguite nel thread che pubblica (worker della pipeline di uscita), come nel thread di
+    rete di paho; con il canale quelle via radio nel loop di simulazione (end_step).
+    """
+
+    name = "loopback"
+
+    def __init__(self, all_stations: bool = False, channel=None, in_prefix: str = "vanetza/in/", out_prefix: str = "vanetza/out/"):
+        """
+        Args:
+            all_stations: True = ogni entità è una stazione V2X; False = solo quelle in STATIONS
+            channel: ChannelModel per i messaggi via radio (None = consegna immediata a tutti)
+            in_prefix: Prefisso dei topic di ingresso di vanetza (pubblicati dal simulatore)
+            out_prefix: Prefisso dei topic di uscita (messaggi ricevuti via radio)
+        """
+        super().__init__(all_stations)
+        self.channel = channel
+        self.in_prefix = in_prefix
+        self.out_prefix = out_prefix
+        # topic -> stazione (o ALL_STATIONS) -> callback (solo corrispondenze esatte, come le sottoscrizioni del simulatore)
+        self._subscriptions: dict[str, dict[Optional[int], list[Callable]]] = {}
+        self.delivered = 0
+        self.delivered_local = 0
+        self.callback_errors = 0
+
+    def subscribe(self, station_id: Optional[int], topic: str, callback: Callable) -> bool:
+        if station_id is not ALL_STATIONS and not self.is_routable(station_id):
+            return False
+        with self._lock:
+            self._subscriptions.setdefault(topic, {}).setdefault(station_id, []).append(callback)
+        who = "tutte le stazioni" if station_id is ALL_STATIONS else f"station {station_id}"
+        logger.info(f"Sottoscrizione a {topic} per {who} (loopback)")
+        return True
+
+    def over_the_air_topic(self, topic: str) -> Optional[str]:
+        """Topic su cui le altre stazioni ricevono un messaggio pubblicato su `topic`."""
+        if topic.startswith(self.in_prefix):
+            return self.out_prefix + topic[len(self.in_prefix):]
+        return None
+
+    def publish(self, station_id: int, message_type: str, payload: Union[dict, bytes]) -> bool:
+        if not self.is_routable(station_id):
+            return False
+        topic = self._topic(message_type)
+        if not topic:
+            return False
+        if not isinstance(payload, bytes):
+            payload = dumps(payload)
+
+        air_topic = self.over_the_air_topic(topic)
+        with self._lock:
+            self.published += 1
+            local = list(self._subscriptions.get(topic, {}).get(station_id, ()))
+            listeners = self._subscriptions.get(air_topic)
+            if listeners and self.channel is not None:
+                remote = []
+                self.channel.send(station_id, air_topic, payload)
+            else:
+                remote = [(sid, callback) for sid, callbacks in (listeners or {}).items()
+                          if sid != station_id for callback in callbacks]
+
+        for callback in local:
+            self._deliver(callback, station_id, LoopbackMessage(topic, payload))
+        if remote:
+            message = LoopbackMessage(air_topic, payload)
+            for receiver, callback in remote:
+                self._deliver(callback, receiver, message)
+        with self._lock:
+            self.delivered_local += len(local)
+            self.delivered += len(remote)
+        return True
+
+    def end_step(self, sim_time: float, step_length: float, positions: Callable[[], tuple]) -> None:
+        """Consegna i messaggi via radio che arrivano entro il prossimo step (solo con canale)."""
+        if self.channel is None:
+            return
+        self.channel.set_positions(sim_time, *positions())
+        delivered = 0
+        for receiver, topic, payload in self.channel.advance(sim_time + step_length):
+            with self._lock:
+                listeners = self._subscriptions.get(topic, {})
+                callbacks = listeners.get(receiver, []) + listeners.get(ALL_STATIONS, [])
+            message = LoopbackMessage(topic, payload)
+            for callback in callbacks:
+                self._deliver(callback, receiver, message)
+            delivered += len(callbacks)
+        with self._lock:
+            self.delivered += delivered
+
+    def _deliver(self, callback: Callable, station_id: Optional[int], message: LoopbackMessage) -> None:
+        try:
+            callback(self, {"station_id": station_id}, message)
+        except Exception as e:
+            self.callback_errors += 1
+            logger.error(f"Errore nella callback loopback di station {station_id} su {message.topic}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **super().stats(),
+                "delivered": self.delivered,
+                "delivered_local": self.delivered_local,
+                "callback_errors": self.callback_errors,
+                **({"channel": self.channel.stats()} if self.channel is not None else {}),
+            }
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._subscriptions.clear()
+
+
+class TransportProxy:
+    """
+    Proxy verso il trasporto selezionato; gli attributi vengono inoltrati all'implementazione
+    attiva. Senza select() esplicita, al primo uso viene attivato il trasporto mqtt.
+    """
+
+    def __init__(self, name: str = "mqtt"):
+        self._default = name
+        self._impl: Optional[Transport] = None
+        self.name: Optional[str] = None
+
+    def select(self, name: str, all_stations: bool = False, channel=None) -> str:
+        """
+        Seleziona il trasporto da usare (prima dell'avvio della pipeline di uscita).
+
+        Args:
+            name: "mqtt", "loopback" o "null"
+            all_stations: loopback/null: ogni entità è una stazione V2X (ignorato da mqtt)
+            channel: loopback: ChannelModel dei messaggi via radio (None = consegna immediata)
+
+        Returns:
+            Nome del trasporto attivo
+        """
+        if name not in TRANSPORTS:
+            raise ValueError(f"Trasporto '{name}' non supportato (scegli tra {TRANSPORTS})")
+
+        if name == "mqtt":
+            # Importato solo qui: le run senza docker non richiedono paho
+            from mqtt_manager import mqtt_manager
+            impl = mqtt_manager
+        elif name == "loopback":
+            impl = LoopbackTransport(all_stations=all_stations, channel=channel)
+        else:
+            impl = NullTransport(all_stations=all_stations)
+
+        if self._impl is not None and self._impl is not impl:
+            self._impl.close_all()
+        self._impl = impl
+        self.name = name
+        return name
+
+    @property
+    def active(self) -> Transport:
+        if self._impl is None:
+            self.select(self._default)
+        return self._impl
+
+    def close_all(self) -> None:
+        # Nessun trasporto da chiudere se non è mai stato usato (es. modalità BASELINE)
+        if self._impl is not None:
+            self._impl.close_all()
+
+    def get_publish_backlog(self) -> tuple[int, float]:
+        # Sonda del pacing adattivo anche in BASELINE: nessun backlog, senza attivare mqtt
+        return self._impl.get_publish_backlog() if self._impl is not None else (0, 0.0)
+
+    def __getattr__(self, attr):
+        return getattr(self.active, attr)
+
+
+# Istanza globale (singleton), come sumo
+transport = TransportProxy()
@@ -4,9 +4,12 @@ I Trigger determinano QUANDO un messaggio deve essere inviato.
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import Mapping
 from typing import Type, Optional, Any
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
@@ -37,6 +40,12 @@ class Trigger(ABC):
     # Tipo di messaggio a cui si applica questo trigger
     MESSAGE_TYPE: str = "unknown"
     
+    # Variabili TraCI dei veicoli (traci.constants) necessarie al trigger
+    SUMO_VARIABLES: tuple[int, ...] = ()
+    
+    # True se il trigger implementa evaluate_batch (valutazione vettoriale di tutti i veicoli)
+    SUPPORTS_BATCH: bool = False
+    
     @abstractmethod
     def evaluate(
         self,
@@ -59,6 +68,49 @@ class Trigger(ABC):
         """
         pass
     
+    def new_batch_state(self, capacity: int) -> dict[str, np.ndarray]:
+        """
+        Stato per evaluate_batch: array indicizzati per slot della VehicleStateTable.
+        La colonna "valid" indica gli slot che hanno già inviato almeno un messaggio.
+        """
+        raise NotImplementedError(f"{type(self).__name__} non supporta la valutazione batch")
+    
+    def evaluate_batch(
+        self,
+        current_time: float,
+        columns: Mapping[str, np.ndarray],
+        state: dict[str, np.ndarray],
+        slots: np.ndarray
+    ) -> np.ndarray:
+        """
+        Valuta il trigger per più veicoli in una volta.
+        
+        Args:
+            current_time: Tempo corrente della simulazione
+            columns: Colonne correnti della tabella veicoli (x, y, speed, heading, ...)
+            state: Stato dell'ultimo invio (da new_batch_state), aggiornato in place per gli slot che inviano
+            slots: Slot da valutare
+            
+        Returns:
+            Maschera booleana (allineata a slots) dei veicoli che devono inviare
+        """
+        raise NotImplementedError(f"{type(self).__name__} non supporta la valutazione batch")
+    
+    @staticmethod
+    def grow_batch_state(state: dict[str, np.ndarray], capacity: int) -> None:
+        """Estende gli array dello stato batch (i nuovi slot sono non validi)."""
+        for name, arr in state.items():
+            if len(arr) < capacity:
+                state[name] = np.concatenate([arr, np.zeros(capacity - len(arr), dtype=arr.dtype)])
+    
+    @staticmethod
+    def reset_batch_state(state: dict[str, np.ndarray], slots) -> None:
+        """Azzera lo stato degli slot liberati (il prossimo veicolo riparte dal primo messaggio)."""
+        slots = np.atleast_1d(np.asarray(slots, dtype=np.intp))
+        for arr in state.values():
+            # Slot oltre la dimensione attuale dello stato non sono mai stati valutati
+            arr[slots[slots < len(arr)]] = 0
+    
     @classmethod
     def get_message_type(cls) -> str:
         """Restituisce il tipo di messaggio gestito da questo trigger."""
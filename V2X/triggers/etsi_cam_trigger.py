@@ -2,9 +2,13 @@
 ETSI CAM Trigger - Logica di triggering secondo ETSI EN 302 637-2.
 """
 
+from collections.abc import Mapping
 from typing import Optional
 import logging
 
+import numpy as np
+from traci import constants as tc
+
 from .base import Trigger, TriggerResult, TriggerRegistry
 from config import CAM_TRIGGER_CONFIG
 from utils import euclidean_distance, heading_difference
@@ -25,6 +29,8 @@ class ETSICAMTrigger(Trigger):
     """
     
     MESSAGE_TYPE = "cam"
+    SUMO_VARIABLES = (tc.VAR_POSITION, tc.VAR_SPEED, tc.VAR_ANGLE)
+    SUPPORTS_BATCH = True
     
     def __init__(self):
         # Carica configurazione
@@ -150,6 +156,74 @@ class ETSICAMTrigger(Trigger):
             new_state=new_state,
             reason=reason
         )
+    
+    def new_batch_state(self, capacity: int) -> dict[str, np.ndarray]:
+        """Stato dell'ultimo CAM inviato, un elemento per slot (stessi campi di evaluate)."""
+        state = {name: np.zeros(capacity, dtype=np.float64) for name in ("time", "x", "y", "speed", "heading", "t_gen_cam")}
+        state["n_gen_cam"] = np.zeros(capacity, dtype=np.int64)
+        state["valid"] = np.zeros(capacity, dtype=bool)
+        return state
+    
+    def evaluate_batch(
+        self,
+        current_time: float,
+        columns: Mapping[str, np.ndarray],
+        state: dict[str, np.ndarray],
+        slots: np.ndarray
+    ) -> np.ndarray:
+        """
+        Versione vettoriale di evaluate: stesse regole ETSI per tutti gli slot in una volta.
+        
+        Returns:
+            Maschera booleana (allineata a slots) dei veicoli che devono inviare un CAM
+        """
+        x, y = columns["x"][slots], columns["y"][slots]
+        speed, heading = columns["speed"][slots], columns["heading"][slots]
+        
+        # CASO 1: primo invio assoluto (slot senza stato)
+        first = ~state["valid"][slots]
+        
+        # BLOCCO: T_GenCamMin non ancora trascorso (stessa tolleranza di evaluate)
+        dt = current_time - state["time"][slots]
+        open_gate = ~first & (dt >= self.t_gen_cam_min - 0.005)
+        
+        current_t_gen_cam = state["t_gen_cam"][slots]
+        current_n_gen_cam = state["n_gen_cam"][slots]
+        
+        # Delta rispetto all'ultimo invio
+        delta_pos = np.sqrt((x - state["x"][slots]) ** 2 + (y - state["y"][slots]) ** 2)
+        delta_speed = np.abs(speed - state["speed"][slots])
+        delta_heading = np.abs(heading - state["heading"][slots])
+        delta_heading = np.where(delta_heading > 180, 360 - delta_heading, delta_heading)
+        
+        # CONDIZIONE 1: trigger dinamico / CONDIZIONE 2: timeout intervallo corrente
+        dynamic = open_gate & (
+            (delta_pos > self.delta_pos_threshold) |
+            (delta_speed > self.delta_speed_threshold) |
+            (delta_heading > self.delta_heading_threshold)
+        )
+        timeout = open_gate & ~dynamic & (dt >= current_t_gen_cam)
+        send = first | dynamic | timeout
+        
+        # Bookkeeping T_GenCam / N_GenCam
+        new_n_gen_cam = np.where(
+            first | dynamic, self.n_gen_cam_default,
+            np.where(timeout & (current_n_gen_cam > 0), current_n_gen_cam - 1, current_n_gen_cam)
+        )
+        new_t_gen_cam = np.where(first, self.t_gen_cam_max, np.where(dynamic, dt, current_t_gen_cam))
+        new_t_gen_cam = np.where(timeout & (new_n_gen_cam == 0), self.t_gen_cam_max, new_t_gen_cam)
+        
+        # Stato aggiornato solo per chi invia
+        sent = slots[send]
+        state["time"][sent] = current_time
+        state["x"][sent] = x[send]
+        state["y"][sent] = y[send]
+        state["speed"][sent] = speed[send]
+        state["heading"][sent] = heading[send]
+        state["t_gen_cam"][sent] = new_t_gen_cam[send]
+        state["n_gen_cam"][sent] = new_n_gen_cam[send]
+        state["valid"][sent] = True
+        return send
 
 
 # Template per aggiungere nuovi trigger:
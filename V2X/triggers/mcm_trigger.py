@@ -1,5 +1,7 @@
 from typing import Optional, List
+from traci import constants as tc
 from .base import Trigger, TriggerResult, TriggerRegistry
+from config import MCM_TRIGGER_CONFIG, MANAGED_VEHICLES
 
 @TriggerRegistry.register
 class RSUMCMRequestTrigger(Trigger):
@@ -7,13 +9,14 @@ class RSUMCMRequestTrigger(Trigger):
     Trigger per RSU: Rileva conflitti e assegna strategie dinamiche.
     """
     MESSAGE_TYPE = "mcm_request"
+    SUMO_VARIABLES = (tc.VAR_POSITION, tc.VAR_SIGNALS)
     
-    # Configurazione Trigger
-    COOLDOWN_TIME = 5.0   
-    DETECTION_RADIUS = 100
-
     # LISTA DEI VEICOLI GESTITI DA PYTHON (V2X)
-    MANAGED_IDS = ["1", "2"] 
+    MANAGED_IDS = MANAGED_VEHICLES
+
+    def __init__(self):
+        # Configurazione Trigger (il raggio di rilevamento è quello della RSU: i vicini arrivano già filtrati)
+        self.cooldown_time = MCM_TRIGGER_CONFIG.get("cooldown_time", 5.0)
 
     def evaluate(
         self,
@@ -28,7 +31,7 @@ class RSUMCMRequestTrigger(Trigger):
         
         # Pulizia history
         for vid, timestamp in list(new_history.items()):
-            if current_time - timestamp > self.COOLDOWN_TIME:
+            if current_time - timestamp > self.cooldown_time:
                 del new_history[vid]
 
         neighbors = current_state.get("neighbors", [])
@@ -38,7 +41,7 @@ class RSUMCMRequestTrigger(Trigger):
         # e lasciati alla gestione fisica di SUMO.
         relevant_neighbors = []
         for v in neighbors:
-            if v["id"] in self.MANAGED_IDS and v["distance_to_rsu"] <= self.DETECTION_RADIUS:
+            if v["id"] in self.MANAGED_IDS:
                 relevant_neighbors.append(v)
         
 
@@ -53,9 +56,8 @@ class RSUMCMRequestTrigger(Trigger):
             if veh_id in new_history: continue 
                 
             is_turning = veh["light_left_turn"] or veh["light_right_turn"]
-            dist = veh["distance_to_rsu"]
             
-            if is_turning and dist <= self.DETECTION_RADIUS:
+            if is_turning:
                 trigger_active = True
                 turning_vehicle_id = veh_id
                 break 
@@ -66,20 +68,19 @@ class RSUMCMRequestTrigger(Trigger):
             
             for veh in relevant_neighbors:
                 vid = veh["id"]
-                dist = veh["distance_to_rsu"]
                 
-                if dist <= self.DETECTION_RADIUS:
-                    target_entry = veh.copy()
-                    
-                    # --- PUNTO CRUCIALE ---
-                    if vid == turning_vehicle_id:
-                        target_entry["advised_strategy"] = "stayInLane" # VAI
-                    else:
-                        target_entry["advised_strategy"] = "stop" # FERMATI
-                    # ----------------------
-                    
-                    targets.append(target_entry)
-                    new_history[vid] = current_time
+                # Il vicino è una vista in sola lettura: copiamo solo i campi necessari
+                target_entry = {"id": vid, "station_id": veh["station_id"]}
+                
+                # --- PUNTO CRUCIALE ---
+                if vid == turning_vehicle_id:
+                    target_entry["advised_strategy"] = "stayInLane" # VAI
+                else:
+                    target_entry["advised_strategy"] = "stop" # FERMATI
+                # ----------------------
+                
+                targets.append(target_entry)
+                new_history[vid] = current_time
 
         if targets:
             return TriggerResult(
@@ -100,6 +101,7 @@ class RSUMCMTerminationTrigger(Trigger):
     disinserisce l'indicatore direzionale (fronte di discesa).
     """
     MESSAGE_TYPE = "mcm_termination"
+    SUMO_VARIABLES = (tc.VAR_POSITION, tc.VAR_SIGNALS)
 
     def evaluate(
         self,
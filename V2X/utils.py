@@ -4,7 +4,9 @@ Funzioni di utilità per il simulatore V2X.
 
 import math
 import time
-import traci
+import zlib
+
+from projection import get_projection
 
 
 def sumo_to_geo(x_sumo: float, y_sumo: float) -> tuple[float, float]:
@@ -18,8 +20,18 @@ def sumo_to_geo(x_sumo: float, y_sumo: float) -> tuple[float, float]:
     Returns:
         Tupla (latitude, longitude)
     """
-    lon, lat = traci.simulation.convertGeo(x_sumo, y_sumo)
-    return lat, lon
+    lat, lon = get_projection().to_geo(x_sumo, y_sumo)
+    return float(lat), float(lon)
+
+
+def sumo_to_geo_array(xs, ys):
+    """
+    Versione vettorizzata di sumo_to_geo per interi array di coordinate.
+    
+    Returns:
+        Tupla (latitudes, longitudes) di array NumPy
+    """
+    return get_projection().to_geo(xs, ys)
 
 
 def euclidean_distance(x1: float, y1: float, x2: float, y2: float) -> float:
@@ -32,11 +44,13 @@ def get_station_id_from_veh(veh_id: str) -> int:
     Estrae un numero intero dall'ID veicolo SUMO.
     
     Es: 'obu_1' -> 1, 'vehicle_42' -> 42
+    Senza cifre usa il CRC32 dell'ID: stabile tra run e processi, a differenza di hash()
+    (randomizzato per processo da PYTHONHASHSEED).
     """
     try:
         return int(''.join(filter(str.isdigit, veh_id)))
     except ValueError:
-        return abs(hash(veh_id)) % 100000
+        return zlib.crc32(veh_id.encode("utf-8")) % 100000
 
 
 def get_generation_delta_time(sim_time_sec: float) -> int: